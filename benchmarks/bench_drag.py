@@ -0,0 +1,117 @@
+# bench_drag.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Synthetic drag replay.
+
+    python3 benchmarks/bench_drag.py --drags 200 --event-rate 1000
+
+replays drags of motion events (as a high-rate mouse delivers them)
+through DragMotion against a simulated frame clock and reports motion
+events processed vs. positions applied. It then persists the end of each
+drag through the journal engine, once as a full note upsert (what
+save_note() used to write) and once as a position-only move record.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import corpus
+from stickynotes.drag import DragMotion
+from stickynotes.journal import JournalStorage
+
+
+def replay(drags, duration, event_rate, frame_rate, rng):
+    """Returns (events, frames) for `drags` drags of `duration` seconds"""
+    motion = DragMotion()
+    events = frames = 0
+    for _ in range(drags):
+        motion.begin(rng.randint(0, 1800), rng.randint(0, 1000))
+        # Interleave motion events and frame ticks on a common timeline
+        event_times = [i / event_rate for i in range(int(duration * event_rate))]
+        next_frame = 1 / frame_rate
+        dx = dy = 0.0
+        for t in event_times:
+            while t >= next_frame:
+                motion.take()
+                next_frame += 1 / frame_rate
+            dx += rng.uniform(-1, 3)
+            dy += rng.uniform(-1, 2)
+            motion.update(dx, dy)
+        motion.end(dx, dy)
+        events += motion.events
+        frames += motion.frames
+        motion.events = motion.frames = 0
+    return events, frames
+
+
+def persist(notes, drags, moves_only, rng, fsync_policy):
+    """Returns (seconds, journal bytes) for persisting the end of every drag"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = JournalStorage(os.path.join(data_dir, 'sticky-notes.json'),
+                                 fsync_policy=fsync_policy)
+        storage.load()
+        storage.write_batch(list(notes.values()), [])
+        storage.compact(background=False)
+        start_bytes = storage.journal_bytes
+
+        ids = list(notes)
+        started = time.perf_counter()
+        for _ in range(drags):
+            note_id = rng.choice(ids)
+            x, y = rng.randint(0, 1800), rng.randint(0, 1000)
+            if moves_only:
+                storage.write_batch([], [], [(note_id, x, y)])
+            else:
+                storage.write_batch([dict(notes[note_id], x=x, y=y)], [])
+        elapsed = time.perf_counter() - started
+        written = storage.journal_bytes - start_bytes
+        storage.close()
+    return elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drags', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=1.5, help='seconds per drag')
+    parser.add_argument('--event-rate', type=int, default=1000, help='motion events per second')
+    parser.add_argument('--frame-rate', type=int, default=60)
+    parser.add_argument('--notes', type=int, default=500)
+    parser.add_argument('--size', type=int, default=2000, help='mean note size in characters')
+    parser.add_argument('--fsync', default='batch', choices=['never', 'batch', 'always'])
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    started = time.perf_counter()
+    events, frames = replay(args.drags, args.duration, args.event_rate, args.frame_rate, rng)
+    elapsed = time.perf_counter() - started
+    print(f"motion: {events} events processed, {frames} positions applied "
+          f"({events / max(frames, 1):.1f} events per frame, {elapsed * 1e6 / events:.2f} us per event)")
+
+    notes = corpus.make_notes(args.notes, mean_size=args.size)
+    for label, moves_only in (('full note upsert', False), ('position-only move', True)):
+        elapsed, written = persist(notes, args.drags, moves_only, random.Random(11), args.fsync)
+        print(f"{label:20s} {elapsed * 1000 / args.drags:7.3f} ms/drag  "
+              f"{written / args.drags:8.1f} bytes/drag")
+
+
+if __name__ == '__main__':
+    main()
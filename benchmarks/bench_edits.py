@@ -0,0 +1,130 @@
+# bench_edits.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Save cost of large notes, whole vs. as edit deltas.
+
+    python3 benchmarks/bench_edits.py --sizes 100000,1000000,10000000
+
+types a few words into one note of each size between saves, as the
+window's EditLog records them, and persists every save through the
+journal engine twice: once as a full note upsert (what save_note() used
+to write) and once as edit records with the window's checkpoint policy.
+Each store is then reloaded from disk and its content compared with the
+expected text, byte for byte.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import corpus
+from stickynotes.edits import EditLog, apply_ops
+from stickynotes.journal import JournalStorage
+
+
+def typing_session(content, saves, rng):
+    """Returns the EditLog ops of each save: a few words typed or erased somewhere"""
+    log = EditLog()
+    sessions = []
+    length = len(content)
+    for _ in range(saves):
+        offset = rng.randint(0, length)
+        for word in rng.choices(('lorem ', 'ipsum ', 'dolor ', 'sit ', 'amet '), k=3):
+            for char in word:
+                log.insert(offset, char)
+                offset += 1
+                length += 1
+        if rng.random() < 0.3:
+            # A few backspaces
+            count = min(rng.randint(1, 4), offset)
+            for _ in range(count):
+                offset -= 1
+                log.delete(offset, 1)
+                length -= 1
+        sessions.append(log.take())
+    return sessions
+
+
+def persist(note, sessions, deltas, fsync_policy):
+    """Returns (seconds per save, journal bytes written, reload matches) for one run"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, 'sticky-notes.json')
+        storage = JournalStorage(path, fsync_policy=fsync_policy)
+        storage.load()
+        note = dict(note, revision=1)
+        storage.write_batch([note], [])
+        storage.compact(background=False)
+
+        log = EditLog()
+        timings = []
+        written = 0
+        for ops in sessions:
+            # Applying the ops to the model happens for both; only the write is timed
+            content = apply_ops(note['content'], ops)
+            base = note['revision']
+            note = dict(note, content=content, revision=base + 1)
+            started = time.perf_counter()
+            if deltas and log.wants_delta(len(content)):
+                fields = {k: v for k, v in note.items() if k != 'content'}
+                record = {'base': base, 'rev': base + 1, 'ops': ops, 'fields': fields}
+                storage.write_batch([], [], edits=[(note['id'], record)])
+                log.saved(ops)
+                record = dict(record, op='edit', id=note['id'])
+            else:
+                storage.write_batch([note], [])
+                log.checkpoint()
+                record = {'op': 'upsert', 'note': note}
+            timings.append(time.perf_counter() - started)
+            # Journal bytes, counted here because compaction resets journal_bytes
+            written += len(json.dumps(record, separators=(',', ':'))) + 1
+        storage.close()
+
+        reloaded = JournalStorage(path)
+        stored = reloaded.load()[note['id']]
+        reloaded.close()
+        matches = stored['content'].encode('utf-8') == note['content'].encode('utf-8')
+    return timings, written, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100000,1000000,10000000',
+                        help='comma-separated note sizes in characters')
+    parser.add_argument('--saves', type=int, default=100)
+    parser.add_argument('--fsync', default='batch', choices=['never', 'batch', 'always'])
+    args = parser.parse_args()
+
+    print(f"{'size':>10}  {'mode':6}  {'median ms':>9}  {'mean ms':>8}  {'bytes/save':>12}  reload")
+    for size in (int(s) for s in args.sizes.split(',')):
+        note = next(iter(corpus.make_notes(1, mean_size=size).values()))
+        note['content'] = (note['content'] * (size // max(len(note['content']), 1) + 1))[:size]
+        sessions = typing_session(note['content'], args.saves, random.Random(size))
+        for label, deltas in (('full', False), ('delta', True)):
+            timings, written, matches = persist(note, sessions, deltas, args.fsync)
+            print(f"{size:>10}  {label:6}  {statistics.median(timings) * 1000:9.3f}  "
+                  f"{statistics.mean(timings) * 1000:8.3f}  {written // len(timings):>12}  "
+                  f"{'identical' if matches else 'MISMATCH'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# bench_history.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Revision history size and speed under a long editing session.
+
+    python3 benchmarks/bench_history.py --notes 50 --autosaves 5000
+
+replays autosaves of a few words typed (and sometimes erased) into random
+notes of a synthetic corpus, recording a revision for every save, then
+reports history size against the live notes, record and restore times,
+and checks every stored revision against the text it was saved from.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import corpus
+from stickynotes.history import HistoryStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=50)
+    parser.add_argument('--size', type=int, default=5000, help='mean note size in characters')
+    parser.add_argument('--autosaves', type=int, default=5000)
+    parser.add_argument('--max-revisions', type=int, default=200)
+    parser.add_argument('--size-factor', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    notes = {note_id: note['content']
+             for note_id, note in corpus.make_notes(args.notes, mean_size=args.size).items()}
+    ids = list(notes)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        history = HistoryStore(data_dir, max_revisions=args.max_revisions,
+                               size_factor=args.size_factor)
+        saved = {}
+        timings = []
+        for note_id in ids:
+            history.record(note_id, notes[note_id])
+        for _ in range(args.autosaves):
+            note_id = rng.choice(ids)
+            content = notes[note_id]
+            offset = rng.randint(0, len(content))
+            content = content[:offset] + ' '.join(rng.choices(('lorem', 'ipsum', 'dolor', 'sit'), k=4)) + content[offset:]
+            if rng.random() < 0.2:
+                content = content[:offset] + content[offset + rng.randint(1, 40):]
+            notes[note_id] = content
+            started = time.perf_counter()
+            index = history.record(note_id, content)
+            timings.append(time.perf_counter() - started)
+            saved[(note_id, index)] = content
+
+        live = sum(len(content.encode('utf-8')) for content in notes.values())
+        stored = sum(os.path.getsize(os.path.join(data_dir, name)) for name in os.listdir(data_dir))
+        stats = history.get_stats()
+        print(f"{args.autosaves} autosaves of {args.notes} notes: {stats['revisions']} revisions kept, "
+              f"{stats['prunes']} prunes")
+        print(f"live notes {live / 1024:.0f} KiB, history {stored / 1024:.0f} KiB "
+              f"({stored / live:.2f}x live)")
+        print(f"record: median {statistics.median(timings) * 1000:.3f} ms, "
+              f"max {max(timings) * 1000:.3f} ms")
+
+        # Restore from a fresh store, as after a restart
+        reopened = HistoryStore(data_dir)
+        timings = []
+        checked = 0
+        for note_id in ids:
+            for revision in reopened.list_revisions(note_id):
+                started = time.perf_counter()
+                content = reopened.get_revision(note_id, revision.index)
+                timings.append(time.perf_counter() - started)
+                expected = saved.get((note_id, revision.index))
+                if expected is not None:
+                    assert content == expected, (note_id, revision.index)
+                    checked += 1
+        print(f"restore: median {statistics.median(timings) * 1000:.3f} ms, "
+              f"max {max(timings) * 1000:.3f} ms, {checked} revisions verified")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# bench_indexed.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Startup of the JSON and indexed engines as note bodies grow.
+
+    python3 benchmarks/bench_indexed.py --notes 5000 --sizes 200,2000,8000
+
+For each mean note size, the same corpus is stored as sticky-notes.json
+and converted to the indexed format. "startup" is what the application
+does before its first frame: load the store, make a NoteModel and a
+preview per note, and build the search index (deferred with the indexed
+engine). Opening a note decodes one body; the first search then decodes
+them all. Peak memory is the Python heap under tracemalloc, measured in a
+separate run; pages of the mapped file are not part of it. "save" is the
+median time IndexedStorage takes to store one changed note, without fsync.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import corpus
+from stickynotes.events import EventBus, NoteEvent, BULK_RESET
+from stickynotes.indexed_storage import IndexedStorage, convert_from_json, convert_to_json, read_indexed
+from stickynotes.model import NoteModel
+from stickynotes.preview import PreviewCache
+from stickynotes.search import SearchIndex
+from stickynotes.storage import FSYNC_NEVER, atomic_write_json
+
+
+def start(load, lazy):
+    """Returns (notes, search index) as the application has them before its first frame"""
+    notes = {note_id: NoteModel.from_dict(note) for note_id, note in load().items()}
+    cache = PreviewCache()
+    for note in notes.values():
+        cache.get(note)
+    events = EventBus()
+    index = SearchIndex()
+    index.connect_events(events, notes, lazy=lazy)
+    events.emit(NoteEvent(BULK_RESET))
+    return notes, index
+
+
+def load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def timed(function, *args):
+    gc.collect()
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def peak_memory(function, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--sizes', default='200,2000,8000', help='mean note sizes in characters')
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'size':>6} {'engine':8} {'file MiB':>9} {'startup ms':>11} {'peak MiB':>9} "
+          f"{'open ms':>8} {'1st search ms':>14}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as data_dir:
+            json_file = os.path.join(data_dir, 'sticky-notes.json')
+            indexed_file = os.path.join(data_dir, 'sticky-notes.bin')
+            atomic_write_json(json_file, corpus.make_notes(args.notes, mean_size=size, tags=True), FSYNC_NEVER)
+            convert_from_json(json_file, indexed_file, FSYNC_NEVER)
+
+            for engine, path, load, lazy in (('json', json_file, load_json, False),
+                                             ('indexed', indexed_file, read_indexed, True)):
+                (notes, index), startup = timed(start, lambda: load(path), lazy)
+                peak = peak_memory(start, lambda: load(path), lazy)
+                note = notes[rng.choice(sorted(notes))]
+                _, opened = timed(lambda: note.content)
+                _, searched = timed(index.search, 'the')
+                print(f"{size:6} {engine:8} {os.path.getsize(path) / 2**20:9.1f} {startup * 1000:11.1f} "
+                      f"{peak / 2**20:9.1f} {opened * 1000:8.3f} {searched * 1000:14.1f}")
+                del notes, index, note
+
+            # The converter gives back the store it was given
+            round_trip = os.path.join(data_dir, 'round-trip.json')
+            convert_to_json(indexed_file, round_trip, FSYNC_NEVER)
+            with open(json_file, 'rb') as a, open(round_trip, 'rb') as b:
+                identical = a.read() == b.read()
+            print(f"{size:6} round trip {'identical' if identical else 'DIFFERS'}")
+
+            storage = IndexedStorage(indexed_file, fsync_policy=FSYNC_NEVER)
+            stored = storage.load()
+            saves = []
+            for note_id in rng.sample(sorted(stored), min(50, len(stored))):
+                note = dict(stored[note_id], content=stored[note_id]['content'].load() + ' edited')
+                _, saved = timed(storage.save_note, note)
+                saves.append(saved)
+            storage.close()
+            print(f"{size:6} save {statistics.median(saves) * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# bench_migration.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Basic to enhanced migration: peak memory, speed and resuming.
+
+    python3 benchmarks/bench_migration.py --notes 50000 --size 2000
+
+writes a synthetic basic-format store, migrates it once the way STORAGE.md
+5.2 describes (load everything, convert, dump) and once with the streaming
+migrator, interrupted at a few random notes and resumed each time. Each
+is timed, then run again under tracemalloc for its peak Python memory
+(tracing slows allocation-heavy code down too much to time it). The
+streamed result is then checked note by note against the original with
+verify(), and compared byte for byte with the in-memory migration.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import corpus
+from stickynotes.migration import migrate, to_enhanced, verify
+from stickynotes.storage import FSYNC_NEVER, atomic_write_json
+
+
+def timed(function, *args, **kwargs):
+    """Returns (result, seconds) of a call"""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def peak_memory(function, *args, **kwargs):
+    """Returns the peak bytes allocated by a call"""
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def migrate_in_memory(path, now):
+    with open(path, 'r') as f:
+        notes = json.load(f)
+    migrated = {note_id: to_enhanced(note, now) for note_id, note in notes.items()}
+    atomic_write_json(path, migrated, FSYNC_NEVER)
+    return len(migrated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=50000)
+    parser.add_argument('--size', type=int, default=2000, help='mean note size in characters')
+    parser.add_argument('--interruptions', type=int, default=3)
+    args = parser.parse_args()
+
+    notes = corpus.make_notes(args.notes, mean_size=args.size, tags=True)
+    now = '2025-01-01T00:00:00'
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, 'sticky-notes.json')
+        atomic_write_json(path, notes, FSYNC_NEVER)
+        del notes
+        size = os.path.getsize(path)
+        print(f"store: {args.notes} notes, {size / 2**20:.1f} MiB")
+
+        reference = os.path.join(data_dir, 'reference.json')
+        scratch = os.path.join(data_dir, 'scratch.json')
+        shutil.copyfile(path, scratch)
+        peak = peak_memory(migrate_in_memory, scratch, now)
+        shutil.copyfile(path, reference)
+        _, elapsed = timed(migrate_in_memory, reference, now)
+        print(f"in memory:  {elapsed:7.2f} s  peak {peak / 2**20:8.1f} MiB")
+
+        shutil.copyfile(path, scratch)
+        peak = peak_memory(migrate, scratch, fsync_policy=FSYNC_NEVER, now=now)
+        stops = sorted(rng.sample(range(1, args.notes), min(args.interruptions, args.notes - 1)))
+        total = 0.0
+        for stop in stops + [None]:
+            _, elapsed = timed(migrate, path, fsync_policy=FSYNC_NEVER, now=now, limit=stop)
+            total += elapsed
+        print(f"streaming:  {total:7.2f} s  peak {peak / 2**20:8.1f} MiB  "
+              f"({len(stops)} interruptions, resumed at notes {', '.join(map(str, stops))})")
+
+        checked, elapsed = timed(verify, path + '.basic', path)
+        with open(path, 'rb') as a, open(reference, 'rb') as b:
+            identical = a.read() == b.read()
+        print(f"verify:     {elapsed:7.2f} s  {checked} notes round-trip, "
+              f"output {'identical to' if identical else 'DIFFERS from'} the in-memory migration")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# bench_startup.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Startup cost of the stored notes, before and after, per 1k notes.
+
+    python3 benchmarks/bench_startup.py --notes 2000
+
+Both paths read the same corpus from a store on disk and build one
+NoteModel per note:
+
+- before: the JSON store, with every note's content decoded at load and
+  the search index built before the first window shows. With GTK and a
+  display, one hidden StickyNote window per note is added on top, as the
+  grid used to build before NoteModel. That old grid code is gone, so the
+  windows use today's StickyNote class.
+- after: the indexed store, whose content stays undecoded until a note
+  is opened. The search index is then built in idle steps after startup,
+  so it is not counted.
+
+Memory is the Python heap growth reported by tracemalloc. The mapped
+store file and GTK's own allocations for the windows are not included.
+Times are taken under tracemalloc too, which slows both paths alike.
+
+The CSS figures compare reading and parsing note.css once per note window
+with the single display-wide provider parsed at startup (needs PyGObject,
+but no display).
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import corpus
+from stickynotes.model import NoteModel
+from stickynotes.search import SearchIndex
+from stickynotes.storage import FSYNC_NEVER, JSON_FILE, atomic_write_json, create_storage
+
+
+def measure(label, count, build):
+    """Runs build() under tracemalloc and prints time and memory per 1k notes.
+
+    Returns (result, ms per 1k notes, MB per 1k notes).
+    """
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_k = 1000 / count
+    ms, mb = elapsed * 1000 * per_k, current * per_k / 1e6
+    print(f"{label:32s} {ms:9.1f} ms/1k  {mb:7.2f} MB/1k  (peak {peak * per_k / 1e6:.2f} MB/1k)")
+    return result, ms, mb
+
+
+def write_store(notes, data_dir, engine):
+    """Stores the corpus the way `engine` finds it on startup"""
+    atomic_write_json(os.path.join(data_dir, JSON_FILE), notes, FSYNC_NEVER)
+    storage = create_storage(engine, data_dir, FSYNC_NEVER)
+    # The indexed engine imports the JSON store on first load
+    storage.load()
+    storage.close()
+
+
+def load_models(data_dir, engine):
+    """Returns (storage, note id -> NoteModel), as the app loads them; the storage stays open"""
+    storage = create_storage(engine, data_dir, FSYNC_NEVER)
+    return storage, {note_id: NoteModel.from_dict(n) for note_id, n in storage.load().items()}
+
+
+def eager_startup(data_dir):
+    storage, models = load_models(data_dir, 'json')
+    index = SearchIndex()
+    index.build(models)
+    return storage, models, index
+
+
+def lazy_startup(data_dir):
+    return load_models(data_dir, 'indexed')
+
+
+def build_windows(models):
+    """Creates a hidden note window per note with the current StickyNote class"""
+    import gi
+    gi.require_version('Gtk', '4.0')
+    gi.require_version('Adw', '1')
+    from gi.repository import Adw
+    from stickynotes.note import StickyNote
+
+    app = Adw.Application(application_id='org.gnome.StickyNotes.Bench')
+    app.register(None)
+    windows = []
+    for note in models.values():
+        window = StickyNote(app, note)
+        window.set_visible(False)
+        windows.append(window)
+    return windows
+
+
+NOTE_CSS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', 'src', 'stickynotes', 'css', 'note.css')
+
+
+def measure_css(count):
+    """Compares one CSS read and parse per note with a single shared parse"""
+    import gi
+    gi.require_version('Gtk', '4.0')
+    from gi.repository import Gtk
+
+    def parse(data):
+        provider = Gtk.CssProvider()
+        provider.load_from_data(data)
+        return provider
+
+    started = time.perf_counter()
+    for i in range(count):
+        with open(NOTE_CSS, 'rb') as f:
+            parse(f.read().replace(b'UNIQUE_ID', str(i).encode()))
+    per_note = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(NOTE_CSS, 'rb') as f:
+        parse(f.read())
+    shared = time.perf_counter() - started
+
+    per_k = 1000 / count
+    print(f"{'CSS read+parse per note':32s} {per_note * 1000 * per_k:9.1f} ms/1k")
+    print(f"{'one shared CSS provider':32s} {shared * 1000:9.1f} ms total")
+
+
+def windows_available():
+    """Returns why hidden windows cannot be built here, or None if they can"""
+    try:
+        import gi
+        gi.require_version('Gtk', '4.0')
+        from gi.repository import Gtk
+        if not Gtk.init_check():
+            return 'no display'
+    except (ImportError, ValueError) as e:
+        return str(e)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=500, help='mean note size in characters')
+    args = parser.parse_args()
+
+    notes = corpus.make_notes(args.notes, mean_size=args.size, tags=True)
+    print(f"corpus: {len(notes)} notes")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_store(notes, data_dir, 'indexed')
+
+        (storage, models, index), before_ms, before_mb = measure(
+            'before: JSON, eager, index', args.notes, lambda: eager_startup(data_dir))
+        storage.close()
+        skipped = windows_available()
+        if skipped:
+            print(f"{'  + hidden StickyNote windows':32s} skipped ({skipped})")
+        else:
+            _, ms, mb = measure('  + hidden StickyNote windows', args.notes, lambda: build_windows(models))
+            before_ms += ms
+            before_mb += mb
+        del models, index
+
+        (storage, models), after_ms, after_mb = measure(
+            'after: indexed, lazy content', args.notes, lambda: lazy_startup(data_dir))
+        storage.close()
+        del models
+
+    print(f"{'startup per 1k notes':32s} {before_ms:9.1f} -> {after_ms:.1f} ms  "
+          f"{before_mb:7.2f} -> {after_mb:.2f} MB"
+          + ("" if not skipped else "  (before without windows)"))
+
+    try:
+        measure_css(args.notes)
+    except (ImportError, ValueError) as e:
+        print(f"CSS                              skipped ({e})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# bench_sync.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Sync rounds between two devices through the reference server.
+
+    python3 benchmarks/bench_sync.py --notes 10000 --changed 0.01
+
+device A uploads a synthetic corpus, device B downloads it, then A edits
+a fraction of the notes and both sync again. The last phase has both
+devices edit and delete the same notes while offline, to check that they
+converge on the same notes. Rounds run on the calling thread, with
+remote changes applied inline instead of on a main loop.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import corpus
+from stickynotes.events import EventBus, NoteEvent, NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED
+from stickynotes.model import NoteModel
+from stickynotes.sync import SyncEngine
+from stickynotes.sync_server import serve
+
+
+class _Autosave:
+    def flush(self, note_id):
+        pass
+
+
+class Device:
+    """The parts of the application the sync engine talks to"""
+
+    def __init__(self, notes):
+        self.notes = {note_id: NoteModel.from_dict(note) for note_id, note in notes.items()}
+        self.events = EventBus()
+        self.autosave = _Autosave()
+
+    def edit(self, note_id, text):
+        note = self.notes[note_id]
+        note.content += text
+        note.touch()
+        self.events.emit(NoteEvent(NOTE_CHANGED, note, fields=frozenset(('content', 'timestamp'))))
+
+    def delete(self, note_id):
+        del self.notes[note_id]
+        self.events.emit(NoteEvent(NOTE_REMOVED, note_id=note_id))
+
+    def apply_remote_note(self, note_data):
+        note = NoteModel.from_dict(note_data)
+        kind = NOTE_CHANGED if note.id in self.notes else NOTE_ADDED
+        self.notes[note.id] = note
+        self.events.emit(NoteEvent(kind, note))
+
+    def apply_remote_deletion(self, note_id):
+        if self.notes.pop(note_id, None) is not None:
+            self.events.emit(NoteEvent(NOTE_REMOVED, note_id=note_id))
+
+
+def timed_round(engine):
+    before = engine.get_stats()
+    started = time.perf_counter()
+    engine.sync_once()
+    elapsed = time.perf_counter() - started
+    after = engine.get_stats()
+    return elapsed, {key: after[key] - before[key] for key in after if key != 'pending'}
+
+
+def report(label, elapsed, stats):
+    print(f"{label:28} {elapsed * 1000:9.1f} ms  {stats['requests']:4} req  "
+          f"{stats['sent']:6} sent  {stats['received']:6} received  "
+          f"{stats['bytes_sent'] / 1024:9.1f} KiB up  {stats['bytes_received'] / 1024:9.1f} KiB down")
+
+
+def snapshot(device):
+    return {note_id: (note.content, note.title, note.color) for note_id, note in device.notes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=1000, help='mean note size in characters')
+    parser.add_argument('--changed', type=float, default=0.01, help='fraction of notes edited')
+    parser.add_argument('--conflicts', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    server = serve()
+    url = f'http://127.0.0.1:{server.server_port}'
+    with tempfile.TemporaryDirectory() as data_dir:
+        a = Device(corpus.make_notes(args.notes, mean_size=args.size))
+        b = Device({})
+        engine_a = SyncEngine(a, url, os.path.join(data_dir, 'a.json'))
+        engine_b = SyncEngine(b, url, os.path.join(data_dir, 'b.json'))
+        for device, engine in ((a, engine_a), (b, engine_b)):
+            for kind in (NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED):
+                device.events.connect(kind, engine.on_note_event)
+
+        report('A uploads everything', *timed_round(engine_a))
+        report('B downloads everything', *timed_round(engine_b))
+        report('B, nothing changed', *timed_round(engine_b))
+
+        changed = rng.sample(sorted(a.notes), max(int(args.notes * args.changed), 1))
+        for note_id in changed:
+            a.edit(note_id, ' edited on A')
+        report(f'A pushes {len(changed)} edits', *timed_round(engine_a))
+        report(f'B pulls {len(changed)} edits', *timed_round(engine_b))
+        print(f"after edits: {'converged' if snapshot(a) == snapshot(b) else 'DIVERGED'}")
+
+        # Both devices change the same notes before either syncs; B's
+        # changes are the later ones, so B's versions (and deletions) win
+        contested = rng.sample(sorted(a.notes), args.conflicts)
+        for note_id in contested:
+            a.edit(note_id, ' conflicting edit on A')
+        time.sleep(0.01)
+        for i, note_id in enumerate(contested):
+            if i % 4 == 0:
+                b.delete(note_id)
+            else:
+                b.edit(note_id, ' conflicting edit on B')
+        report('A pushes conflicting edits', *timed_round(engine_a))
+        report('B resolves conflicts', *timed_round(engine_b))
+        report('A picks up the winners', *timed_round(engine_a))
+        wins_b = sum(1 for note_id in contested
+                     if note_id not in a.notes or a.notes[note_id].content.endswith('on B'))
+        print(f"after conflicts: {'converged' if snapshot(a) == snapshot(b) else 'DIVERGED'}, "
+              f"{len(a.notes)} notes, {wins_b} of {len(contested)} contested notes kept B's later version, "
+              f"{engine_a.connection.connections + engine_b.connection.connections} connections opened")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
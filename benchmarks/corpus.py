@@ -0,0 +1,103 @@
+# corpus.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Synthetic note corpora shared by the benchmarks"""
+
+import itertools
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+# Make the stickynotes package importable without installing it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+COLORS = ['yellow', 'pink', 'blue', 'green', 'orange', 'purple']
+TAGS = ['work', 'home', 'ideas', 'todo', 'important', 'later', 'shopping', 'travel']
+
+# Rough English letter frequencies, so trigram statistics look like text
+_LETTERS = 'etaoinshrdlcumwfgypbvkjxqz'
+_LETTER_WEIGHTS = [12.7, 9.1, 8.2, 7.5, 7.0, 6.7, 6.3, 6.1, 6.0, 4.3, 4.0, 2.8, 2.8,
+                   2.4, 2.4, 2.2, 2.0, 2.0, 1.9, 1.5, 1.0, 0.8, 0.2, 0.2, 0.1, 0.1]
+
+
+def make_vocabulary(size, rng):
+    """Returns `size` distinct pseudo-words"""
+    words = set()
+    while len(words) < size:
+        length = rng.randint(2, 10)
+        words.add(''.join(rng.choices(_LETTERS, weights=_LETTER_WEIGHTS, k=length)))
+    return sorted(words, key=lambda w: rng.random())
+
+
+def make_text(rng, vocabulary, cum_weights, length):
+    """Returns roughly `length` characters of Zipf-distributed words"""
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=max(length // 6, 1))
+    lines = []
+    for i in range(0, len(words), 10):
+        lines.append(' '.join(words[i:i + 10]))
+    return '\n'.join(lines)[:length]
+
+
+def make_notes(count, mean_size=2000, seed=1234, vocabulary_size=50000, tags=False):
+    """Returns a note id -> note data dictionary of `count` synthetic notes.
+
+    Note sizes follow a log-normal distribution around `mean_size`, so most
+    notes are short and a few are very long, as in real stores.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+    start = datetime(2024, 1, 1)
+
+    notes = {}
+    for _ in range(count):
+        note_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        size = max(int(rng.lognormvariate(0, 0.8) * mean_size * 0.73), 8)
+        content = make_text(rng, vocabulary, cum_weights, size)
+        note = {
+            'id': note_id,
+            'title': content.split('\n', 1)[0][:40],
+            'content': content,
+            'color': rng.choice(COLORS),
+            'x': rng.randint(0, 1800),
+            'y': rng.randint(0, 1000),
+            'timestamp': (start + timedelta(seconds=rng.randint(0, 500 * 24 * 3600))).isoformat(),
+        }
+        if tags:
+            note['tags'] = rng.sample(TAGS, rng.randint(0, 3))
+        notes[note_id] = note
+    return notes
+
+
+# Corpora of the benchmark suite (benchmarks/suite.py), by name
+CORPORA = {
+    '10': 10,
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000,
+}
+# Mean note size of the named corpora, in characters
+CORPUS_MEAN_SIZE = 600
+
+
+def make_corpus(name):
+    """Returns one of the named CORPORA, tagged, with the usual log-normal note sizes"""
+    return make_notes(CORPORA[name], mean_size=CORPUS_MEAN_SIZE, tags=True)
@@ -0,0 +1,579 @@
+# suite.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Headless benchmark suite: storage, search, grid population and restore.
+
+    python3 benchmarks/suite.py --corpus 10,1k,10k
+    python3 benchmarks/suite.py --corpus 10,1k,10k --save-baseline benchmarks/baseline.json
+    python3 benchmarks/suite.py --corpus 10,1k,10k --compare benchmarks/baseline.json
+
+Every case runs on the named corpora of corpus.py (10, 1k, 10k and 100k
+notes) in processes of its own, so that peak RSS belongs to the case: one
+process times the operation (up to --repeat runs, fewer once they add up
+to --max-time seconds) and another runs it once under tracemalloc for its
+allocations, since tracing slows allocation-heavy code down too much to
+time it. RSS is the process high-water mark, which includes loading the
+corpus; "growth" is what the operation added to it.
+
+Cases named after an application method do its work without the GUI;
+gtk/ cases run the real windows. Those need PyGObject and the compiled
+GResource bundle (built from src/ with glib-compile-resources unless
+--gresource is given). Without a display they run on GTK's Broadway
+backend, which needs no screen, with gtk4-broadwayd started for the
+occasion; --gdk-backend picks another one (e.g. x11 under xvfb-run).
+
+With --compare the median times and allocation peaks are checked against
+a baseline written by --save-baseline, and the exit status is 1 if any
+case got slower (or allocates more) by more than --threshold. Differences
+under --min-delta milliseconds are ignored as noise. A case that fails, or
+that the baseline has and the run does not, counts as a regression too.
+Cases that cannot run (gtk/ ones without PyGObject or a display, or on a
+corpus over their note limit) are recorded as skipped, with the reason.
+"""
+
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+import corpus
+from stickynotes.model import NoteModel
+from stickynotes.preview import PreviewCache
+from stickynotes.search import SearchIndex
+from stickynotes.storage import FSYNC_NEVER, JSON_FILE, atomic_write_json, create_storage
+
+BASELINE_VERSION = 1
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SRC = os.path.join(ROOT, 'src')
+
+ENGINES = ('json', 'journal', 'sqlite', 'indexed')
+# What the search box gets while typing, plus structured filters
+QUERIES = ('e', 'the', 'tion', 'color:blue', 'tag:work ab', 'after:2024-06-01 before:2024-09-01')
+
+# Seconds a GTK case may wait for the main loop
+GTK_TIMEOUT = 120
+
+Case = namedtuple('Case', ('name', 'setup', 'gtk', 'max_notes', 'repeatable'))
+CASES = {}
+
+
+def case(name, gtk=False, max_notes=None, repeatable=True):
+    """Registers setup(context) -> operation as a benchmark case.
+
+    The operation is a callable doing the measured work once; it is called
+    again for every timed run unless the case is not repeatable.
+    """
+    def register(setup):
+        CASES[name] = Case(name, setup, gtk, max_notes, repeatable)
+        return setup
+    return register
+
+
+class Context:
+    """What a case is set up from: the corpus and a data directory of its own"""
+
+    def __init__(self, notes, data_dir, gresource=None):
+        self.notes = notes
+        self.data_dir = data_dir
+        self.gresource = gresource
+
+    def models(self):
+        return {note_id: NoteModel.from_dict(note) for note_id, note in self.notes.items()}
+
+    def write_store(self, engine):
+        """Stores the corpus the way `engine` finds it on startup"""
+        atomic_write_json(os.path.join(self.data_dir, JSON_FILE), self.notes, FSYNC_NEVER)
+        storage = create_storage(engine, self.data_dir, FSYNC_NEVER)
+        # The SQLite and indexed engines import the JSON store on first load
+        storage.load()
+        storage.close()
+
+
+# Pure-model cases
+
+def _load_notes_data(engine):
+    def setup(context):
+        context.write_store(engine)
+
+        def load_notes_data():
+            storage = create_storage(engine, context.data_dir, FSYNC_NEVER)
+            notes = {note_id: NoteModel.from_dict(note) for note_id, note in storage.load().items()}
+            storage.close()
+            return notes
+        return load_notes_data
+    return setup
+
+
+def _save_note_data(engine):
+    def setup(context):
+        context.write_store(engine)
+        storage = create_storage(engine, context.data_dir, FSYNC_NEVER)
+        storage.load()
+        note_ids = sorted(context.notes)
+        counter = itertools.count(1)
+
+        # What the writer thread does for one autosaved note
+        def save_note_data():
+            i = next(counter)
+            note = dict(context.notes[note_ids[i % len(note_ids)]])
+            note['content'] += ' edited'
+            note['revision'] = i
+            storage.write_batch([note], [])
+        return save_note_data
+    return setup
+
+
+for _engine in ENGINES:
+    case(f'load_notes_data/{_engine}')(_load_notes_data(_engine))
+    case(f'save_note_data/{_engine}')(_save_note_data(_engine))
+
+
+@case('search_index_build')
+def setup_search_index_build(context):
+    models = context.models()
+    return lambda: SearchIndex().build(models)
+
+
+@case('matching_ids')
+def setup_matching_ids(context):
+    index = SearchIndex()
+    index.build(context.models())
+
+    # The search work of filter_notes, for every query
+    def matching_ids():
+        for query in QUERIES:
+            index.matching_ids(query)
+    return matching_ids
+
+
+@case('preview_cache')
+def setup_preview_cache(context):
+    models = context.models()
+
+    # Every card of the grid computing its preview once
+    def preview_cache():
+        cache = PreviewCache()
+        for note in models.values():
+            cache.get(note)
+    return preview_cache
+
+
+# GTK cases
+
+def _gtk(context):
+    """Registers the resources, checks the display and returns (GLib, Gio, StickyNotesApp, StickyNotesWindow)"""
+    import gi
+    gi.require_version('Gtk', '4.0')
+    gi.require_version('Adw', '1')
+    from gi.repository import Gio, GLib, Gtk
+
+    Gio.Resource.load(context.gresource)._register()
+    if not Gtk.init_check():
+        raise RuntimeError(f"cannot open display with GDK_BACKEND={os.environ.get('GDK_BACKEND')}")
+    # Only importable once the resources are registered
+    from stickynotes.main import StickyNotesApp
+    from stickynotes.window import StickyNotesWindow
+    return GLib, Gio, StickyNotesApp, StickyNotesWindow
+
+
+def _run_until(GLib, condition, timeout=GTK_TIMEOUT):
+    """Iterates the main loop until condition() holds"""
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("main loop did not get there in time")
+        if not context.iteration(False):
+            time.sleep(0.0005)
+
+
+def _next_frame(GLib, widget):
+    """Waits until widget has been drawn once more"""
+    ticks = []
+    widget.add_tick_callback(lambda *args: ticks.append(True) or GLib.SOURCE_REMOVE)
+    _run_until(GLib, lambda: ticks)
+
+
+def _make_app(Gio, StickyNotesApp):
+    """Returns a registered application over the stored corpus"""
+    app = StickyNotesApp()
+    app.set_flags(app.get_flags() | Gio.ApplicationFlags.NON_UNIQUE)
+    app.register(None)
+    return app
+
+
+def _grid(context):
+    GLib, Gio, StickyNotesApp, StickyNotesWindow = _gtk(context)
+    # The settings schema is not installed, so the app uses the journal backend
+    context.write_store('journal')
+    app = _make_app(Gio, StickyNotesApp)
+    window = StickyNotesWindow(application=app)
+    _run_until(GLib, lambda: len(window.items) == len(context.notes))
+    _next_frame(GLib, window)
+    return GLib, window
+
+
+@case('gtk/load_notes', gtk=True)
+def setup_gtk_load_notes(context):
+    GLib, window = _grid(context)
+
+    def load_notes():
+        window.load_notes()
+        _next_frame(GLib, window)
+    return load_notes
+
+
+@case('gtk/filter_notes', gtk=True)
+def setup_gtk_filter_notes(context):
+    GLib, window = _grid(context)
+
+    def filter_notes():
+        for query in QUERIES + ('',):
+            window.filter_notes(query)
+            _next_frame(GLib, window)
+    return filter_notes
+
+
+@case('gtk/do_activate', gtk=True, repeatable=False)
+def setup_gtk_do_activate(context):
+    GLib, Gio, StickyNotesApp, _ = _gtk(context)
+    context.write_store('journal')
+
+    # Loading the store, the main window and its first frame
+    def do_activate():
+        app = _make_app(Gio, StickyNotesApp)
+        app.activate()
+        _run_until(GLib, lambda: app.restore.first_frame is not None)
+    return do_activate
+
+
+@case('gtk/restore', gtk=True, max_notes=1000, repeatable=False)
+def setup_gtk_restore(context):
+    GLib, Gio, StickyNotesApp, _ = _gtk(context)
+    context.write_store('journal')
+
+    # Until every note window is open
+    def restore():
+        app = _make_app(Gio, StickyNotesApp)
+        app.activate()
+        _run_until(GLib, lambda: app.restore.restored is not None)
+    return restore
+
+
+# Running a case, in a process of its own
+
+def max_rss():
+    """Returns the peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(name, corpus_file, mode, repeat, max_time, gresource):
+    bench = CASES[name]
+    with open(corpus_file, 'r') as f:
+        notes = json.load(f)
+    data_dir = os.path.join(os.path.expanduser('~'), '.local', 'share')
+    os.makedirs(data_dir, exist_ok=True)
+    operation = bench.setup(Context(notes, data_dir, gresource))
+
+    rss_before = max_rss()
+    if mode == 'alloc':
+        tracemalloc.start()
+        operation()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'alloc_peak': peak, 'alloc_retained': retained}
+
+    times = []
+    started = time.perf_counter()
+    for _ in range(repeat if bench.repeatable else 1):
+        run_started = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - run_started)
+        if time.perf_counter() - started >= max_time:
+            break
+    rss = max_rss()
+    return {'times': times, 'rss_peak': rss, 'rss_growth': rss - rss_before}
+
+
+def spawn(name, corpus_file, mode, args, env):
+    """Runs a case in a child process; returns its result dictionary, or raises RuntimeError"""
+    command = [sys.executable, os.path.abspath(__file__), '--run-case', name,
+               '--corpus-file', corpus_file, '--mode', mode,
+               '--repeat', str(args.repeat), '--max-time', str(args.max_time)]
+    if args.gresource:
+        command += ['--gresource', args.gresource]
+    with tempfile.TemporaryDirectory(prefix='stickynotes-bench-') as home:
+        child = subprocess.run(command, env=dict(env, HOME=home), capture_output=True, text=True,
+                               timeout=args.case_timeout)
+    if child.returncode != 0:
+        lines = (child.stderr.strip() or child.stdout.strip() or 'no output').splitlines()
+        raise RuntimeError(lines[-1])
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+# Headless GTK
+
+def compile_resources(directory):
+    """Builds the GResource bundle from src/ as meson does; returns its path"""
+    compiler = shutil.which('glib-compile-resources')
+    if compiler is None:
+        raise RuntimeError('glib-compile-resources not found')
+    target = os.path.join(directory, 'stickynotes.gresource')
+    subprocess.run([compiler, '--sourcedir', SRC, '--target', target,
+                    os.path.join(SRC, 'stickynotes.gresource.xml')], check=True, capture_output=True)
+    return target
+
+
+def start_broadway(display):
+    """Starts gtk4-broadwayd on display (':5'); returns the process"""
+    daemon = shutil.which('gtk4-broadwayd') or shutil.which('broadwayd')
+    if daemon is None:
+        raise RuntimeError('no display and gtk4-broadwayd not found')
+    process = subprocess.Popen([daemon, display], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # The daemon has no readiness signal; give it a moment to open its socket
+    time.sleep(0.5)
+    if process.poll() is not None:
+        raise RuntimeError(f'gtk4-broadwayd exited with status {process.returncode}')
+    return process
+
+
+def gtk_environment(args, scratch):
+    """Returns (environment for GTK cases, broadway process or None), or raises RuntimeError"""
+    import importlib.util
+    if importlib.util.find_spec('gi') is None:
+        raise RuntimeError('PyGObject not installed')
+    if not args.gresource:
+        args.gresource = compile_resources(scratch)
+
+    env = dict(os.environ,
+               # Defaults only; nothing written to the user's dconf
+               GSETTINGS_BACKEND='memory',
+               GSK_RENDERER='cairo',
+               GTK_A11Y='none',
+               NO_AT_BRIDGE='1')
+    broadway = None
+    backend = args.gdk_backend
+    if backend is None and not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+        backend = 'broadway'
+    if backend == 'broadway':
+        broadway = start_broadway(args.broadway_display)
+        env['BROADWAY_DISPLAY'] = args.broadway_display
+    if backend:
+        env['GDK_BACKEND'] = backend
+    return env, broadway
+
+
+# Reporting and baselines
+
+def summarize(timing, allocations):
+    times = timing['times']
+    return {
+        'runs': len(times),
+        'median': statistics.median(times),
+        'min': min(times),
+        'rss_peak': timing['rss_peak'],
+        'rss_growth': timing['rss_growth'],
+        'alloc_peak': allocations['alloc_peak'],
+        'alloc_retained': allocations['alloc_retained'],
+    }
+
+
+def print_row(key, result):
+    if 'skipped' in result:
+        print(f"{key:34} skipped: {result['skipped']}", flush=True)
+        return
+    if 'failed' in result:
+        print(f"{key:34} failed: {result['failed']}", flush=True)
+        return
+    mib = 2 ** 20
+    print(f"{key:34} {result['median'] * 1000:11.2f} {result['min'] * 1000:11.2f} {result['runs']:5} "
+          f"{result['rss_peak'] / mib:9.1f} {result['rss_growth'] / mib:9.1f} "
+          f"{result['alloc_peak'] / mib:10.2f} {result['alloc_retained'] / mib:10.2f}", flush=True)
+
+
+def machine():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, min_delta, in_scope=lambda key: True):
+    """Returns the regressions of results against a baseline, as printable lines.
+
+    Failed cases are regressions, and so are the baseline's measured cases
+    that in_scope(key) says this run should have and that are not in
+    results or were skipped.
+    """
+    regressions = []
+    for key, reference in baseline['results'].items():
+        if 'median' not in reference or not in_scope(key):
+            continue
+        result = results.get(key)
+        if result is None:
+            regressions.append(f"{key}: in the baseline but not run")
+        elif 'skipped' in result:
+            regressions.append(f"{key}: in the baseline but skipped ({result['skipped']})")
+    for key, result in results.items():
+        if 'failed' in result:
+            regressions.append(f"{key}: failed: {result['failed']}")
+            continue
+        reference = baseline['results'].get(key)
+        if reference is None or 'median' not in reference or 'median' not in result:
+            continue
+        delta = result['median'] - reference['median']
+        if delta > reference['median'] * threshold and delta * 1000 > min_delta:
+            regressions.append(f"{key}: {reference['median'] * 1000:.2f} ms -> {result['median'] * 1000:.2f} ms "
+                               f"(+{delta / reference['median']:.0%})")
+        alloc_delta = result['alloc_peak'] - reference['alloc_peak']
+        if alloc_delta > reference['alloc_peak'] * threshold and alloc_delta > 64 * 1024:
+            regressions.append(f"{key}: allocation peak {reference['alloc_peak'] / 2**20:.2f} MiB -> "
+                               f"{result['alloc_peak'] / 2**20:.2f} MiB "
+                               f"(+{alloc_delta / max(reference['alloc_peak'], 1):.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default='10,1k,10k',
+                        help=f"corpora to run on, of {', '.join(corpus.CORPORA)}")
+    parser.add_argument('--cases', default='*', help='comma-separated case name patterns')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    parser.add_argument('--no-gtk', action='store_true', help='only run the pure-model cases')
+    parser.add_argument('--gdk-backend', help='GDK backend for the gtk/ cases (default: broadway without a display)')
+    parser.add_argument('--broadway-display', default=':5')
+    parser.add_argument('--gresource', help='compiled stickynotes.gresource to use')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--max-time', type=float, default=5.0, help='seconds after which no more runs start')
+    parser.add_argument('--case-timeout', type=float, default=1800.0)
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE', help='baseline to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, as a fraction')
+    parser.add_argument('--min-delta', type=float, default=0.5, help='milliseconds a slowdown must exceed')
+    # Internal: run a single case and print its result as JSON
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--corpus-file', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=('time', 'alloc'), default='time', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.corpus_file, args.mode,
+                                  args.repeat, args.max_time, args.gresource)))
+        return 0
+
+    patterns = args.cases.split(',')
+    selected = [bench for name, bench in CASES.items()
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+                and not (bench.gtk and args.no_gtk)]
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return 0
+    corpora = args.corpus.split(',')
+    unknown = [name for name in corpora if name not in corpus.CORPORA]
+    if unknown:
+        parser.error(f"unknown corpus {', '.join(unknown)}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != machine():
+            print(f"note: baseline recorded on {baseline.get('machine')}")
+
+    results = {}
+    broadway = None
+    with tempfile.TemporaryDirectory(prefix='stickynotes-suite-') as scratch:
+        env = dict(os.environ)
+        gtk_env = None
+        gtk_skipped = None
+        if any(bench.gtk for bench in selected):
+            try:
+                gtk_env, broadway = gtk_environment(args, scratch)
+            except (RuntimeError, subprocess.CalledProcessError) as e:
+                gtk_skipped = str(e)
+        try:
+            print(f"{'case@corpus':34} {'median ms':>11} {'min ms':>11} {'runs':>5} "
+                  f"{'RSS MiB':>9} {'growth':>9} {'alloc MiB':>10} {'retained':>10}")
+            for corpus_name in corpora:
+                corpus_file = os.path.join(scratch, f'corpus-{corpus_name}.json')
+                atomic_write_json(corpus_file, corpus.make_corpus(corpus_name), FSYNC_NEVER)
+                for bench in selected:
+                    key = f'{bench.name}@{corpus_name}'
+                    if bench.gtk and gtk_env is None:
+                        results[key] = {'skipped': gtk_skipped}
+                    elif bench.max_notes is not None and corpus.CORPORA[corpus_name] > bench.max_notes:
+                        results[key] = {'skipped': f'more than {bench.max_notes} notes'}
+                    else:
+                        try:
+                            case_env = gtk_env if bench.gtk else env
+                            timing = spawn(bench.name, corpus_file, 'time', args, case_env)
+                            allocations = spawn(bench.name, corpus_file, 'alloc', args, case_env)
+                            results[key] = summarize(timing, allocations)
+                        except (RuntimeError, subprocess.TimeoutExpired) as e:
+                            results[key] = {'failed': str(e)}
+                    print_row(key, results[key])
+        finally:
+            if broadway is not None:
+                broadway.terminate()
+                broadway.wait()
+
+    if args.save_baseline:
+        atomic_write_json(args.save_baseline, {'version': BASELINE_VERSION, 'machine': machine(),
+                                               'results': results}, FSYNC_NEVER)
+        print(f"baseline written to {args.save_baseline}")
+
+    failed = [key for key, result in results.items() if 'failed' in result]
+    if baseline is not None:
+        def in_scope(key):
+            # Cases left out with --cases, --corpus or --no-gtk are not expected
+            name, _, corpus_name = key.rpartition('@')
+            return corpus_name in corpora and any(
+                fnmatch.fnmatch(name, pattern) for pattern in patterns) and not (
+                name.startswith('gtk/') and args.no_gtk)
+
+        regressions = compare(results, baseline, args.threshold, args.min_delta, in_scope)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.threshold:.0%} against {args.compare}")
+    elif failed:
+        print(f"{len(failed)} cases failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
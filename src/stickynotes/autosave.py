@@ -0,0 +1,129 @@
+# autosave.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingSave:
+    __slots__ = ('callback', 'source_id', 'first_request', 'last_request')
+
+    def __init__(self, callback, now):
+        self.callback = callback
+        self.source_id = 0
+        self.first_request = now
+        self.last_request = now
+
+
+class AutosaveScheduler:
+    """Coalesces save requests so that each note has at most one pending save.
+
+    A save runs once the note has been quiet for `interval` milliseconds, or
+    at the latest `max_latency` milliseconds after the first unsaved change,
+    so continuous typing still reaches the disk.
+    """
+
+    def __init__(self, interval=1000, max_latency=5000, loop=None):
+        # GLib by default; anything with get_monotonic_time(), timeout_add(),
+        # source_remove() and SOURCE_REMOVE will do, such as a test clock
+        if loop is None:
+            from gi.repository import GLib as loop
+        self.loop = loop
+        self.interval = interval
+        self.max_latency = max_latency
+        self._pending = {}
+
+        # Contadores para verificar la coalescencia
+        self.saves_requested = 0
+        self.saves_performed = 0
+
+    def schedule(self, note_id, callback):
+        """Requests a save of note_id; callback is invoked when the save is due"""
+        self.saves_requested += 1
+        now = self.loop.get_monotonic_time()
+
+        pending = self._pending.get(note_id)
+        if pending:
+            # Already armed: just push the quiet period forward
+            pending.callback = callback
+            pending.last_request = now
+            return
+
+        pending = _PendingSave(callback, now)
+        pending.source_id = self.loop.timeout_add(self.interval, self._on_timeout, note_id)
+        self._pending[note_id] = pending
+
+    def _on_timeout(self, note_id):
+        pending = self._pending.get(note_id)
+        if not pending:
+            return self.loop.SOURCE_REMOVE
+
+        now = self.loop.get_monotonic_time()
+        quiet_ms = (now - pending.last_request) // 1000
+        waited_ms = (now - pending.first_request) // 1000
+
+        if quiet_ms >= self.interval or waited_ms >= self.max_latency:
+            pending.source_id = 0
+            self._perform(note_id)
+        else:
+            # Re-arm for whichever comes first: end of quiet period or ceiling
+            delay = min(self.interval - quiet_ms, self.max_latency - waited_ms)
+            pending.source_id = self.loop.timeout_add(max(delay, 0), self._on_timeout, note_id)
+
+        # Never let GLib repeat this source on its own
+        return self.loop.SOURCE_REMOVE
+
+    def _perform(self, note_id):
+        pending = self._pending.pop(note_id, None)
+        if not pending:
+            return
+        if pending.source_id:
+            self.loop.source_remove(pending.source_id)
+        self.saves_performed += 1
+        try:
+            pending.callback()
+        except Exception as e:
+            logger.error("Error auto-saving note %s: %s", note_id, e)
+
+    def flush(self, note_id):
+        """Runs the pending save of note_id right away, if there is one"""
+        self._perform(note_id)
+
+    def flush_all(self):
+        """Runs every pending save right away"""
+        for note_id in list(self._pending):
+            self._perform(note_id)
+
+    def cancel(self, note_id):
+        """Drops the pending save of note_id without running it"""
+        pending = self._pending.pop(note_id, None)
+        if pending and pending.source_id:
+            self.loop.source_remove(pending.source_id)
+
+    def has_pending(self, note_id):
+        return note_id in self._pending
+
+    def get_stats(self):
+        """Returns the scheduler counters"""
+        return {
+            'requested': self.saves_requested,
+            'performed': self.saves_performed,
+            'pending': len(self._pending),
+        }
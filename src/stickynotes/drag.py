@@ -0,0 +1,65 @@
+# drag.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+class DragMotion:
+    """Coalesces drag motion events into at most one position per frame.
+
+    Motion events only record the latest target position; the window's
+    frame clock tick calls take() once per frame to get the position to
+    apply, if it changed since the last frame.
+    """
+
+    def __init__(self):
+        self.origin = None
+        self.pending = None
+        self.applied = None
+
+        # Contadores para instrumentación
+        self.events = 0
+        self.frames = 0
+
+    def begin(self, x, y):
+        self.origin = (x, y)
+        self.applied = (x, y)
+        self.pending = None
+
+    def update(self, offset_x, offset_y):
+        """Records a motion event; returns the target position"""
+        self.events += 1
+        self.pending = (int(self.origin[0] + offset_x), int(self.origin[1] + offset_y))
+        return self.pending
+
+    def take(self):
+        """Returns the position to apply this frame, or None if unchanged"""
+        position, self.pending = self.pending, None
+        if position is None or position == self.applied:
+            return None
+        self.applied = position
+        self.frames += 1
+        return position
+
+    def end(self, offset_x, offset_y):
+        """Records the final offset; returns the last position still to apply, if any"""
+        self.update(offset_x, offset_y)
+        return self.take()
+
+    @property
+    def moved(self):
+        return self.origin is not None and self.applied != self.origin
@@ -0,0 +1,151 @@
+# edits.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Content edits of large notes, persisted as deltas.
+
+An edit is a plain dict, the same in the writer queue and in storage:
+
+    {"base": 4, "rev": 5, "ops": [[120, "text"], [87, 3]], "fields": {...}}
+
+`ops` are applied in order to the content of revision `base`: [offset,
+str] inserts the text at offset, [offset, int] deletes that many
+characters. Offsets count characters, as TextBuffer offsets do. `fields`
+holds every other note key (title, color, timestamp...) as of revision
+`rev`. An edit only applies on top of its base revision, so replaying it
+twice is harmless.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Notes shorter than this are always saved whole
+DELTA_MIN_CHARS = 64 * 1024
+# A full save (checkpoint) after this many edits, or once the edits add up
+# to this fraction of the note size, bounds how much a reload replays
+CHECKPOINT_EDITS = 200
+CHECKPOINT_RATIO = 0.5
+
+
+def apply_ops(content, ops):
+    """Returns content with the insert/delete ops applied; ValueError if they do not fit"""
+    for offset, value in ops:
+        if offset < 0 or offset > len(content):
+            raise ValueError(f"edit offset {offset} outside content of length {len(content)}")
+        if isinstance(value, str):
+            content = content[:offset] + value + content[offset:]
+        else:
+            if offset + value > len(content):
+                raise ValueError(f"edit deletes past the end of content of length {len(content)}")
+            content = content[:offset] + content[offset + value:]
+    return content
+
+
+def apply_edit(note_data, edit):
+    """Returns note_data with an edit applied, or note_data itself if the edit does not apply"""
+    revision = note_data.get('revision', 0)
+    if revision >= edit['rev']:
+        # Already applied (a replayed or retried record)
+        return note_data
+    if revision != edit['base']:
+        logger.warning("Skipping edit %d->%d of note %s stored at revision %d",
+                       edit['base'], edit['rev'], note_data.get('id'), revision)
+        return note_data
+    try:
+        content = apply_ops(note_data.get('content', ''), edit['ops'])
+    except ValueError as e:
+        logger.warning("Skipping edit of note %s: %s", note_data.get('id'), e)
+        return note_data
+    # Replaced, not mutated: snapshots may still hold the old dict
+    note_data = dict(note_data, **edit['fields'])
+    note_data['content'] = content
+    note_data['revision'] = edit['rev']
+    return note_data
+
+
+def ops_size(ops):
+    """Characters inserted or deleted by ops"""
+    return sum(len(value) if isinstance(value, str) else value for _, value in ops)
+
+
+class EditLog:
+    """Insert/delete ranges of a TextBuffer since the last save.
+
+    Typing and backspacing at the same spot extend the previous op, so a
+    burst of keystrokes is a single op. The log also counts what was saved
+    as deltas since the last checkpoint.
+    """
+
+    def __init__(self):
+        self.ops = []
+        self.edits = 0
+        self.chars = 0
+
+    def insert(self, offset, text):
+        if self.ops:
+            last = self.ops[-1]
+            if isinstance(last[1], str) and last[0] + len(last[1]) == offset:
+                last[1] += text
+                return
+        self.ops.append([offset, text])
+
+    def delete(self, offset, length):
+        if length <= 0:
+            return
+        if self.ops:
+            last = self.ops[-1]
+            if isinstance(last[1], str):
+                # Deleting text that was just typed
+                start = offset - last[0]
+                if 0 <= start and start + length <= len(last[1]):
+                    last[1] = last[1][:start] + last[1][start + length:]
+                    if not last[1]:
+                        self.ops.pop()
+                    return
+            elif offset + length == last[0]:
+                # Backspace
+                last[0] = offset
+                last[1] += length
+                return
+            elif offset == last[0]:
+                # Delete key
+                last[1] += length
+                return
+        self.ops.append([offset, length])
+
+    def take(self):
+        """Returns the ops recorded since the last call and clears them"""
+        ops, self.ops = self.ops, []
+        return ops
+
+    def saved(self, ops):
+        """Counts ops that were saved as a delta"""
+        self.edits += 1
+        self.chars += ops_size(ops)
+
+    def checkpoint(self):
+        """Records that the note was just saved whole"""
+        self.edits = 0
+        self.chars = 0
+
+    def wants_delta(self, length, ops=()):
+        """True if a note of `length` characters should be saved as a delta of ops"""
+        return (length >= DELTA_MIN_CHARS
+                and self.edits < CHECKPOINT_EDITS
+                and self.chars + ops_size(ops) < length * CHECKPOINT_RATIO)
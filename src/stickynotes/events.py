@@ -0,0 +1,85 @@
+# events.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTE_ADDED = 'note-added'
+NOTE_CHANGED = 'note-changed'
+NOTE_REMOVED = 'note-removed'
+BULK_RESET = 'bulk-reset'
+
+# Fields that only affect where the note window is, not what it shows
+POSITION_FIELDS = frozenset(('x', 'y'))
+
+
+class NoteEvent:
+    """A change to app.notes.
+
+    `note` is the NoteModel (None for removals and resets) and `fields` the
+    set of changed field names for note-changed; None means "anything may
+    have changed".
+    """
+
+    __slots__ = ('kind', 'note_id', 'note', 'fields')
+
+    def __init__(self, kind, note=None, note_id=None, fields=None):
+        self.kind = kind
+        self.note = note
+        self.note_id = note.id if note is not None else note_id
+        self.fields = fields
+
+    def touches(self, fields):
+        """True if the event may have changed any of the given fields"""
+        return self.fields is None or not self.fields.isdisjoint(fields)
+
+    def __repr__(self):
+        return f'<NoteEvent {self.kind} {self.note_id} {sorted(self.fields or ())}>'
+
+
+class EventBus:
+    """Dispatches NoteEvents to the handlers connected to their kind.
+
+    Handlers run synchronously on the main loop, in connection order, so a
+    subscriber only ever patches the one note an event is about.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._ids = itertools.count(1)
+
+    def connect(self, kind, callback):
+        """Calls callback(event) for every event of `kind`; returns a handler id"""
+        handler_id = next(self._ids)
+        self._handlers.setdefault(kind, {})[handler_id] = callback
+        return handler_id
+
+    def disconnect(self, handler_id):
+        for handlers in self._handlers.values():
+            if handlers.pop(handler_id, None) is not None:
+                return
+
+    def emit(self, event):
+        for callback in list(self._handlers.get(event.kind, {}).values()):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error("Error handling %s for %s: %s", event.kind, event.note_id, e)
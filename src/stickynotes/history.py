@@ -0,0 +1,333 @@
+# history.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Per-note revision history.
+
+Each note has an append-only file of records, each a fixed header followed
+by a zlib-compressed payload:
+
+    kind (u8) | index (u32) | time (f64) | length (u32) | payload size (u32)
+
+A keyframe holds the whole content; a delta holds the length of the prefix
+and suffix it shares with the previous revision plus the text in between,
+which is what a burst of typing changes. A keyframe is written every
+`keyframe_interval` revisions, so restoring one replays a bounded number
+of deltas. Old revisions are dropped by count, age and size, the size
+budget being a multiple of the live note.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = 'sticky-notes-history'
+
+KEYFRAME = 0
+DELTA = 1
+
+_HEADER = struct.Struct('<BIdII')
+_DELTA = struct.Struct('<II')
+_SAFE_ID = re.compile(r'[\w-]+')
+
+# Characters compared at a time when looking for the common prefix/suffix
+_BLOCK = 4096
+
+# What list_revisions() reports for each stored revision
+Revision = namedtuple('Revision', ('index', 'time', 'length', 'keyframe'))
+
+
+class _Record:
+    __slots__ = ('kind', 'index', 'time', 'length', 'offset', 'size')
+
+    def __init__(self, kind, index, time, length, offset, size):
+        self.kind = kind
+        self.index = index
+        self.time = time
+        self.length = length
+        # Offset and size of the payload in the file
+        self.offset = offset
+        self.size = size
+
+
+class _NoteLog:
+    __slots__ = ('records', 'bytes', 'last')
+
+    def __init__(self):
+        self.records = []
+        self.bytes = 0
+        # Content of the newest revision, once known
+        self.last = None
+
+
+def common_affixes(old, new):
+    """Returns (prefix, suffix): how many characters old and new share at each end"""
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix + _BLOCK <= limit and old[prefix:prefix + _BLOCK] == new[prefix:prefix + _BLOCK]:
+        prefix += _BLOCK
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+
+    limit -= prefix
+    suffix = 0
+    old_end, new_end = len(old), len(new)
+    while (suffix + _BLOCK <= limit
+           and old[old_end - suffix - _BLOCK:old_end - suffix] == new[new_end - suffix - _BLOCK:new_end - suffix]):
+        suffix += _BLOCK
+    while suffix < limit and old[old_end - suffix - 1] == new[new_end - suffix - 1]:
+        suffix += 1
+    return prefix, suffix
+
+
+class HistoryStore:
+    """Compressed revision history of every note, one file per note.
+
+    record() is called from the persistence writer thread and the queries
+    from the main thread, so everything runs under a lock.
+    """
+
+    def __init__(self, directory, max_revisions=200, max_age=90 * 86400,
+                 size_factor=4, min_bytes=256 * 1024, keyframe_interval=32, min_interval=0):
+        self.directory = directory
+        # Seconds between revisions of a note; the persistence writer holds
+        # back the saves in between, so autosaves do not each diff and
+        # compress the whole note
+        self.min_interval = min_interval
+        self.max_revisions = max_revisions
+        self.max_age = max_age
+        # Budget per note: size_factor times the live content, at least min_bytes
+        self.size_factor = size_factor
+        self.min_bytes = min_bytes
+        self.keyframe_interval = keyframe_interval
+
+        self._logs = {}
+        self._lock = threading.Lock()
+
+        # Contadores para instrumentación
+        self.revisions_written = 0
+        self.bytes_written = 0
+        self.prunes = 0
+
+    def _path(self, note_id):
+        if not _SAFE_ID.fullmatch(note_id):
+            note_id = hashlib.sha1(note_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, note_id + '.history')
+
+    def _log(self, note_id):
+        log = self._logs.get(note_id)
+        if log is None:
+            log = self._logs[note_id] = self._scan(self._path(note_id))
+        return log
+
+    def _scan(self, path):
+        """Reads the record headers of a history file"""
+        log = _NoteLog()
+        if not os.path.exists(path):
+            return log
+        with open(path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            kind, index, when, length, size = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            if start + size > len(data):
+                break
+            log.records.append(_Record(kind, index, when, length, start, size))
+            offset = start + size
+        if offset < len(data):
+            # Torn write at the end of the file
+            logger.warning("Truncating history %s at %d bytes", path, offset)
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        log.bytes = offset
+        return log
+
+    def record(self, note_id, content, when=None):
+        """Stores content as the newest revision of a note; returns its index or None if unchanged"""
+        when = time.time() if when is None else when
+        with self._lock:
+            log = self._log(note_id)
+            previous = None
+            if log.records:
+                try:
+                    previous = self._content(note_id, log, len(log.records) - 1)
+                except (OSError, ValueError, zlib.error) as e:
+                    # Start over from a keyframe rather than lose the revision
+                    logger.warning("Error reading history of note %s: %s", note_id, e)
+            if previous == content:
+                return None
+
+            kind = KEYFRAME
+            if previous is not None and not self._keyframe_due(log):
+                prefix, suffix = common_affixes(previous, content)
+                middle = content[prefix:len(content) - suffix]
+                # A rewrite of most of the note is stored whole
+                if len(middle) <= len(content) // 2:
+                    kind = DELTA
+                    payload = _DELTA.pack(prefix, suffix) + middle.encode('utf-8')
+            if kind == KEYFRAME:
+                payload = content.encode('utf-8')
+            payload = zlib.compress(payload)
+
+            index = log.records[-1].index + 1 if log.records else 0
+            header = _HEADER.pack(kind, index, when, len(content), len(payload))
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(note_id), 'ab') as f:
+                f.write(header + payload)
+            log.records.append(_Record(kind, index, when, len(content),
+                                       log.bytes + _HEADER.size, len(payload)))
+            log.bytes += len(header) + len(payload)
+            log.last = content
+            self.revisions_written += 1
+            self.bytes_written += len(header) + len(payload)
+
+            if self._over_budget(log, when):
+                self._prune(note_id, log, when)
+            return index
+
+    def _keyframe_due(self, log):
+        since = 0
+        for record in reversed(log.records):
+            if record.kind == KEYFRAME:
+                return since + 1 >= self.keyframe_interval
+            since += 1
+        return True
+
+    def _budget(self, log):
+        return max(self.size_factor * log.records[-1].length, self.min_bytes)
+
+    def _over_budget(self, log, now):
+        return (len(log.records) > self.max_revisions
+                or log.bytes > self._budget(log)
+                or (self.max_age and log.records[0].time < now - self.max_age))
+
+    def _prune(self, note_id, log, now):
+        """Drops the oldest revisions, down to 3/4 of the limits so it does not run on every save"""
+        max_count = max(self.max_revisions * 3 // 4, 1)
+        max_bytes = self._budget(log) * 3 // 4
+        first = 0
+        size = log.bytes
+        while first < len(log.records) - 1:
+            record = log.records[first]
+            if (len(log.records) - first <= max_count and size <= max_bytes
+                    and not (self.max_age and record.time < now - self.max_age)):
+                break
+            size -= _HEADER.size + record.size
+            first += 1
+        if first == 0:
+            return
+
+        path = self._path(note_id)
+        with open(path, 'rb') as f:
+            data = f.read()
+        kept = log.records[first:]
+        chunks = []
+        records = []
+        offset = 0
+        for i, record in enumerate(kept):
+            if i == 0 and record.kind == DELTA:
+                # The oldest kept revision becomes a keyframe
+                kind = KEYFRAME
+                payload = zlib.compress(self._content(note_id, log, first).encode('utf-8'))
+            else:
+                kind = record.kind
+                payload = data[record.offset:record.offset + record.size]
+            chunks.append(_HEADER.pack(kind, record.index, record.time, record.length, len(payload)))
+            chunks.append(payload)
+            records.append(_Record(kind, record.index, record.time, record.length,
+                                   offset + _HEADER.size, len(payload)))
+            offset += _HEADER.size + len(payload)
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.writelines(chunks)
+        os.replace(temp_path, path)
+        log.records = records
+        log.bytes = offset
+        self.prunes += 1
+        logger.debug("Pruned %d revisions of note %s", first, note_id)
+
+    def _content(self, note_id, log, position):
+        """Rebuilds the content of log.records[position]"""
+        if position == len(log.records) - 1 and log.last is not None:
+            return log.last
+        start = position
+        while log.records[start].kind != KEYFRAME:
+            start -= 1
+        with open(self._path(note_id), 'rb') as f:
+            content = None
+            for record in log.records[start:position + 1]:
+                f.seek(record.offset)
+                payload = zlib.decompress(f.read(record.size))
+                if record.kind == KEYFRAME:
+                    content = payload.decode('utf-8')
+                else:
+                    prefix, suffix = _DELTA.unpack_from(payload)
+                    middle = payload[_DELTA.size:].decode('utf-8')
+                    content = content[:prefix] + middle + content[len(content) - suffix:]
+        if position == len(log.records) - 1:
+            log.last = content
+        return content
+
+    def list_revisions(self, note_id):
+        """Returns the stored revisions of a note, newest first"""
+        with self._lock:
+            log = self._log(note_id)
+            return [Revision(r.index, r.time, r.length, r.kind == KEYFRAME)
+                    for r in reversed(log.records)]
+
+    def get_revision(self, note_id, index):
+        """Returns the content of a revision; KeyError if it is not stored"""
+        with self._lock:
+            log = self._log(note_id)
+            for position, record in enumerate(log.records):
+                if record.index == index:
+                    try:
+                        return self._content(note_id, log, position)
+                    except zlib.error as e:
+                        raise ValueError(f"corrupt history of note {note_id}: {e}") from e
+        raise KeyError(f"note {note_id} has no revision {index}")
+
+    def remove(self, note_id):
+        """Deletes the history of a note"""
+        with self._lock:
+            self._logs.pop(note_id, None)
+            try:
+                os.remove(self._path(note_id))
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self):
+        """Returns history counters for the notes touched in this session"""
+        with self._lock:
+            return {
+                'notes': len(self._logs),
+                'revisions': sum(len(log.records) for log in self._logs.values()),
+                'bytes': sum(log.bytes for log in self._logs.values()),
+                'written': self.revisions_written,
+                'prunes': self.prunes,
+            }
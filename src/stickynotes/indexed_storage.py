@@ -0,0 +1,382 @@
+# indexed_storage.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Binary note store with an index in front and note bodies behind it.
+
+    PYTHONPATH=src python3 -m stickynotes.indexed_storage from-json sticky-notes.json sticky-notes.bin
+    PYTHONPATH=src python3 -m stickynotes.indexed_storage to-json sticky-notes.bin sticky-notes.json
+
+The file is mapped into memory and only the index is decoded when it is
+opened; each note's content is decoded the first time it is read. See
+STORAGE.md 4.1 for the layout.
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+
+from .journal import JournalStorage
+from .model import LazyContent, NoteModel
+from .preview import make_preview
+from .storage import FSYNC_BATCH, FSYNC_NEVER, FSYNC_ALWAYS, atomic_write_json, fsync_directory
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SNINDEX\0'
+FORMAT_VERSION = 1
+
+# magic, version, note count, string table bytes, content bytes
+HEADER = struct.Struct('<8sIIQQ')
+# content offset and bytes, content kind, present fields, x, y, revision,
+# then the length in characters of each of STRINGS in the string table
+RECORD = struct.Struct('<QIBxHiiq8I')
+
+STRINGS = ('id', 'title', 'color', 'timestamp', 'preview title', 'snippet', 'image', 'extra')
+
+# Content kinds
+TEXT = 0   # UTF-8 text
+JSON = 1   # JSON, for enhanced-format content blocks
+
+# Present fields; a key that is missing or does not fit its record field
+# (a null timestamp, a float position...) is kept in the extra JSON instead
+HAS_ID = 1 << 0
+HAS_TITLE = 1 << 1
+HAS_CONTENT = 1 << 2
+HAS_COLOR = 1 << 3
+HAS_X = 1 << 4
+HAS_Y = 1 << 5
+HAS_TIMESTAMP = 1 << 6
+HAS_REVISION = 1 << 7
+
+_INT32 = (-2**31, 2**31 - 1)
+_INT64 = (-2**63, 2**63 - 1)
+
+# Bytes copied at a time from one store file to the next
+COPY_CHUNK = 1024 * 1024
+
+
+class IndexedStoreError(Exception):
+    """The file is not a readable indexed store"""
+
+
+class StoredContent(LazyContent):
+    """Content of a note at an offset of a mapped store file"""
+
+    __slots__ = ('_data', 'offset', 'length', 'kind')
+
+    def __init__(self, data, offset, length, kind, preview=None):
+        super().__init__(preview)
+        # Keeps the mapping open, even after the file is replaced
+        self._data = data
+        self.offset = offset
+        self.length = length
+        self.kind = kind
+
+    @property
+    def enhanced(self):
+        return self.kind == JSON
+
+    def raw(self):
+        return self._data[self.offset:self.offset + self.length]
+
+    def load(self):
+        raw = self.raw()
+        if self.kind == JSON:
+            return json.loads(raw)
+        return raw.decode('utf-8')
+
+
+def _fits(value, kind, bounds=None):
+    if type(value) is not kind:
+        return False
+    return bounds is None or bounds[0] <= value <= bounds[1]
+
+
+def _encode_note(note_id, note):
+    """Returns (record fields without the content offset, strings, content) of a note"""
+    flags = 0
+    extra = {}
+    strings = [note_id, '', '', '']
+    x = y = revision = 0
+    content = b''
+    kind = TEXT
+    for key, value in note.items():
+        if key == 'id' and value == note_id:
+            flags |= HAS_ID
+        elif key == 'title' and _fits(value, str):
+            flags |= HAS_TITLE
+            strings[1] = value
+        elif key == 'color' and _fits(value, str):
+            flags |= HAS_COLOR
+            strings[2] = value
+        elif key == 'timestamp' and _fits(value, str):
+            flags |= HAS_TIMESTAMP
+            strings[3] = value
+        elif key == 'x' and _fits(value, int, _INT32):
+            flags |= HAS_X
+            x = value
+        elif key == 'y' and _fits(value, int, _INT32):
+            flags |= HAS_Y
+            y = value
+        elif key == 'revision' and _fits(value, int, _INT64):
+            flags |= HAS_REVISION
+            revision = value
+        elif key == 'content':
+            flags |= HAS_CONTENT
+            if isinstance(value, StoredContent):
+                # Copied over as it is, without decoding it
+                content = value
+                kind = value.kind
+            elif isinstance(value, str):
+                content = value.encode('utf-8')
+            else:
+                content = json.dumps(value, separators=(',', ':')).encode('utf-8')
+                kind = JSON
+        else:
+            extra[key] = value
+
+    preview = make_preview(NoteModel.from_dict(note))
+    strings += [preview.title, preview.snippet, preview.image or '',
+                json.dumps(extra, separators=(',', ':')) if extra else '']
+    return (kind, flags, x, y, revision), strings, content
+
+
+def write_indexed(path, notes, fsync_policy=FSYNC_BATCH):
+    """Writes a note id -> note data dictionary to a temporary file and atomically replaces path with it.
+
+    Contents still undecoded (StoredContent) are copied from their mapping
+    byte for byte.
+    """
+    records = []
+    table = []
+    contents = []
+    data_size = 0
+    for note_id, note in notes.items():
+        fields, strings, content = _encode_note(note_id, note)
+        length = content.length if isinstance(content, StoredContent) else len(content)
+        records.append((data_size, length) + fields + tuple(len(s) for s in strings))
+        table.extend(strings)
+        contents.append(content)
+        data_size += length
+    table = ''.join(table).encode('utf-8')
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(records), len(table), data_size))
+        f.write(b''.join(RECORD.pack(*record) for record in records))
+        f.write(table)
+        for content in contents:
+            if not isinstance(content, StoredContent):
+                f.write(content)
+                continue
+            for start in range(content.offset, content.offset + content.length, COPY_CHUNK):
+                f.write(content._data[start:min(start + COPY_CHUNK, content.offset + content.length)])
+        if fsync_policy != FSYNC_NEVER:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if fsync_policy == FSYNC_ALWAYS:
+        fsync_directory(path)
+
+
+def read_indexed(path):
+    """Maps an indexed store and decodes its index; returns a note id -> note data dictionary.
+
+    Each note's 'content' is a StoredContent until it is loaded.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise IndexedStoreError(f"{path} is too short to be an indexed store")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, count, table_size, data_size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise IndexedStoreError(f"{path} is not an indexed store")
+    if version != FORMAT_VERSION:
+        raise IndexedStoreError(f"{path} has unknown format version {version}")
+    records_end = HEADER.size + count * RECORD.size
+    data_start = records_end + table_size
+    if data_start + data_size != size:
+        raise IndexedStoreError(f"{path} is {size} bytes, expected {data_start + data_size}")
+
+    # The whole string table is decoded at once; records give lengths in
+    # characters, so every string is a slice of it
+    table = data[records_end:data_start].decode('utf-8')
+    position = 0
+    notes = {}
+    for record in RECORD.iter_unpack(data[HEADER.size:records_end]):
+        offset, length, kind, flags, x, y, revision = record[:7]
+        strings = []
+        for chars in record[7:]:
+            strings.append(table[position:position + chars])
+            position += chars
+        note_id, title, color, timestamp, preview_title, snippet, image, extra = strings
+
+        note = {}
+        if flags & HAS_ID:
+            note['id'] = note_id
+        if flags & HAS_TITLE:
+            note['title'] = title
+        if flags & HAS_CONTENT:
+            note['content'] = StoredContent(data, data_start + offset, length, kind,
+                                            (preview_title, snippet, image or None))
+        if flags & HAS_COLOR:
+            note['color'] = color
+        if flags & HAS_X:
+            note['x'] = x
+        if flags & HAS_Y:
+            note['y'] = y
+        if flags & HAS_TIMESTAMP:
+            note['timestamp'] = timestamp
+        if flags & HAS_REVISION:
+            note['revision'] = revision
+        if extra:
+            note.update(json.loads(extra))
+        notes[note_id] = note
+    return notes
+
+
+def loaded(note):
+    """Returns note data with its content decoded"""
+    content = note.get('content')
+    if isinstance(content, LazyContent):
+        return dict(note, content=content.load())
+    return note
+
+
+class IndexedStorage(JournalStorage):
+    """Stores every note in one mapped binary file whose note bodies are decoded on demand.
+
+    The indexed file is the snapshot of a journal (sticky-notes.bin.journal):
+    each batch appends its changes to the journal, and compaction rewrites
+    the file in the background, copying contents that were not changed from
+    the previous file without decoding them.
+    """
+
+    lazy_content = True
+
+    def __init__(self, data_file, import_from=None, fsync_policy=FSYNC_BATCH, **journal_options):
+        # The JSON engine's journal is sticky-notes.journal, so this one
+        # keeps the .bin in its name
+        journal_options.setdefault('journal_file', data_file + '.journal')
+        super().__init__(data_file, fsync_policy=fsync_policy, **journal_options)
+        self.data_file = data_file
+        # No other program writes this file
+        self.monitored_file = None
+        self.import_from = import_from
+
+    def load(self):
+        if not os.path.exists(self.data_file) and self.import_from:
+            self.import_json(self.import_from)
+        return super().load()
+
+    def import_json(self, json_file):
+        """Imports a JSON (or journal) store, when the indexed file does not exist yet"""
+        if not os.path.exists(json_file):
+            return 0
+        journal = JournalStorage(json_file)
+        try:
+            notes = journal.load()
+        finally:
+            journal.close()
+        write_indexed(self.data_file, notes, self.fsync_policy)
+        logger.info("Imported %d notes from %s", len(notes), json_file)
+        return len(notes)
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.data_file):
+            return {}
+        notes = read_indexed(self.data_file)
+        self.snapshot_bytes = os.path.getsize(self.data_file)
+        return notes
+
+    def _write_snapshot_file(self, notes, fsync_policy):
+        write_indexed(self.data_file, notes, fsync_policy)
+        stored = read_indexed(self.data_file)
+        # Notes not changed since the snapshot was taken now point at the
+        # new file, so the previous mapping is closed once nothing else
+        # refers to it
+        with self._lock:
+            for note_id, note in stored.items():
+                if self._notes.get(note_id) is notes[note_id]:
+                    self._notes[note_id] = note
+        return stored
+
+    @staticmethod
+    def _apply(record, notes):
+        # Edits apply to the text, so the note is decoded first
+        if record.get('op') == 'edit' and record.get('id') in notes:
+            notes[record['id']] = loaded(notes[record['id']])
+        JournalStorage._apply(record, notes)
+
+    def _apply_pending(self, note_id=None):
+        # Edits apply to the text, so those notes are decoded first
+        for pending_id in [note_id] if note_id is not None else list(self._pending_edits):
+            if pending_id in self._pending_edits and pending_id in self._notes:
+                self._notes[pending_id] = loaded(self._notes[pending_id])
+        super()._apply_pending(note_id)
+
+    def recent_notes(self, limit):
+        return [loaded(note) for note in super().recent_notes(limit)]
+
+    def notes_by_color(self, color):
+        return [loaded(note) for note in super().notes_by_color(color)]
+
+    def close(self):
+        super().close()
+        # Mappings are closed once no note content refers to them
+        with self._lock:
+            self._notes = {}
+        self._base = {}
+
+
+def convert_from_json(json_file, indexed_file, fsync_policy=FSYNC_BATCH):
+    """Writes a JSON store as an indexed store; returns the number of notes"""
+    with open(json_file, 'r') as f:
+        notes = json.load(f)
+    write_indexed(indexed_file, notes, fsync_policy)
+    return len(notes)
+
+
+def convert_to_json(indexed_file, json_file, fsync_policy=FSYNC_BATCH):
+    """Writes an indexed store as a JSON store; returns the number of notes"""
+    notes = {note_id: loaded(note) for note_id, note in read_indexed(indexed_file).items()}
+    atomic_write_json(json_file, notes, fsync_policy)
+    return len(notes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('direction', choices=('from-json', 'to-json'))
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    convert = convert_from_json if args.direction == 'from-json' else convert_to_json
+    count = convert(args.source, args.destination)
+    logger.info("Converted %d notes from %s to %s", count, args.source, args.destination)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+# journal.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import logging
+import os
+import threading
+
+from .edits import apply_edit
+from .storage import NoteStorage, FSYNC_BATCH, FSYNC_NEVER, atomic_write_json, file_identity
+
+logger = logging.getLogger(__name__)
+
+
+class JournalStorage(NoteStorage):
+    """Append-only log of note changes layered on top of the JSON snapshot.
+
+    The snapshot is the regular sticky-notes.json file, so existing stores
+    are picked up as-is and a compacted store can still be read by older
+    versions. Every change appends one small JSON line to the journal; once
+    the journal grows past a size or ratio threshold it is folded into a
+    fresh snapshot on a background thread.
+    """
+
+    def __init__(self, snapshot_file, journal_file=None,
+                 max_journal_bytes=4 * 1024 * 1024, max_journal_ratio=1.0,
+                 fsync_policy=FSYNC_BATCH):
+        super().__init__(fsync_policy)
+        self.snapshot_file = snapshot_file
+        self.monitored_file = snapshot_file
+        self.journal_file = journal_file or os.path.splitext(snapshot_file)[0] + '.journal'
+        self.rotated_file = self.journal_file + '.old'
+        self.max_journal_bytes = max_journal_bytes
+        self.max_journal_ratio = max_journal_ratio
+
+        self.snapshot_bytes = 0
+        self.journal_bytes = 0
+        self.journal_records = 0
+
+        self._journal = None
+        self._compaction_thread = None
+        # Notes as in the snapshot file, before the journal; reload()
+        # compares it with the file to tell what another program changed
+        self._base = {}
+        # Note id -> edits not yet applied to the in-memory view
+        self._pending_edits = {}
+
+    def _read_snapshot(self):
+        notes = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                notes = json.load(f)
+            self.snapshot_bytes = os.path.getsize(self.snapshot_file)
+        return notes
+
+    def load(self):
+        """Reads the snapshot and replays the journal on top of it"""
+        notes = self._read_snapshot()
+        # Note dicts are replaced, never mutated, so a shallow copy is enough
+        self._base = dict(notes)
+
+        # A leftover rotated journal means a compaction was interrupted;
+        # replaying it again is harmless because every record is idempotent
+        # (edits carry the revision they apply to)
+        interrupted = os.path.exists(self.rotated_file)
+        if interrupted:
+            self._repair_tail(self.rotated_file)
+            self._replay(self.rotated_file, notes)
+        # New records are appended, so a torn last line would swallow the
+        # first one written after the crash. Repaired before the replay, so
+        # what is replayed is exactly what stays in the file
+        self._repair_tail(self.journal_file)
+        self.journal_records = self._replay(self.journal_file, notes)
+        self.journal_bytes = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+
+        self._journal = open(self.journal_file, 'a')
+
+        self._notes = notes
+        if interrupted:
+            logger.info("Finishing interrupted journal compaction")
+            self.compact(background=False)
+
+        return dict(notes)
+
+    def reload(self):
+        """Re-reads a snapshot that another program changed.
+
+        Notes the other program changed or removed take its version, and
+        our journal records for them are dropped; the other notes keep the
+        changes in our journal. The result is compacted at once, so the
+        dropped records are not replayed over the new snapshot later.
+        """
+        if self._compaction_thread:
+            self._compaction_thread.join()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+        with self._lock:
+            self._apply_pending()
+            old = dict(self._notes)
+
+        external = self._read_snapshot()
+        base = self._base
+        superseded = {note_id for note_id in base.keys() | external.keys()
+                      if base.get(note_id) != external.get(note_id)}
+        notes = dict(external)
+        for path in (self.rotated_file, self.journal_file):
+            self._replay(path, notes, skip=superseded)
+        if superseded:
+            logger.info("%d notes changed by another program replace our own changes", len(superseded))
+
+        with self._lock:
+            self._notes = notes
+        self._base = external
+        self.compact(background=False)
+
+        changed = [note_data for note_id, note_data in notes.items() if old.get(note_id) != note_data]
+        removed = [note_id for note_id in old if note_id not in notes]
+        return changed, removed
+
+    def _replay(self, path, notes, skip=()):
+        """Applies the records of a journal file to notes, except those of the note ids in skip"""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Most likely a torn write at the end of the file
+                    logger.warning("Skipping corrupt journal record %s:%d", path, line_number)
+                    continue
+                if skip and (record['note']['id'] if record.get('op') == 'upsert' else record.get('id')) in skip:
+                    continue
+                self._apply(record, notes)
+                count += 1
+        return count
+
+    @staticmethod
+    def _repair_tail(path):
+        """Ends the file with its last complete record.
+
+        A last line without its newline is kept, newline added, if it is a
+        whole record (the crash came between the two), and cut otherwise.
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(position - 4096, 0)
+                f.seek(start)
+                chunk = f.read(position - start)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.seek(position)
+                tail = f.read()
+                try:
+                    complete = 'op' in json.loads(tail)
+                except (ValueError, TypeError):
+                    complete = False
+                if not complete:
+                    logger.warning("Dropping %d bytes of torn journal record at the end of %s",
+                                   end - position, path)
+                    f.truncate(position)
+                else:
+                    f.write(b'\n')
+
+    @staticmethod
+    def _apply(record, notes):
+        op = record.get('op')
+        if op == 'upsert':
+            note = record['note']
+            notes[note['id']] = note
+        elif op == 'delete':
+            notes.pop(record['id'], None)
+        elif op == 'move':
+            note = notes.get(record['id'])
+            if note is not None:
+                notes[record['id']] = dict(note, x=record['x'], y=record['y'])
+        elif op == 'edit':
+            note = notes.get(record['id'])
+            if note is not None:
+                notes[record['id']] = apply_edit(note, record)
+
+    def save_note(self, note_data):
+        self.write_batch([note_data], [])
+
+    def delete_note(self, note_id):
+        self.write_batch([], [note_id])
+
+    def move_note(self, note_id, x, y):
+        self.write_batch([], [], [(note_id, x, y)])
+
+    def edit_note(self, note_id, edit):
+        self.write_batch([], [], edits=[(note_id, edit)])
+
+    def write_batch(self, saves, deletions, moves=(), edits=()):
+        records = [{'op': 'upsert', 'note': note_data} for note_data in saves]
+        records.extend({'op': 'delete', 'id': note_id} for note_id in deletions)
+        # An edit holds what was typed, not the whole content of the note
+        records.extend(dict(edit, op='edit', id=note_id) for note_id, edit in edits)
+        # A move is a few dozen bytes instead of the whole note
+        records.extend({'op': 'move', 'id': note_id, 'x': x, 'y': y} for note_id, x, y in moves)
+        self._append(records)
+        with self._lock:
+            # Applying an edit copies the whole content, so the in-memory
+            # view only does it when something reads the note
+            for note_data in saves:
+                self._pending_edits.pop(note_data['id'], None)
+            for note_id in deletions:
+                self._pending_edits.pop(note_id, None)
+            for note_id, edit in edits:
+                if note_id in self._notes:
+                    self._pending_edits.setdefault(note_id, []).append(edit)
+            for note_id, x, y in moves:
+                self._apply_pending(note_id)
+        self._apply_batch(saves, deletions, moves)
+        self.maybe_compact()
+
+    def _apply_pending(self, note_id=None):
+        """Applies pending edits of one note, or of all of them; needs self._lock"""
+        note_ids = [note_id] if note_id is not None else list(self._pending_edits)
+        for note_id in note_ids:
+            edits = self._pending_edits.pop(note_id, ())
+            note_data = self._notes.get(note_id)
+            if note_data is None:
+                continue
+            for edit in edits:
+                note_data = apply_edit(note_data, edit)
+            self._notes[note_id] = note_data
+
+    def _snapshot(self):
+        with self._lock:
+            self._apply_pending()
+            return list(self._notes.values())
+
+    def _append(self, records):
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        if self._journal is None:
+            self._journal = open(self.journal_file, 'a')
+        self._journal.write(data)
+        self._journal.flush()
+        if self.fsync_policy != FSYNC_NEVER:
+            os.fsync(self._journal.fileno())
+        self.journal_bytes += len(data.encode('utf-8'))
+        self.journal_records += len(records)
+
+    def maybe_compact(self):
+        if self.needs_compaction():
+            self.compact()
+
+    def needs_compaction(self):
+        if self.journal_bytes >= self.max_journal_bytes:
+            return True
+        # Compare against the snapshot size, or the note count while the
+        # snapshot is still empty (fresh installs)
+        if self.snapshot_bytes:
+            return self.journal_bytes >= self.snapshot_bytes * self.max_journal_ratio
+        return self.journal_records > max(len(self._notes), 1) * 8
+
+    def is_compacting(self):
+        return self._compaction_thread is not None and self._compaction_thread.is_alive()
+
+    def compact(self, background=True):
+        """Folds the journal into a fresh snapshot"""
+        if self.is_compacting():
+            return False
+
+        # Rotate the journal so new records keep going to a fresh file while
+        # the snapshot is being written
+        if self._journal:
+            self._journal.close()
+        if os.path.exists(self.rotated_file) and os.path.exists(self.journal_file):
+            # A previous snapshot write failed; keep its records too
+            with open(self.rotated_file, 'a') as rotated, open(self.journal_file, 'r') as current:
+                rotated.write(current.read())
+            os.remove(self.journal_file)
+        elif os.path.exists(self.journal_file):
+            os.replace(self.journal_file, self.rotated_file)
+        self._journal = open(self.journal_file, 'a')
+        self.journal_bytes = 0
+        self.journal_records = 0
+
+        # Note dicts are replaced, never mutated, so a shallow copy is enough
+        with self._lock:
+            self._apply_pending()
+            snapshot = dict(self._notes)
+        if background:
+            self._compaction_thread = threading.Thread(
+                target=self._write_snapshot, args=(snapshot,), name='journal-compaction')
+            self._compaction_thread.start()
+        else:
+            self._write_snapshot(snapshot)
+        return True
+
+    def _write_snapshot_file(self, notes, fsync_policy):
+        """Writes notes as the snapshot; returns them as read back from it"""
+        atomic_write_json(self.snapshot_file, notes, fsync_policy)
+        return notes
+
+    def _write_snapshot(self, notes):
+        try:
+            # The snapshot replaces the rotated journal, so it is always synced
+            self._base = self._write_snapshot_file(
+                notes, FSYNC_BATCH if self.fsync_policy == FSYNC_NEVER else self.fsync_policy)
+            self.last_written = file_identity(self.snapshot_file)
+            self.snapshot_bytes = os.path.getsize(self.snapshot_file)
+            if os.path.exists(self.rotated_file):
+                os.remove(self.rotated_file)
+        except Exception as e:
+            logger.error("Error compacting journal: %s", e)
+
+    def close(self):
+        if self._compaction_thread:
+            self._compaction_thread.join()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
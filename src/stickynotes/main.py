@@ -27,37 +27,139 @@ import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 
-from gi.repository import Gtk, Adw, Gio, GLib
+from gi.repository import Gtk, Adw, Gio, GLib, Gdk
+import logging
 import sys
-import json
 import os
+from concurrent.futures import CancelledError
+
+from . import trace
+
+logger = logging.getLogger(__name__)
 
 # Verify resources are available before importing template classes
-try:
-    # Check if the resource bundle is already registered
-    resources = Gio.resources_enumerate_children('/org/gnome/StickyNotes/', Gio.ResourceLookupFlags.NONE)
-    if not resources:
-        print("ERROR: Resources not registered. Make sure to run through the launcher script.")
+with trace.span('resource_check'):
+    try:
+        # Check if the resource bundle is already registered
+        resources = Gio.resources_enumerate_children('/org/gnome/StickyNotes/', Gio.ResourceLookupFlags.NONE)
+        if not resources:
+            logger.critical("Resources not registered. Make sure to run through the launcher script.")
+            sys.exit(1)
+    except Exception as e:
+        logger.critical("Resources not available: %s", e)
+        logger.critical("Make sure to run through the launcher script that loads resources.")
         sys.exit(1)
-except Exception as e:
-    print(f"ERROR: Resources not available: {e}")
-    print("Make sure to run through the launcher script that loads resources.")
-    sys.exit(1)
 
-from .window import StickyNotesWindow, StickyNote
+from .window import StickyNotesWindow
+from .note import StickyNote
+from .model import NoteModel
+from .autosave import AutosaveScheduler
+from .storage import create_storage
+from .writer import PersistenceWriter
+from .history import HistoryStore, HISTORY_DIR
+from .media import MediaStore, MEDIA_DIR, IngestCancelled, make_block, media_hashes
+from .thumbnails import ThumbnailLoader, THUMBNAIL_DIR
+from .sync import SyncEngine, SYNC_STATE_FILE
+from .monitor import StoreMonitor
+from .search import SearchIndex
+from .registry import NoteRegistry
+from .restore import RestoreScheduler
+from .events import EventBus, NoteEvent, NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED, BULK_RESET, POSITION_FIELDS
+from . import settings as app_settings
+
+# Seconds to wait for pending writes when quitting
+FLUSH_TIMEOUT = 5.0
+
+# Stylesheets shared by every window, from the GResource bundle
+CSS_RESOURCES = [
+    '/org/gnome/StickyNotes/stickynotes/css/note.css',
+    '/org/gnome/StickyNotes/stickynotes/css/preview.css',
+]
 
 class StickyNotesApp(Adw.Application):
     def __init__(self):
         super().__init__(application_id='org.gnome.StickyNotes')
+        # note id -> NoteModel; windows are only created when presented
         self.notes = {}
+        # Every change to self.notes is announced here; the grid and the
+        # search index patch only the note an event is about
+        self.events = EventBus()
+        # note id -> open window and bound preview card
+        self.registry = NoteRegistry()
+        self.restore = RestoreScheduler(self)
         self.main_window = None
-        self.data_file = os.path.expanduser('~/.local/share/sticky-notes.json')
+        self.data_dir = os.path.expanduser('~/.local/share')
+        self.data_file = os.path.join(self.data_dir, 'sticky-notes.json')
+        
+        # Auto-guardado coalescido, configurado desde GSettings
+        self.settings = app_settings.get_settings()
+        self.autosave = AutosaveScheduler(
+            interval=app_settings.get_int(self.settings, 'auto-save-interval', 1000),
+            max_latency=app_settings.get_int(self.settings, 'auto-save-max-latency', 5000)
+        )
+        if self.settings:
+            self.settings.connect('changed::auto-save-interval', self.on_autosave_settings_changed)
+            self.settings.connect('changed::auto-save-max-latency', self.on_autosave_settings_changed)
         
         # Crear directorio si no existe
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        os.makedirs(self.data_dir, exist_ok=True)
+        
+        # Motor de almacenamiento (json, journal o sqlite)
+        self.storage = create_storage(
+            app_settings.get_string(self.settings, 'storage-backend', 'journal'),
+            self.data_dir,
+            fsync_policy=app_settings.get_string(self.settings, 'storage-fsync', 'batch')
+        )
         
         # Cargar datos
         self.load_notes_data()
+        
+        # Archivos de los bloques de imagen/audio, compartidos entre notas
+        self.media = MediaStore(os.path.join(self.data_dir, MEDIA_DIR))
+        # refs.json no es de fiar tras un cierre inesperado: se rehace con
+        # las notas cargadas y los objetos sin uso se borran en segundo plano
+        self.media.rebuild_refs({note_id: note.content for note_id, note in self.notes.items()
+                                 if note.is_enhanced})
+        self.media.collect_garbage_async()
+        self.events.connect(NOTE_ADDED, self.on_note_media_changed)
+        self.events.connect(NOTE_CHANGED, self.on_note_media_changed)
+        self.events.connect(NOTE_REMOVED, self.on_note_media_removed)
+        # Miniaturas para las tarjetas, decodificadas fuera del bucle principal
+        self.thumbnails = ThumbnailLoader(self.media, os.path.join(self.data_dir, THUMBNAIL_DIR))
+        
+        # Índice de búsqueda, mantenido al día con cada cambio. Se construye
+        # unos milisegundos por callback ocioso; mientras tanto las
+        # búsquedas recorren las notas
+        self.search_index = SearchIndex(
+            schedule=lambda step: GLib.idle_add(step, priority=GLib.PRIORITY_DEFAULT_IDLE))
+        # Con contenido diferido, el índice se construye en la primera búsqueda
+        self.search_index.connect_events(self.events, self.notes, lazy=self.storage.lazy_content)
+        with trace.span('search_index_build'):
+            self.events.emit(NoteEvent(BULK_RESET))
+        
+        # From here on the main loop only enqueues changes; the writer
+        # thread does all disk I/O
+        self.history = HistoryStore(
+            os.path.join(self.data_dir, HISTORY_DIR),
+            max_revisions=app_settings.get_int(self.settings, 'history-max-revisions', 200),
+            max_age=app_settings.get_int(self.settings, 'history-max-age-days', 90) * 86400,
+            size_factor=app_settings.get_int(self.settings, 'history-size-factor', 4),
+            min_interval=app_settings.get_int(self.settings, 'history-interval', 60)
+        )
+        self.writer = PersistenceWriter(self.storage, history=self.history)
+        self.writer.start()
+        
+        # Recarga del archivo si otro programa lo modifica
+        self.store_monitor = None
+        if self.storage.monitored_file:
+            self.store_monitor = StoreMonitor(self, self.storage.monitored_file)
+        
+        # Sincronización con el servidor, en su propio hilo
+        self.sync = None
+        self.update_sync()
+        if self.settings:
+            self.settings.connect('changed::sync-enabled', self.update_sync)
+            self.settings.connect('changed::sync-server', self.update_sync)
     
     def do_activate(self):
         # Create main window if it doesn't exist
@@ -67,38 +169,27 @@ class StickyNotesApp(Adw.Application):
         # Print debug information
         self.debug_note_state()
         
-        # Create a list to store restored notes
-        restored_notes = []
+        # First show the main window; the grid and search already cover
+        # every stored note
+        self.main_window.present()
         
         # Restore existing notes or create a new one
         if not self.notes:
-            print("No stored notes found, creating new note")
-            note = self.create_new_note()
-            restored_notes.append(note)
-        else:
-            print(f"Restoring {len(self.notes)} notes")
-            # Restore notes that aren't already open
-            active_notes = self.get_notes()
-            for note_id, note_data in self.notes.items():
-                if note_id not in active_notes:
-                    print(f"Restoring note {note_id}")
-                    note = self.create_note_from_data(note_data)
-                    restored_notes.append(note)
-        
-        # First show the main window
-        self.main_window.present()
-        
-        # Then, update the grid with all notes (both restored and existing)
-        print("Updating main window grid")
-        self.main_window.load_notes()
-        
-        # Finally, present all restored notes
-        for note in restored_notes:
-            note.present()
+            logger.info("No stored notes found, creating new note")
+            self.create_new_note()
+        elif not self.restore.is_running():
+            logger.info("Restoring %d notes", len(self.notes))
+            # Note windows open in frame-budgeted idle chunks, on-screen
+            # and recent notes first
+            pending = [note for note_id, note in self.notes.items()
+                       if self.registry.get_window(note_id) is None]
+            self.restore.start(pending, self.main_window)
     
     def do_startup(self):
         Adw.Application.do_startup(self)
         
+        self.load_css()
+        
         # Acciones globales
         new_note_action = Gio.SimpleAction.new('new-note', None)
         new_note_action.connect('activate', self.on_new_note)
@@ -116,41 +207,81 @@ class StickyNotesApp(Adw.Application):
         self.set_accels_for_action('app.new-note', ['<Control>n'])
         self.set_accels_for_action('app.quit', ['<Control>q'])
     
+    def load_css(self):
+        """Installs one display-wide provider per stylesheet, parsed once"""
+        display = Gdk.Display.get_default()
+        for resource_path in CSS_RESOURCES:
+            try:
+                css_provider = Gtk.CssProvider()
+                css_provider.load_from_resource(resource_path)
+                Gtk.StyleContext.add_provider_for_display(
+                    display,
+                    css_provider,
+                    Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+                )
+            except Exception as e:
+                logger.error("Error loading CSS %s: %s", resource_path, e)
+    
     def create_new_note(self):
-        note = StickyNote(self)
-        
-        # Update main window grid
-        if self.main_window:
-            self.main_window.add_note(note)
+        note = NoteModel()
+        note.touch()
+        self.notes[note.id] = note
+        self.events.emit(NoteEvent(NOTE_ADDED, note))
         
-        note.present()
-        return note
+        window = self.create_note_window(note)
+        window.present()
+        return window
     
-    def create_note_from_data(self, note_data):
-        # Check if note window already exists
-        for window in self.get_windows():
-            if isinstance(window, StickyNote) and window.note_id == note_data['id']:
-                window.present()
-                return window
-        
-        print(f"Creating new note window for note {note_data['id']}")
-        # Create new note window
-        note = StickyNote(application=self, note_data=note_data)
+    def create_note_window(self, note):
+        """Returns the window editing a NoteModel, creating it if needed"""
+        window = self.registry.get_window(note.id)
+        if window is not None:
+            return window
         
-        # Update main window grid
-        if self.main_window:
-            print(f"Adding note {note_data['id']} to main window")
-            self.main_window.add_note(note)
-            self.main_window.update_notes_grid()  # Force grid update
-        
-        return note
+        logger.debug("Creating new note window for note %s", note.id)
+        with trace.span('note_window', note=note.id):
+            window = StickyNote(self, note)
+        self.registry.add_window(window)
+        return window
+    
+    def present_note(self, note_id):
+        """Opens the window of a stored note"""
+        note = self.notes.get(note_id)
+        if note is None:
+            return None
+        window = self.create_note_window(note)
+        window.present()
+        return window
     
     def on_new_note(self, action, parameter):
         self.create_new_note()
     
     def on_quit(self, action, parameter):
+        self.autosave.flush_all()
+        if not self.writer.flush(timeout=FLUSH_TIMEOUT):
+            logger.warning("Timed out waiting for notes to be written")
         self.quit()
     
+    def do_shutdown(self):
+        self.restore.cancel()
+        # Make sure nothing typed in the last interval is lost
+        self.autosave.flush_all()
+        if self.store_monitor is not None:
+            self.store_monitor.cancel()
+        if self.sync is not None:
+            self.sync.stop(timeout=FLUSH_TIMEOUT)
+        self.thumbnails.close()
+        self.media.close()
+        if self.writer.stop(timeout=FLUSH_TIMEOUT):
+            self.storage.close()
+        else:
+            logger.warning("Some note changes could not be written before quitting")
+        Adw.Application.do_shutdown(self)
+    
+    def on_autosave_settings_changed(self, settings, key):
+        self.autosave.interval = settings.get_int('auto-save-interval')
+        self.autosave.max_latency = settings.get_int('auto-save-max-latency')
+    
     def on_about(self, action, parameter):
         about = Adw.AboutWindow(
             transient_for=self.main_window,
@@ -170,39 +301,209 @@ class StickyNotesApp(Adw.Application):
         # Remove from storage
         if note_id in self.notes:
             del self.notes[note_id]
-            self.save_notes_data()
+            self.writer.enqueue_delete(note_id)
+            self.events.emit(NoteEvent(NOTE_REMOVED, note_id=note_id))
+    
+    @trace.traced('save_note_data')
+    def save_note_data(self, note, fields=None):
+        """Stores a note; `fields` names what changed (None: anything)"""
+        is_new = note.id not in self.notes
+        self.notes[note.id] = note
+        note.revision += 1
+        # The writer thread gets a snapshot, not the live model
+        self.writer.enqueue_save(note.to_dict())
+        self.writer.enqueue_revision(note.id, note.text)
+        if is_new:
+            self.events.emit(NoteEvent(NOTE_ADDED, note))
+        else:
+            self.events.emit(NoteEvent(NOTE_CHANGED, note, fields=fields))
+    
+    @trace.traced('save_note_edit')
+    def save_note_edit(self, note, ops, fields):
+        """Stores a change to a saved note as the ops applied to its content.
+
+        `ops` come from the window's EditLog and must turn the content of
+        the stored revision into note.content; see edits.py.
+        """
+        note_data = note.to_dict()
+        del note_data['content']
+        base = note.revision
+        note.revision = note_data['revision'] = base + 1
+        self.writer.enqueue_edit(note.id, {'base': base, 'rev': note.revision,
+                                           'ops': ops, 'fields': note_data})
+        self.writer.enqueue_revision(note.id, note.text)
+        self.events.emit(NoteEvent(NOTE_CHANGED, note, fields=fields))
+    
+    def apply_remote_note(self, note_data, store=True):
+        """Takes a version of a note that was changed elsewhere.
+        
+        With `store` it is saved as a new revision (sync from another
+        device); without, it is already in storage (the store file was
+        changed by another program) and only the model, its window and the
+        listeners are updated.
+        """
+        remote = NoteModel.from_dict(note_data)
+        note = self.notes.get(remote.id)
+        if note is None:
+            if store:
+                self.save_note_data(remote)
+            else:
+                self.notes[remote.id] = remote
+                self.writer.enqueue_revision(remote.id, remote.text)
+                self.events.emit(NoteEvent(NOTE_ADDED, remote))
+            return remote
         
-        # Update main window grid
-        if self.main_window:
-            self.main_window.remove_note(note_id)
+        # Updated in place: the window and the preview card hold this model
+        snapshot = note.snapshot()
+        if store:
+            remote.revision = note.revision
+        for field in NoteModel.__slots__:
+            setattr(note, field, getattr(remote, field))
+        fields = note.changed_fields(snapshot)
+        if not fields:
+            return note
+        self.autosave.cancel(note.id)
+        if store:
+            self.save_note_data(note, fields)
+        else:
+            self.writer.enqueue_revision(note.id, note.text)
+            self.events.emit(NoteEvent(NOTE_CHANGED, note, fields=fields))
+        window = self.registry.get_window(note.id)
+        if window is not None:
+            window.reload_model()
+        return note
     
-    def save_note_data(self, note_data):
-        self.notes[note_data['id']] = note_data
-        self.save_notes_data()
+    def apply_remote_deletion(self, note_id, store=True):
+        """Removes a note that was deleted elsewhere"""
+        window = self.registry.get_window(note_id)
+        self.autosave.cancel(note_id)
+        if store:
+            self.remove_note(note_id)
+        elif self.notes.pop(note_id, None) is not None:
+            self.events.emit(NoteEvent(NOTE_REMOVED, note_id=note_id))
+        if window is not None:
+            window.destroy()
     
-    def load_notes_data(self):
+    def apply_external_changes(self, changed, removed, pending):
+        """Applies notes another program changed in the store file (see StoreMonitor).
+        
+        Notes with unsaved or unwritten local changes keep them: those are
+        newer and will overwrite the store again.
+        """
+        def is_local(note_id):
+            return (note_id in pending or self.autosave.has_pending(note_id)
+                    or self.writer.has_pending(note_id))
+        
+        with trace.span('apply_external_changes', changed=len(changed), removed=len(removed)):
+            for note_data in changed:
+                if not is_local(note_data['id']):
+                    self.apply_remote_note(note_data, store=False)
+            for note_id in removed:
+                if not is_local(note_id):
+                    self.apply_remote_deletion(note_id, store=False)
+        return GLib.SOURCE_REMOVE
+    
+    def update_sync(self, *args):
+        """Starts or stops the sync engine to follow the sync-enabled and sync-server settings"""
+        if self.sync is not None:
+            self.sync.stop(timeout=FLUSH_TIMEOUT)
+            self.sync = None
+        server = app_settings.get_string(self.settings, 'sync-server', '')
+        if not app_settings.get_boolean(self.settings, 'sync-enabled', False) or not server:
+            return
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.notes = json.load(f)
-        except Exception as e:
-            print(f"Error cargando datos: {e}")
-            self.notes = {}
+            self.sync = SyncEngine(self, server, os.path.join(self.data_dir, SYNC_STATE_FILE),
+                                   dispatch=GLib.idle_add)
+        except ValueError as e:
+            logger.error("Error configurando sincronización: %s", e)
+            return
+        self.sync.start()
     
-    def save_notes_data(self):
+    def get_note_revisions(self, note_id):
+        """Returns the stored history revisions of a note, newest first"""
+        return self.history.list_revisions(note_id)
+    
+    def restore_note_revision(self, note_id, index):
+        """Puts a history revision back into the note's window and saves it as the newest"""
+        note = self.notes.get(note_id)
+        if note is None:
+            return None
+        try:
+            content = self.history.get_revision(note_id, index)
+        except (KeyError, OSError, ValueError) as e:
+            logger.error("Error restaurando revisión %s de %s: %s", index, note_id, e)
+            return None
+        window = self.create_note_window(note)
+        window.restore_content(content)
+        window.present()
+        return window
+    
+    def on_note_media_changed(self, event):
+        if event.touches(('content',)):
+            self.release_media(self.media.set_note_refs(event.note_id, media_hashes(event.note.content)))
+    
+    def on_note_media_removed(self, event):
+        self.release_media(self.media.release_note(event.note_id))
+    
+    def release_media(self, digests):
+        """Deletes media objects no note uses any more, once the notes that let go of them are written"""
+        if digests:
+            # The change was enqueued before its event, so it is in the writes waited for
+            self.writer.after_written(lambda: self.media.delete_unused(digests))
+    
+    def import_media(self, path, on_done, on_progress=None):
+        """Adds a file to the media store from a worker thread.
+        
+        on_progress(job) and on_done(block) run on the main loop; block is
+        the content block to insert into the note, or None if the import
+        failed or was cancelled.
+        """
+        progress = None
+        if on_progress:
+            progress = lambda job: GLib.idle_add(on_progress, job)
+        job = self.media.ingest_async(path, progress)
+        job.future.add_done_callback(
+            lambda future: GLib.idle_add(self.on_media_imported, job, on_done))
+        return job
+    
+    def on_media_imported(self, job, on_done):
+        block = None
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.notes, f, indent=2)
+            block = make_block(job.future.result(), job.name, job.size)
+        except (CancelledError, IngestCancelled):
+            logger.debug("Import of %s cancelled", job.path)
+        except OSError as e:
+            logger.error("Error importando %s: %s", job.path, e)
+        on_done(block)
+        return GLib.SOURCE_REMOVE
+    
+    def save_note_position(self, note):
+        """Stores a moved note without touching its content or timestamp"""
+        self.writer.enqueue_move(note.id, note.x, note.y)
+        self.events.emit(NoteEvent(NOTE_CHANGED, note, fields=POSITION_FIELDS))
+    
+    @trace.traced('load_notes_data')
+    def load_notes_data(self):
+        # Filled in place: subscribers keep a reference to self.notes
+        self.notes.clear()
+        try:
+            stored = self.storage.load()
+            self.notes.update((note_id, NoteModel.from_dict(note_data))
+                              for note_id, note_data in stored.items())
         except Exception as e:
-            print(f"Error guardando datos: {e}")
+            logger.error("Error cargando datos: %s", e)
+    
+    def get_recent_notes(self, limit):
+        """Returns the most recently modified notes, newest first"""
+        return self.storage.recent_notes(limit)
+    
+    def get_notes_by_color(self, color):
+        """Returns the stored notes with the given color"""
+        return self.storage.notes_by_color(color)
     
     def get_notes(self):
-        """Returns a dictionary of active note windows"""
-        active_notes = {}
-        for window in self.get_windows():
-            if isinstance(window, StickyNote):
-                active_notes[window.note_id] = window
-        return active_notes
+        """Returns the note id -> note window registry (do not modify it)"""
+        return self.registry.windows
         
     def get_main_window(self):
         """Returns the main application window"""
@@ -212,16 +513,21 @@ class StickyNotesApp(Adw.Application):
         
     def debug_note_state(self):
         """Print debug information about current note state"""
-        print("\nNote State Debug:")
-        print(f"Stored notes: {len(self.notes)}")
-        for note_id, note_data in self.notes.items():
-            print(f"  - Note {note_id}: {note_data.get('content', '')[:30]}...")
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("Note State Debug:")
+        logger.debug("Stored notes: %d", len(self.notes))
+        for note_id, note in self.notes.items():
+            # Only notes already opened have their content decoded
+            text = note.content[:30] if note.content_loaded else note.title
+            logger.debug("  - Note %s: %s...", note_id, text)
         
         active_notes = self.get_notes()
-        print(f"Active notes: {len(active_notes)}")
-        for note_id, note in active_notes.items():
-            print(f"  - Note {note_id}: {note.save_note().get('content', '')[:30]}...")
+        logger.debug("Active notes: %d %s", len(active_notes), self.registry.get_stats())
+        for note_id, window in active_notes.items():
+            logger.debug("  - Note %s: %s...", note_id, window.model.text[:30])
 
 def main(version):
+    trace.setup_logging()
     app = StickyNotesApp()
     return app.run(sys.argv)
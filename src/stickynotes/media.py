@@ -0,0 +1,455 @@
+# media.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Content-addressed store for the media files of enhanced-format blocks.
+
+Files are stored once, under the SHA-256 of their content:
+
+    media/ab/ab12...ef
+
+and image/audio blocks refer to them by hash, so the same screenshot
+pasted into ten notes is one file. refs.json records which notes use each
+object. When its last note lets go of an object, the object is deleted
+with delete_unused() once that note is stored without it. Deleting it
+earlier would leave the stored note pointing at a missing file if the
+application stopped in between.
+"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = os.path.join('sticky-notes', 'media')
+REFS_FILE = 'refs.json'
+
+CHUNK_SIZE = 1024 * 1024
+# Chunk handed to copy_file_range(), so progress and cancellation still work
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+# Unreferenced objects younger than this may belong to an ingest whose
+# block is not saved yet; collect_garbage() leaves them alone
+GRACE_PERIOD = 3600
+
+MEDIA_BLOCK_TYPES = ('image', 'audio', 'file')
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# copy_file_range()/FICLONE errors meaning "not here", not "failed"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                errno.ENOTTY, errno.EBADF, errno.EPERM}
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+def media_hashes(content):
+    """Returns the hashes of the media objects referenced by a note's content blocks"""
+    if not isinstance(content, dict):
+        return frozenset()
+    return frozenset(block['hash'] for block in content.get('blocks') or ()
+                     if block.get('type') in MEDIA_BLOCK_TYPES and block.get('hash'))
+
+
+def make_block(digest, name, size):
+    """Returns the content block for an ingested file"""
+    mime_type = mimetypes.guess_type(name)[0] or ''
+    block_type = mime_type.split('/')[0]
+    if block_type not in ('image', 'audio'):
+        block_type = 'file'
+    return {
+        'type': block_type,
+        'hash': digest,
+        'path': '/'.join(('media', digest[:2], digest)),
+        'name': name,
+        'size': size,
+    }
+
+
+class IngestJob:
+    """A file being added to the store from the worker pool.
+
+    `done` and `total` count bytes over both passes: hashing the source,
+    then copying it unless the store already has it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = 0
+        self.total = 0
+        self.done = 0
+        self.phase = 'hash'
+        self.future = None
+        self._cancelled = threading.Event()
+        self._reported = 0
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+
+class MediaStore:
+    """Media objects keyed by content hash, reference-counted by note"""
+
+    def __init__(self, root, workers=2):
+        self.root = root
+        self.workers = workers
+        self._refs_file = os.path.join(root, REFS_FILE)
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self._jobs = set()
+        # Ingested objects no note references yet
+        self._pinned = set()
+        # hash -> releases waiting for delete_unused(); neither it nor
+        # collect_garbage() deletes an object until the last one is done
+        self._releasing = {}
+
+        # hash -> set of note ids, and the reverse
+        self._refs = {}
+        self._by_note = {}
+        if os.path.exists(self._refs_file):
+            try:
+                with open(self._refs_file, 'r') as f:
+                    self._set_refs({digest: set(note_ids) for digest, note_ids in json.load(f).items()})
+            except (OSError, ValueError) as e:
+                logger.error("Error leyendo %s: %s", self._refs_file, e)
+
+        # Contadores para instrumentación
+        self.ingested = 0
+        self.deduplicated = 0
+        self.bytes_copied = 0
+        self.reflinks = 0
+
+    def object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    # Ingest
+
+    def ingest(self, path, job=None, progress=None):
+        """Adds a file to the store; returns its hash.
+
+        Runs in the calling thread, so call it from a worker (see
+        ingest_async()). progress(job) is called from that thread as well.
+        """
+        job = job or IngestJob(path)
+        with open(path, 'rb') as source:
+            before = os.fstat(source.fileno())
+            job.size = before.st_size
+            job.total = before.st_size * 2
+
+            digest = self._hash(source, job, progress)
+            with self._lock:
+                # Kept until a note references it, even if another note
+                # releases the same object meanwhile
+                self._pinned.add(digest)
+                existing = self.has(digest)
+                if existing:
+                    # Restarts the grace period of collect_garbage()
+                    os.utime(self.object_path(digest))
+            if existing:
+                self.deduplicated += 1
+                job.done = job.total
+                self._report(job, progress, force=True)
+                return digest
+
+            job.phase = 'copy'
+            os.makedirs(os.path.join(self.root, digest[:2]), exist_ok=True)
+            temp_path = os.path.join(self.root, f'.ingest-{digest}-{threading.get_ident()}')
+            try:
+                with open(temp_path, 'wb') as target:
+                    source.seek(0)
+                    self._copy(source, target, job, progress)
+                    target.flush()
+                    os.fsync(target.fileno())
+                after = os.fstat(source.fileno())
+                if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+                    raise OSError(errno.EAGAIN, f"{path} changed while it was being imported")
+                # Another ingest of the same content may have won the race;
+                # the content is identical, so replacing it is harmless
+                os.replace(temp_path, self.object_path(digest))
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        self.ingested += 1
+        job.done = job.total
+        self._report(job, progress, force=True)
+        return digest
+
+    def ingest_async(self, path, progress=None):
+        """Starts ingest() on the worker pool; returns the IngestJob, whose future gives the hash"""
+        job = IngestJob(path)
+        with self._lock:
+            self._jobs.add(job)
+            job.future = self._pool().submit(self.ingest, path, job, progress)
+        job.future.add_done_callback(lambda future: self._jobs.discard(job))
+        return job
+
+    def _pool(self):
+        # Called with self._lock held
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix='media')
+        return self._executor
+
+    def _hash(self, source, job, progress):
+        digest = hashlib.sha256()
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        while True:
+            self._check(job)
+            count = source.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+            job.done += count
+            self._report(job, progress)
+        return digest.hexdigest()
+
+    def _copy(self, source, target, job, progress):
+        """Copies source into target: reflink, then copy_file_range(), then plain reads and writes"""
+        src, dst = source.fileno(), target.fileno()
+        try:
+            fcntl.ioctl(dst, FICLONE, src)
+            self.reflinks += 1
+            job.done += job.size
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+        offset = 0
+        try:
+            while True:
+                self._check(job)
+                count = os.copy_file_range(src, dst, COPY_CHUNK_SIZE)
+                if not count:
+                    break
+                offset += count
+                self._copied(job, count, progress)
+            return
+        except OSError as e:
+            # Only fall back if nothing was copied yet
+            if offset or e.errno not in _UNSUPPORTED:
+                raise
+
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        while True:
+            self._check(job)
+            count = source.readinto(buffer)
+            if not count:
+                break
+            target.write(view[:count])
+            self._copied(job, count, progress)
+
+    def _copied(self, job, count, progress):
+        job.done += count
+        self.bytes_copied += count
+        self._report(job, progress)
+
+    def _check(self, job):
+        if job.cancelled:
+            raise IngestCancelled(job.path)
+
+    def _report(self, job, progress, force=False):
+        # Roughly once per percent, not once per chunk
+        if progress is None:
+            return
+        step = max(job.total // 100, CHUNK_SIZE)
+        if force or job.done - job._reported >= step:
+            job._reported = job.done
+            progress(job)
+
+    # References
+
+    def refcount(self, digest):
+        with self._lock:
+            return len(self._refs.get(digest, ()))
+
+    def set_note_refs(self, note_id, digests):
+        """Makes note_id reference exactly `digests`; returns the objects nobody references any more.
+
+        They are kept until delete_unused() is called with them, once the
+        note is stored without them.
+        """
+        with self._lock:
+            current = self._by_note.get(note_id, frozenset())
+            if current == digests:
+                return frozenset()
+            released = set()
+            for digest in current - digests:
+                note_ids = self._refs[digest]
+                note_ids.discard(note_id)
+                if not note_ids:
+                    del self._refs[digest]
+                    released.add(digest)
+            for digest in digests - current:
+                self._refs.setdefault(digest, set()).add(note_id)
+                self._pinned.discard(digest)
+            if digests:
+                self._by_note[note_id] = frozenset(digests)
+            else:
+                self._by_note.pop(note_id, None)
+            for digest in released:
+                self._releasing[digest] = self._releasing.get(digest, 0) + 1
+            self._save_refs()
+            return frozenset(released)
+
+    def add_ref(self, digest, note_id):
+        with self._lock:
+            current = self._by_note.get(note_id, frozenset())
+        if digest not in current:
+            self.set_note_refs(note_id, current | {digest})
+
+    def release_note(self, note_id):
+        """Drops every reference held by a deleted note; returns the objects nobody references any more"""
+        return self.set_note_refs(note_id, frozenset())
+
+    def delete_unused(self, digests):
+        """Deletes the objects of `digests` that are still unreferenced; returns how many"""
+        removed = 0
+        for digest in digests:
+            with self._lock:
+                pending = self._releasing.pop(digest, 1) - 1
+                if pending:
+                    self._releasing[digest] = pending
+            if self._delete_if_unused(digest):
+                removed += 1
+        return removed
+
+    def _set_refs(self, refs):
+        self._refs = refs
+        self._by_note = {}
+        for digest, note_ids in refs.items():
+            for note_id in note_ids:
+                self._by_note.setdefault(note_id, set()).add(digest)
+        self._by_note = {note_id: frozenset(digests) for note_id, digests in self._by_note.items()}
+
+    def _save_refs(self):
+        # Called with self._lock held
+        os.makedirs(self.root, exist_ok=True)
+        atomic_write_json(self._refs_file, {digest: sorted(note_ids)
+                                            for digest, note_ids in self._refs.items()})
+
+    def _delete_if_unused(self, digest):
+        with self._lock:
+            if self._refs.get(digest) or digest in self._pinned or digest in self._releasing:
+                return False
+            try:
+                os.remove(self.object_path(digest))
+                logger.debug("Deleted unused media %s", digest)
+                return True
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error("Error borrando %s: %s", digest, e)
+            return False
+
+    def rebuild_refs(self, contents):
+        """Replaces the references with those of the notes' blocks (note id -> note content), repairing refs.json"""
+        refs = {}
+        for note_id, content in contents.items():
+            for digest in media_hashes(content):
+                refs.setdefault(digest, set()).add(note_id)
+        with self._lock:
+            if refs == self._refs:
+                return
+            logger.info("Repairing %s", self._refs_file)
+            self._set_refs(refs)
+            self._save_refs()
+
+    def collect_garbage(self, contents=None):
+        """Deletes objects no note references; returns how many.
+
+        With `contents` (see rebuild_refs()) the references are rebuilt first.
+        """
+        if contents is not None:
+            self.rebuild_refs(contents)
+
+        removed = 0
+        cutoff = time.time() - GRACE_PERIOD
+        if not os.path.isdir(self.root):
+            return 0
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if prefix.startswith('.ingest-') and os.path.getmtime(directory) < cutoff:
+                # Left behind by an interrupted ingest
+                os.remove(directory)
+                continue
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for digest in os.listdir(directory):
+                path = os.path.join(directory, digest)
+                with self._lock:
+                    if (self._refs.get(digest) or digest in self._pinned or digest in self._releasing
+                            or os.path.getmtime(path) > cutoff):
+                        continue
+                    os.remove(path)
+                removed += 1
+        return removed
+
+    def collect_garbage_async(self):
+        """Starts collect_garbage() on the worker pool; returns its future"""
+        with self._lock:
+            return self._pool().submit(self.collect_garbage)
+
+    def get_stats(self):
+        with self._lock:
+            objects = len(self._refs)
+        return {
+            'objects': objects,
+            'ingested': self.ingested,
+            'deduplicated': self.deduplicated,
+            'bytes_copied': self.bytes_copied,
+            'reflinks': self.reflinks,
+        }
+
+    def close(self):
+        """Cancels running ingests and stops the worker pool"""
+        for job in list(self._jobs):
+            job.cancel()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
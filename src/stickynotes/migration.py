@@ -0,0 +1,412 @@
+# migration.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Streaming migration of a JSON store from the basic to the enhanced format.
+
+The store is read one note at a time, each note is converted as it is
+read, and the result is appended to `<store>.part`. Every few MiB the part
+file is synced and a checkpoint records how far both files got, so an
+interrupted migration picks up from there. Memory use is bounded by the
+largest single note, not by the size of the store.
+
+Once everything is written the original file is kept as `<store>.basic`
+and the part file atomically replaces it.
+"""
+
+import argparse
+import codecs
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime
+
+from .model import NoteModel
+from .storage import FSYNC_BATCH, FSYNC_NEVER, atomic_write_json, fsync_directory
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+PART_SUFFIX = '.part'
+CHECKPOINT_SUFFIX = '.migration'
+BACKUP_SUFFIX = '.basic'
+
+READ_CHUNK = 1024 * 1024
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+# Basic-format keys that move into content blocks or metadata
+_MOVED = ('content', 'color', 'x', 'y', 'timestamp', 'tags')
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_MISSING = object()
+
+_OBJECT = 'object'
+_ARRAY = 'array'
+
+
+class MigrationError(Exception):
+    """The store cannot be migrated as it is"""
+
+
+def is_enhanced(note):
+    return isinstance(note.get('content'), dict)
+
+
+def to_enhanced(note, now=None):
+    """Returns a basic-format note as an enhanced one (see STORAGE.md 1.2)"""
+    if is_enhanced(note):
+        return note
+    timestamp = note.get('timestamp') or now
+    enhanced = {k: v for k, v in note.items() if k not in _MOVED}
+    enhanced['content'] = {
+        'blocks': [{
+            'type': 'text',
+            'content': note.get('content') or '',
+            'format': {'bold': False, 'italic': False, 'underline': False},
+        }],
+    }
+    enhanced['metadata'] = {
+        'created': timestamp,
+        'modified': timestamp,
+        'color': note.get('color', 'yellow'),
+        'tags': note.get('tags', []),
+        'position': {'x': note.get('x', 100), 'y': note.get('y', 100)},
+    }
+    enhanced['version'] = FORMAT_VERSION
+    return enhanced
+
+
+def to_basic(note):
+    """Returns an enhanced note as a basic one; only text blocks are kept"""
+    if not is_enhanced(note):
+        return note
+    metadata = note.get('metadata') or {}
+    position = metadata.get('position') or {}
+    basic = {k: v for k, v in note.items() if k not in ('content', 'metadata', 'version')}
+    basic['content'] = '\n'.join(block.get('content', '')
+                                 for block in note['content'].get('blocks', ())
+                                 if block.get('type') == 'text')
+    basic['color'] = metadata.get('color', 'yellow')
+    basic['x'] = position.get('x', 100)
+    basic['y'] = position.get('y', 100)
+    basic['timestamp'] = metadata.get('modified')
+    basic['tags'] = metadata.get('tags', [])
+    return basic
+
+
+class NoteReader:
+    """Iterates over the notes of a JSON store without loading all of it.
+
+    Accepts the id -> note object the storage engines write as well as a
+    plain list of notes, and yields (key, note) pairs, key being None for a
+    list. position() is the byte offset just past the last note yielded;
+    a reader created with that offset and the same container continues
+    from there.
+    """
+
+    def __init__(self, f, offset=0, container=None, first=True, chunk_size=READ_CHUNK):
+        self.f = f
+        self.container = container
+        self.chunk_size = chunk_size
+        self._first = first
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        # Byte offset of self._buffer[0] in the file
+        self._base = offset
+        self._eof = False
+        f.seek(offset)
+
+    def position(self):
+        return self._base + len(self._buffer[:self._pos].encode('utf-8'))
+
+    def _more(self):
+        """Reads more input; at least as much as is buffered, so a huge note takes few retries"""
+        if self._eof:
+            return False
+        if self._pos:
+            self._base += len(self._buffer[:self._pos].encode('utf-8'))
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        data = self.f.read(max(self.chunk_size, len(self._buffer)))
+        self._buffer += self._decoder.decode(data, final=not data)
+        self._eof = not data
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._more():
+                return
+
+    def _expect(self, chars):
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer) or self._buffer[self._pos] not in chars:
+            found = self._buffer[self._pos:self._pos + 1] or 'end of file'
+            raise ValueError(f"expected {' or '.join(chars)} at byte {self.position()}, found {found!r}")
+        self._pos += 1
+        return self._buffer[self._pos - 1]
+
+    def _value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._more():
+                    continue
+                raise ValueError(f"invalid JSON at byte {self.position()}: {e.msg}") from e
+            # A number at the end of the buffer may go on in the next chunk
+            if end == len(self._buffer) and isinstance(value, (int, float)) and self._more():
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        if self.container is None:
+            self.container = _OBJECT if self._expect('{[') == '{' else _ARRAY
+        close = '}' if self.container == _OBJECT else ']'
+        while True:
+            self._skip_whitespace()
+            if self._buffer[self._pos:self._pos + 1] == close:
+                self._pos += 1
+                return
+            if not self._first:
+                self._expect(',')
+            self._first = False
+            key = None
+            if self.container == _OBJECT:
+                key = self._value()
+                if not isinstance(key, str):
+                    raise ValueError(f"expected a note id at byte {self.position()}")
+                self._expect(':')
+            yield key, self._value()
+
+
+class _Checkpoint:
+    """How far a migration got, stored next to the part file"""
+
+    def __init__(self, source, state=None):
+        stat = os.stat(source)
+        # The checkpoint is only valid for the exact file it was made from
+        self.source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+        self.input_offset = 0
+        self.output_offset = 0
+        self.container = None
+        self.notes = 0
+        # Notes that were still in the basic format
+        self.converted = 0
+        if state and state.get('source') == self.source:
+            self.input_offset = state['input_offset']
+            self.output_offset = state['output_offset']
+            self.container = state['container']
+            self.notes = state['notes']
+            self.converted = state['converted']
+
+    def to_dict(self):
+        return {
+            'source': self.source,
+            'input_offset': self.input_offset,
+            'output_offset': self.output_offset,
+            'container': self.container,
+            'notes': self.notes,
+            'converted': self.converted,
+        }
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable migration checkpoint %s: %s", path, e)
+        return None
+
+
+def _journal_pending(source):
+    """True if a journal next to the store has records not folded into it yet"""
+    base, _ = os.path.splitext(source)
+    for path in (base + '.journal', base + '.journal.old'):
+        try:
+            if os.path.getsize(path) > 0:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def migrate(source, checkpoint_bytes=CHECKPOINT_BYTES, chunk_size=READ_CHUNK,
+            fsync_policy=FSYNC_BATCH, now=None, limit=None):
+    """Migrates the JSON store at source to the enhanced format, in place.
+
+    Resumes from the checkpoint of an earlier interrupted run. `limit`
+    stops after that many notes, leaving the checkpoint behind, as an
+    interruption would. Returns the number of notes converted so far; if
+    every note was already enhanced the store is left as it is.
+    Must not run while the application has the store open.
+    """
+    if _journal_pending(source):
+        raise MigrationError(f"{source} has a journal that is not compacted yet")
+    now = now or datetime.now().isoformat()
+    part_path = source + PART_SUFFIX
+    checkpoint_path = source + CHECKPOINT_SUFFIX
+    checkpoint = _Checkpoint(source, _read_checkpoint(checkpoint_path))
+    try:
+        if os.path.getsize(part_path) < checkpoint.output_offset:
+            checkpoint = _Checkpoint(source)
+    except FileNotFoundError:
+        checkpoint = _Checkpoint(source)
+    if checkpoint.notes:
+        logger.info("Resuming migration of %s after %d notes", source, checkpoint.notes)
+
+    with open(source, 'rb') as src, open(part_path, 'r+b' if checkpoint.output_offset else 'wb') as out:
+        # Anything written after the last checkpoint is redone
+        out.truncate(checkpoint.output_offset)
+        out.seek(checkpoint.output_offset)
+        if not checkpoint.output_offset:
+            checkpoint.output_offset = out.write(b'{')
+
+        reader = NoteReader(src, checkpoint.input_offset, checkpoint.container,
+                            first=not checkpoint.notes, chunk_size=chunk_size)
+        pending = 0
+        for key, note in reader:
+            if not isinstance(note, dict):
+                raise ValueError(f"note {checkpoint.notes} of {source} is not an object")
+            key = key if key is not None else note.get('id')
+            if not isinstance(key, str):
+                raise ValueError(f"note {checkpoint.notes} of {source} has no id")
+            if not is_enhanced(note):
+                note = to_enhanced(note, now)
+                checkpoint.converted += 1
+            # Laid out as atomic_write_json() would write the whole store
+            entry = '  ' + json.dumps(key) + ': ' + json.dumps(note, indent=2).replace('\n', '\n  ')
+            data = (b',\n' if checkpoint.notes else b'\n') + entry.encode('utf-8')
+            out.write(data)
+            pending += len(data)
+            checkpoint.notes += 1
+            if pending >= checkpoint_bytes or checkpoint.notes == limit:
+                checkpoint.container = reader.container
+                _save_checkpoint(out, checkpoint, reader, pending, checkpoint_path, fsync_policy)
+                pending = 0
+                if checkpoint.notes == limit:
+                    return checkpoint.converted
+
+        out.write(b'\n}')
+        if fsync_policy != FSYNC_NEVER:
+            out.flush()
+            os.fsync(out.fileno())
+
+    if not checkpoint.converted:
+        # Already enhanced; keep the store and any earlier backup untouched
+        os.remove(part_path)
+        _remove(checkpoint_path)
+        return 0
+
+    # The original stays as <store>.basic; the hard link costs no copy
+    backup_path = source + BACKUP_SUFFIX
+    if os.path.exists(backup_path):
+        os.remove(backup_path)
+    try:
+        os.link(source, backup_path)
+    except OSError:
+        shutil.copy2(source, backup_path)
+    os.replace(part_path, source)
+    if fsync_policy != FSYNC_NEVER:
+        fsync_directory(source)
+    _remove(checkpoint_path)
+    logger.info("Migrated %d of %d notes of %s to the enhanced format",
+                checkpoint.converted, checkpoint.notes, source)
+    return checkpoint.converted
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _save_checkpoint(out, checkpoint, reader, written, path, fsync_policy):
+    out.flush()
+    if fsync_policy != FSYNC_NEVER:
+        os.fsync(out.fileno())
+    checkpoint.input_offset = reader.position()
+    checkpoint.output_offset += written
+    atomic_write_json(path, checkpoint.to_dict(), fsync_policy)
+
+
+def verify(backup, migrated, chunk_size=READ_CHUNK):
+    """Checks a migrated store against the original, note by note.
+
+    Both files are streamed side by side. Each migrated note goes through
+    NoteModel as the application would load and save it: its text must be
+    the original content byte for byte, and converting the saved note back
+    to the basic format must give the original keys. Returns the number of
+    notes checked; raises ValueError at the first note that differs.
+    """
+    with open(backup, 'rb') as a, open(migrated, 'rb') as b:
+        originals = iter(NoteReader(a, chunk_size=chunk_size))
+        count = 0
+        for key, note in NoteReader(b, chunk_size=chunk_size):
+            try:
+                original_key, original = next(originals)
+            except StopIteration:
+                raise ValueError(f"{migrated} has more notes than {backup}") from None
+            original_key = original_key if original_key is not None else original.get('id')
+            if key != original_key:
+                raise ValueError(f"note {count}: id {key!r} instead of {original_key!r}")
+            if is_enhanced(original):
+                if note != original:
+                    raise ValueError(f"note {key}: enhanced note changed by migration")
+            else:
+                model = NoteModel.from_dict(note)
+                if model.text.encode('utf-8') != (original.get('content') or '').encode('utf-8'):
+                    raise ValueError(f"note {key}: content differs after migration")
+                restored = to_basic(model.to_dict())
+                for field, value in original.items():
+                    if field != 'content' and restored.get(field, _MISSING) != value:
+                        raise ValueError(f"note {key}: {field} differs after migration")
+            count += 1
+        if next(originals, None) is not None:
+            raise ValueError(f"{migrated} has fewer notes than {backup}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('store', help='sticky-notes.json; the application must not be running')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Resumes an interrupted run, then checks the result the way the
+    # application will read it
+    if migrate(args.store):
+        count = verify(args.store + BACKUP_SUFFIX, args.store)
+        logger.info("Verified %d notes of %s", count, args.store)
+    else:
+        logger.info("%s is already in the enhanced format", args.store)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# model.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import uuid
+from datetime import datetime
+
+DEFAULT_COLOR = 'yellow'
+DEFAULT_X = 100
+DEFAULT_Y = 100
+
+_FIELDS = ('id', 'title', 'content', 'color', 'x', 'y', 'timestamp', 'revision')
+
+
+def content_text(content):
+    """Returns the text of enhanced-format content blocks, one block per line"""
+    return '\n'.join(block.get('content') or '' for block in content.get('blocks') or ()
+                     if block.get('type') == 'text')
+
+
+def text_block(text):
+    """Returns an unformatted enhanced-format text block"""
+    return {'type': 'text', 'content': text,
+            'format': {'bold': False, 'italic': False, 'underline': False}}
+
+
+class LazyContent:
+    """Stands for the content of a stored note until it is first read.
+
+    Engines that can decode note bodies on demand (see indexed_storage.py)
+    put one in the 'content' key of the notes they load; `preview` is the
+    (title, snippet, image) a preview card shows meanwhile, or None.
+    `enhanced` tells whether the content is enhanced-format blocks without
+    decoding it, or is None if the engine does not know.
+    """
+
+    __slots__ = ('preview',)
+
+    enhanced = None
+
+    def __init__(self, preview=None):
+        self.preview = preview
+
+    def load(self):
+        """Returns the decoded content"""
+        raise NotImplementedError
+
+
+class NoteModel:
+    """Plain record for a stored note.
+
+    The grid, the search index and storage all work from these; a
+    StickyNote window is only created when the note is presented, and it
+    edits the same NoteModel instance. Keys the model does not know about
+    (tags, enhanced-format metadata...) are kept in `extra` so they survive
+    a load/save round trip.
+
+    Enhanced-format notes (STORAGE.md 1.2) keep their content blocks; the
+    position, color and timestamp are read from and written back to their
+    metadata, and `text` is what the window, search and previews work with.
+    """
+
+    # `_content` backs the content property; a LazyContent there is
+    # replaced by the decoded content the first time it is read
+    __slots__ = ('id', 'title', '_content', 'color', 'x', 'y', 'timestamp', 'revision', 'extra')
+
+    def __init__(self, id=None, title='', content='', color=DEFAULT_COLOR,
+                 x=DEFAULT_X, y=DEFAULT_Y, timestamp=None, revision=0, extra=None):
+        self.id = id or str(uuid.uuid4())
+        self.title = title
+        self.content = content
+        self.color = color
+        self.x = x
+        self.y = y
+        self.timestamp = timestamp
+        # Bumped on every save; content edits are stored against it
+        self.revision = revision
+        self.extra = extra
+
+    @property
+    def content(self):
+        content = self._content
+        if isinstance(content, LazyContent):
+            content = self._content = content.load()
+        return content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+
+    @property
+    def content_loaded(self):
+        return not isinstance(self._content, LazyContent)
+
+    @property
+    def is_enhanced(self):
+        content = self._content
+        if isinstance(content, LazyContent) and content.enhanced is not None:
+            return content.enhanced
+        return isinstance(self.content, dict)
+
+    @property
+    def text(self):
+        """Returns the content as plain text"""
+        content = self.content
+        if isinstance(content, dict):
+            return content_text(content)
+        return content or ''
+
+    def set_text(self, text):
+        """Replaces the text of the note; enhanced content keeps its other blocks.
+
+        The text blocks of enhanced content become a single one, in place of
+        the first, with its format.
+        """
+        content = self.content
+        if not isinstance(content, dict):
+            self.content = text
+            return
+        blocks = []
+        replaced = False
+        for block in content.get('blocks') or ():
+            if block.get('type') != 'text':
+                blocks.append(block)
+            elif not replaced:
+                blocks.append(dict(block, content=text))
+                replaced = True
+        if not replaced:
+            blocks.insert(0, text_block(text))
+        self.content = dict(content, blocks=blocks)
+
+    def add_block(self, block):
+        """Appends a content block (an image, say); plain text content becomes enhanced content"""
+        content = self.content
+        if not isinstance(content, dict):
+            content = {'blocks': [text_block(content or '')]}
+        self.content = dict(content, blocks=list(content.get('blocks') or ()) + [block])
+
+    @property
+    def stored_preview(self):
+        """Returns the stored (title, snippet, image) of a note whose content is not loaded yet, or None"""
+        if isinstance(self._content, LazyContent):
+            return self._content.preview
+        return None
+
+    @classmethod
+    def from_dict(cls, note_data):
+        extra = {k: v for k, v in note_data.items() if k not in _FIELDS}
+        # Top-level keys win: moves are stored as top-level x and y
+        metadata = note_data.get('metadata') or {}
+        position = metadata.get('position') or {}
+        return cls(
+            id=note_data.get('id'),
+            title=note_data.get('title', ''),
+            content=note_data.get('content', ''),
+            color=note_data.get('color') or metadata.get('color') or DEFAULT_COLOR,
+            x=note_data.get('x', position.get('x', DEFAULT_X)),
+            y=note_data.get('y', position.get('y', DEFAULT_Y)),
+            timestamp=note_data.get('timestamp') or metadata.get('modified'),
+            revision=note_data.get('revision', 0),
+            extra=extra or None,
+        )
+
+    def to_dict(self):
+        """Returns the note in the storage format (see STORAGE.md 1.1 and 1.2)"""
+        note_data = {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'color': self.color,
+            'x': self.x,
+            'y': self.y,
+            'timestamp': self.timestamp,
+            'revision': self.revision,
+        }
+        if self.extra:
+            note_data.update(self.extra)
+        if isinstance(note_data['content'], dict):
+            metadata = dict(note_data.get('metadata') or {})
+            metadata['modified'] = note_data.pop('timestamp')
+            metadata['color'] = note_data.pop('color')
+            metadata['position'] = {'x': note_data.pop('x'), 'y': note_data.pop('y')}
+            note_data['metadata'] = metadata
+        return note_data
+
+    def snapshot(self):
+        """Returns the current field values, to compare with changed_fields()"""
+        return tuple(getattr(self, field) for field in _FIELDS)
+
+    def changed_fields(self, snapshot):
+        """Returns the names of the fields that differ from a snapshot()"""
+        return frozenset(field for field, value in zip(_FIELDS, snapshot)
+                         if getattr(self, field) != value)
+
+    def touch(self):
+        """Stamps the note as modified now"""
+        self.timestamp = datetime.now().isoformat()
+
+    @property
+    def tags(self):
+        if not self.extra:
+            return ()
+        tags = self.extra.get('tags')
+        if tags is None:
+            tags = (self.extra.get('metadata') or {}).get('tags') or ()
+        return tags
+
+    def __repr__(self):
+        return f'<NoteModel {self.id} {self.title!r}>'
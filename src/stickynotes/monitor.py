@@ -0,0 +1,92 @@
+# monitor.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+
+from gi.repository import Gio, GLib
+
+from .storage import file_identity
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds without file events before the store is looked at
+DEBOUNCE_MS = 500
+
+
+class StoreMonitor:
+    """Reloads the notes store when another program changes it.
+
+    File events are debounced; once they settle, the store is only re-read
+    if its identity (inode, size, mtime) differs from the one last seen and
+    from the one our own last write left. The re-read and the diff against
+    the previous contents run on the writer thread, and only the notes that
+    changed reach the main loop, through app.apply_external_changes().
+    """
+
+    def __init__(self, app, path, debounce=DEBOUNCE_MS):
+        self.app = app
+        self.path = path
+        self.debounce = debounce
+        self.identity = file_identity(path)
+        self._timeout_id = 0
+
+        self._monitor = Gio.File.new_for_path(path).monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        self._monitor.connect('changed', self.on_file_changed)
+
+        # Contadores para instrumentación
+        self.events = 0
+        self.own_writes = 0
+        self.reloads = 0
+
+    def on_file_changed(self, monitor, file, other_file, event_type):
+        self.events += 1
+        # Atomic replaces and editors saving in several steps send bursts
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+        self._timeout_id = GLib.timeout_add(self.debounce, self.on_settled)
+
+    def on_settled(self):
+        self._timeout_id = 0
+        identity = file_identity(self.path)
+        if identity is None or identity == self.identity:
+            return GLib.SOURCE_REMOVE
+        self.identity = identity
+        if identity == self.app.storage.last_written:
+            self.own_writes += 1
+            return GLib.SOURCE_REMOVE
+
+        logger.info("%s changed on disk, reloading", self.path)
+        self.reloads += 1
+        self.app.writer.request_reload(
+            lambda changed, removed, pending: GLib.idle_add(
+                self.app.apply_external_changes, changed, removed, pending))
+        return GLib.SOURCE_REMOVE
+
+    def get_stats(self):
+        return {
+            'events': self.events,
+            'own_writes': self.own_writes,
+            'reloads': self.reloads,
+        }
+
+    def cancel(self):
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = 0
+        self._monitor.cancel()
@@ -22,29 +22,33 @@ gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 
 from gi.repository import Gtk, Adw, Gio, GLib, Gdk
-import uuid
-from datetime import datetime
+import logging
 import os
 from pathlib import Path
 
+from . import trace
+from .drag import DragMotion
+from .edits import EditLog, apply_ops
+from .model import NoteModel
+
+logger = logging.getLogger(__name__)
+
 class StickyNote(Gtk.ApplicationWindow):
-    def __init__(self, app, note_data=None):
+    def __init__(self, app, note=None):
         # Handle both 'app' and 'application' parameters for better compatibility
         super().__init__(application=app)
         
-        # Datos de la nota
-        self.note_id = note_data.get('id', str(uuid.uuid4())) if note_data else str(uuid.uuid4())
-        self.color = note_data.get('color', 'yellow') if note_data else 'yellow'
-        self.title = note_data.get('title', '') if note_data else ''
+        # Datos de la nota: the window edits the app's NoteModel in place
+        self.model = note if note is not None else NoteModel()
+        # Field values at the last save, to report what each save changed
+        self.saved_state = self.model.snapshot()
         
-        # Ensure CSS is loaded
-        self.load_css()
+        # Drag motion, applied at most once per frame
+        self.drag = DragMotion()
+        self.drag_tick_id = None
         
-        # Initialize window position tracking
-        self.initial_window_x = note_data.get('x', 100) if note_data else 100
-        self.initial_window_y = note_data.get('y', 100) if note_data else 100
-        self.window_x = self.initial_window_x
-        self.window_y = self.initial_window_y
+        # Text edits since the last save, so large notes save only deltas
+        self.edit_log = EditLog()
         
         # Store initial position for later use
         # Note: In GTK4, we can't directly set window position in constructor
@@ -60,14 +64,10 @@ class StickyNote(Gtk.ApplicationWindow):
         self.set_hide_on_close(True)
         self.set_title("Sticky Note")
         
-        # Add styling classes
+        # Add styling classes; the stylesheet itself is loaded once by the app
         style_context = self.get_style_context()
         style_context.add_class('sticky-note')
         
-        # Add a unique CSS class for this note instance
-        self.unique_class = f'note-{self.note_id.replace("-", "")}'
-        style_context.add_class(self.unique_class)
-        
         # Add Wayland-specific support
         if Gdk.Display.get_default().get_name() == 'wayland':
             style_context.add_class('csd')  # Client-side decorations
@@ -81,45 +81,53 @@ class StickyNote(Gtk.ApplicationWindow):
         self.setup_ui()
         
         # Cargar contenido si existe
-        if note_data and 'content' in note_data:
-            self.text_view.get_buffer().set_text(note_data['content'])
+        if self.model.text:
+            self.text_view.get_buffer().set_text(self.model.text)
         
         # Aplicar color
         self.set_note_color(self.color)
         
         # Conectar eventos para auto-guardado
-        self.text_view.get_buffer().connect('changed', self.on_text_changed)
+        buffer = self.text_view.get_buffer()
+        # Connected after the initial set_text(), and before the default
+        # handlers so the iters still point at the unchanged text
+        self.buffer_handlers = [
+            buffer.connect('changed', self.on_text_changed),
+            buffer.connect('insert-text', self.on_insert_text),
+            buffer.connect('delete-range', self.on_delete_range),
+        ]
         
-    def load_css(self):
-        """Cargar estilos CSS desde el archivo"""
-        try:
-            css_provider = Gtk.CssProvider()
-            css_file = Gio.File.new_for_path('/home/kooke/Proyectos/stickynotes/src/stickynotes/css/note.css')
-            
-            # Leer el contenido del archivo y reemplazar UNIQUE_ID
-            success, contents, _ = css_file.load_contents()
-            if success:
-                css_text = contents.decode('utf-8')
-                css_text = css_text.replace('UNIQUE_ID', self.note_id.replace('-', ''))
-                css_provider.load_from_data(css_text.encode('utf-8'))
-                
-                # Obtener el contexto de estilo y aplicar el proveedor
-                style_context = self.get_style_context()
-                style_context.add_provider(
-                    css_provider,
-                    Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-                )
-                
-                # Agregar clases CSS necesarias
-                style_context.add_class('sticky-note')
-                style_context.add_class(f'sticky-note-{self.note_id.replace("-", "")}')
-                
-                print(f"Note CSS loaded successfully for note {self.note_id}")
-            else:
-                print("Failed to load CSS file contents")
-                
-        except Exception as e:
-            print(f"Error loading note CSS: {e}")
+        # Flush any pending auto-save when the window is closed
+        self.connect('close-request', self.on_close_request)
+    
+    @property
+    def note_id(self):
+        return self.model.id
+    
+    @property
+    def color(self):
+        return self.model.color
+    
+    @color.setter
+    def color(self, color):
+        self.model.color = color
+    
+    # Position tracking reads and writes the model directly
+    @property
+    def window_x(self):
+        return self.model.x
+    
+    @window_x.setter
+    def window_x(self, x):
+        self.model.x = x
+    
+    @property
+    def window_y(self):
+        return self.model.y
+    
+    @window_y.setter
+    def window_y(self, y):
+        self.model.y = y
         
     def setup_ui(self):
         # Container principal
@@ -151,6 +159,12 @@ class StickyNote(Gtk.ApplicationWindow):
         new_note_button.set_tooltip_text('Crear nueva nota')
         new_note_button.connect('clicked', self.on_new_note_clicked)
         
+        # Botón de adjuntar (imágenes, audio...), copiado al almacén de medios
+        attach_button = Gtk.Button()
+        attach_button.set_icon_name('mail-attachment-symbolic')
+        attach_button.set_tooltip_text('Adjuntar archivo')
+        attach_button.connect('clicked', self.on_attach_clicked)
+        
         # Botón cerrar
         close_button = Gtk.Button()
         close_button.set_icon_name('window-close-symbolic')
@@ -160,6 +174,7 @@ class StickyNote(Gtk.ApplicationWindow):
         # Agregar botones al header
         header.append(self.color_button)
         header.append(new_note_button)  # Añadir botón de nueva nota
+        header.append(attach_button)
         header.append(Gtk.Box())  # Spacer
         header.append(close_button)
         
@@ -231,15 +246,15 @@ class StickyNote(Gtk.ApplicationWindow):
             color_menu.append_item(item)
         
         self.color_button.set_menu_model(color_menu)
-        print("Color menu setup completed")
+        logger.debug("Color menu setup completed")
     
     def set_note_color(self, color):
-        print(f"Changing note color to: {color}")
+        logger.debug("Changing note color to: %s", color)
         
         # Validar el color
         valid_colors = ['yellow', 'pink', 'blue', 'green', 'orange', 'purple']
         if color not in valid_colors:
-            print(f"Warning: Invalid color {color}, defaulting to yellow")
+            logger.warning("Invalid color %s, defaulting to yellow", color)
             color = 'yellow'
         
         # Obtener el contexto de estilo
@@ -255,7 +270,7 @@ class StickyNote(Gtk.ApplicationWindow):
         # Almacenar el color
         self.color = color
         
-        print(f"Successfully applied {color} style")
+        logger.debug("Successfully applied %s style", color)
     
     def on_color_changed(self, action, parameter):
         # Handle the color parameter correctly
@@ -263,108 +278,203 @@ class StickyNote(Gtk.ApplicationWindow):
             color = parameter.get_string()
             # Remove any quotes that might have been included
             color = color.strip("'\"")
-            print(f"Color change requested to: {color}")
+            logger.debug("Color change requested to: %s", color)
             self.set_note_color(color)
             self.save_note()
     
     def on_drag_begin(self, gesture, x, y):
-        print(f"Drag begin at coordinates: x={x}, y={y}")  # Debug logging
-        self.drag_start_x = x
-        self.drag_start_y = y
-        # Store initial window position
-        self.initial_window_x = self.window_x
-        self.initial_window_y = self.window_y
+        trace.instant('drag_begin', note=self.note_id)
+        logger.debug("Drag begin at coordinates: x=%s, y=%s", x, y)
+        self.drag.begin(self.window_x, self.window_y)
     
+    @trace.traced('drag_update')
     def on_drag_update(self, gesture, offset_x, offset_y):
-        print(f"Drag update - offset: x={offset_x}, y={offset_y}")
+        # Only remember the target; the position is applied once per frame
+        self.drag.update(offset_x, offset_y)
+        if self.drag_tick_id is None:
+            self.drag_tick_id = self.add_tick_callback(self.on_drag_tick)
+    
+    def on_drag_tick(self, widget, frame_clock):
+        position = self.drag.take()
+        if position:
+            with trace.span('drag_frame'):
+                self.move_to(*position)
+        return GLib.SOURCE_CONTINUE
+    
+    def move_to(self, x, y):
+        # Update internal position tracking
+        self.window_x = x
+        self.window_y = y
         
         try:
-            # Calculate new position based on initial position and offset
-            new_x = int(self.initial_window_x + offset_x)
-            new_y = int(self.initial_window_y + offset_y)
-            
-            # Update internal position tracking
-            self.window_x = new_x
-            self.window_y = new_y
-            
             # In GTK4, we need to use surface positioning
             if self.get_surface():
                 # Get the native surface to position it
                 surface = self.get_native()
                 if surface:
-                    surface.get_surface().set_device_position(None, new_x, new_y)
-                    print(f"Window moved to: x={new_x}, y={new_y}")
+                    surface.get_surface().set_device_position(None, x, y)
+                    logger.debug("Window moved to: x=%d, y=%d", x, y)
         except Exception as e:
-            print(f"Error moving window: {e}")
+            logger.error("Error moving window: %s", e)
     
+    @trace.traced('drag_end')
     def on_drag_end(self, gesture, offset_x, offset_y):
-        print(f"Drag ended at offset: x={offset_x}, y={offset_y}")  # Debug logging
-        # Save the final position
-        self.save_note()
+        logger.debug("Drag ended at offset: x=%s, y=%s", offset_x, offset_y)
+        if self.drag_tick_id is not None:
+            self.remove_tick_callback(self.drag_tick_id)
+            self.drag_tick_id = None
+        position = self.drag.end(offset_x, offset_y)
+        if position:
+            self.move_to(*position)
+        logger.debug("Drag: %d events, %d frames applied", self.drag.events, self.drag.frames)
+        
+        # Save the final position only: content, title and timestamp stay
+        # as they are and the preview card is not touched
+        if self.drag.moved:
+            self.get_application().save_note_position(self.model)
+            self.saved_state = self.model.snapshot()
     
     def on_text_changed(self, buffer):
-        # Auto-guardar después de cambios
-        GLib.timeout_add(1000, self.save_note)  # Guardar después de 1 segundo
+        # Auto-guardar después de cambios; the scheduler keeps a single
+        # pending save per note no matter how many keystrokes arrive
+        app = self.get_application()
+        if app:
+            app.autosave.schedule(self.note_id, self.save_note)
+    
+    def on_insert_text(self, buffer, location, text, length):
+        self.edit_log.insert(location.get_offset(), text)
+    
+    def on_delete_range(self, buffer, start, end):
+        start_offset, end_offset = start.get_offset(), end.get_offset()
+        self.edit_log.delete(min(start_offset, end_offset), abs(end_offset - start_offset))
+    
+    def on_close_request(self, window):
+        app = self.get_application()
+        if app:
+            app.autosave.flush(self.note_id)
+        return False
     
     def on_close_clicked(self, button):
-        self.save_note()
         app = self.get_application()
+        app.autosave.cancel(self.note_id)
+        self.save_note()
+        # The grid and the search index follow the note-removed event;
+        # the window itself goes away so the registry drops it
         app.remove_note(self.note_id)
-        
-        # Update the main window's note grid
-        main_window = app.get_main_window()
-        if main_window:
-            main_window.remove_note(self.note_id)
-            
-        self.close()
+        self.destroy()
     
     def on_new_note_clicked(self, button):
         # Create a new note
         app = self.get_application()
         app.create_new_note()
     
+    def on_attach_clicked(self, button):
+        dialog = Gtk.FileDialog()
+        dialog.set_title('Adjuntar archivo')
+        dialog.open(self, None, self.on_attach_chosen)
+    
+    def on_attach_chosen(self, dialog, result):
+        try:
+            file = dialog.open_finish(result)
+        except GLib.Error:
+            # Cancelled by the user
+            return
+        path = file.get_path()
+        if not path:
+            logger.warning("Cannot attach %s: not a local file", file.get_uri())
+            return
+        # Large files are copied in the background; progress shows in the title
+        self.get_application().import_media(path, self.on_media_imported, self.on_media_progress)
+    
+    def on_media_progress(self, job):
+        self.set_title(f"{job.name} {job.fraction:.0%}")
+    
+    def on_media_imported(self, block):
+        self.set_title("Sticky Note")
+        if block is None:
+            return
+        # Pending text edits go first, so the block lands on saved content
+        app = self.get_application()
+        app.autosave.cancel(self.note_id)
+        self.save_note()
+        note = self.model
+        note.add_block(block)
+        note.touch()
+        app.save_note_data(note, {'content', 'timestamp'})
+        self.edit_log.checkpoint()
+        self.saved_state = note.snapshot()
+    
     def save_note(self):
         app = self.get_application()
+        note = self.model
         
-        # Obtener contenido
-        buffer = self.text_view.get_buffer()
-        content = buffer.get_text(
-            buffer.get_start_iter(),
-            buffer.get_end_iter(),
-            False
-        )
+        # Obtener contenido: the edits since the last save are applied to
+        # the saved content instead of copying the whole buffer
+        ops = self.edit_log.take()
+        checkpoint = False
+        try:
+            content = apply_ops(note.text, ops) if ops else note.text
+        except ValueError as e:
+            logger.warning("Edit log out of sync with note %s: %s", self.note_id, e)
+            buffer = self.text_view.get_buffer()
+            content = buffer.get_text(
+                buffer.get_start_iter(),
+                buffer.get_end_iter(),
+                False
+            )
+            checkpoint = True
         
         # Actualizar título si está vacío
-        if not self.title:
+        if not note.title:
             lines = content.strip().split('\n')
-            self.title = lines[0].strip() if lines and lines[0].strip() else "Nota sin título"
-        
-        # Obtener posición - usar valores internos que mantenemos actualizados
-        # durante las operaciones de arrastre
-        x, y = self.window_x, self.window_y
-        
-        # Datos de la nota
-        note_data = {
-            'id': self.note_id,
-            'title': self.title,
-            'content': content,
-            'color': self.color,
-            'x': x,
-            'y': y,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Save the note data to app's storage
-        app.save_note_data(note_data)
-        
-        # Update the preview in the main window if available
-        # Avoid calling update_from_note() as it might call save_note() again
-        # causing infinite recursion
-        main_window = app.get_main_window()
-        if main_window and self.note_id in main_window.note_previews:
-            # Instead of calling update_from_note(self), pass the note_data directly
-            main_window.note_previews[self.note_id].update_preview(note_data)
-        return note_data
+            note.title = lines[0].strip() if lines and lines[0].strip() else "Nota sin título"
+        
+        # La posición ya está en el modelo, actualizada durante el arrastre
+        note.set_text(content)
+        fields = note.changed_fields(self.saved_state)
+        if not fields:
+            return note
+        note.touch()
+        fields = fields | {'timestamp'}
+        
+        # Save the note to app's storage; the grid card and the search
+        # index are updated from the note-changed event. Large notes that
+        # are already stored only write the edits, with a full save every
+        # so often as a checkpoint; edits only apply to plain text content
+        if (note.revision and not checkpoint and not note.is_enhanced
+                and self.edit_log.wants_delta(len(content), ops)):
+            app.save_note_edit(note, ops, fields)
+            self.edit_log.saved(ops)
+        else:
+            app.save_note_data(note, fields)
+            self.edit_log.checkpoint()
+        self.saved_state = note.snapshot()
+        return note
+        
+    def restore_content(self, content):
+        """Replaces the text of the note, e.g. with a revision from the history, and saves it"""
+        self.text_view.get_buffer().set_text(content)
+        app = self.get_application()
+        if app:
+            app.autosave.cancel(self.note_id)
+        return self.save_note()
+        
+    def reload_model(self):
+        """Shows the model again after it was replaced from outside the window (sync, another process)"""
+        buffer = self.text_view.get_buffer()
+        for handler_id in self.buffer_handlers:
+            buffer.handler_block(handler_id)
+        try:
+            buffer.set_text(self.model.text)
+        finally:
+            for handler_id in self.buffer_handlers:
+                buffer.handler_unblock(handler_id)
+        # The new content is what is stored: no edits against the old one
+        self.edit_log.take()
+        self.edit_log.checkpoint()
+        self.set_note_color(self.model.color)
+        self.move_to(self.model.x, self.model.y)
+        self.saved_state = self.model.snapshot()
         
     def on_realize(self, widget):
         """Handler called when window is realized - sets initial position"""
@@ -375,7 +485,7 @@ class StickyNote(Gtk.ApplicationWindow):
                 surface = self.get_native()
                 if surface:
                     surface.get_surface().set_device_position(None, self.window_x, self.window_y)
-                    print(f"Initial window position set to: x={self.window_x}, y={self.window_y}")
+                    logger.debug("Initial window position set to: x=%s, y=%s", self.window_x, self.window_y)
         except Exception as e:
-            print(f"Error setting initial window position: {e}")
+            logger.error("Error setting initial window position: %s", e)
 
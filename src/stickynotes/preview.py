@@ -0,0 +1,176 @@
+# preview.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from .model import content_text
+
+PREVIEW_LINES = 6
+PREVIEW_CHARS = 150
+# Longest first line used as a title when the note has none
+TITLE_CHARS = 200
+# Most a preview reads of plain text: the first line, then the snippet
+PREVIEW_PREFIX = TITLE_CHARS + PREVIEW_CHARS + 1
+
+UNTITLED = "Nota sin título"
+EMPTY = "(Nota vacía)"
+
+_NON_SPACE = re.compile(r'\S')
+
+# What a preview card shows for a note; `image` is the media hash of the
+# first image block of enhanced-format notes
+Preview = namedtuple('Preview', ('title', 'snippet', 'date', 'color', 'image'))
+
+
+def first_line(content):
+    """Returns the first non-blank line of content, stripped, reading at most TITLE_CHARS of it"""
+    match = _NON_SPACE.search(content)
+    if not match:
+        return ''
+    start = match.start()
+    end = content.find('\n', start, start + TITLE_CHARS)
+    if end < 0:
+        end = start + TITLE_CHARS
+    return content[start:end].strip()
+
+
+def snippet(content, skip_first_line, lines=PREVIEW_LINES, chars=PREVIEW_CHARS):
+    """Returns the first `lines` lines of content, cut to `chars` characters.
+
+    Only the first chars + 1 characters after the skipped line are copied,
+    however long the note is. A first line longer than TITLE_CHARS is not
+    searched to its end: the snippet goes on from there instead.
+    """
+    start = 0
+    if skip_first_line:
+        # The skipped line counts towards `lines`
+        newline = content.find('\n', 0, TITLE_CHARS)
+        if newline >= 0:
+            start = newline + 1
+        elif len(content) > TITLE_CHARS:
+            start = TITLE_CHARS
+        else:
+            return ''
+        lines -= 1
+    head = content[start:start + chars + 1]
+    text = '\n'.join(head.split('\n')[:lines])
+    if len(text) > chars:
+        text = text[:chars - 3] + '...'
+    return text
+
+
+def format_date(timestamp):
+    if not timestamp:
+        return ''
+    try:
+        return datetime.fromisoformat(timestamp).strftime("%d/%m/%Y")
+    except (TypeError, ValueError):
+        return ''
+
+
+def first_image(content):
+    """Returns the hash of the first stored image block, or None"""
+    for block in content.get('blocks') or ():
+        if block.get('type') == 'image' and block.get('hash'):
+            return block['hash']
+    return None
+
+
+def make_preview(note):
+    stored = note.stored_preview
+    if stored is not None:
+        # Precomputed by the storage engine; the content stays undecoded
+        title, text, image = stored
+        return Preview(title, text, format_date(note.timestamp), note.color, image)
+    title = note.title if isinstance(note.title, str) and note.title.strip() else ''
+    content = note.content or ''
+    image = None
+    if isinstance(content, dict):
+        image = first_image(content)
+        content = content_text(content)
+    if not title:
+        title = first_line(content) or UNTITLED
+    if content:
+        text = snippet(content, skip_first_line=bool(note.title))
+    else:
+        text = EMPTY
+    return Preview(title, text, format_date(note.timestamp), note.color, image)
+
+
+def content_key(note):
+    """Returns what PreviewCache compares to tell whether the content changed.
+
+    Every save bumps the revision. Text also keys on its length and on the
+    prefix the preview is made from (a copy of at most PREVIEW_PREFIX
+    characters), so the key costs the same for any note size and the cache
+    keeps no reference to old contents. Enhanced-format content is a dict,
+    replaced along with a new revision on every save. Content that is not
+    loaded yet is None, so the stored preview is kept until the note is
+    opened.
+    """
+    if not note.content_loaded:
+        return None
+    content = note.content
+    if isinstance(content, str):
+        return note.revision, len(content), content[:PREVIEW_PREFIX]
+    return 'revision', note.revision
+
+
+class _Entry:
+    __slots__ = ('title', 'content_key', 'color', 'timestamp', 'preview')
+
+
+class PreviewCache:
+    """Note id -> Preview, recomputed only when a shown field changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, note):
+        entry = self._entries.get(note.id)
+        key = content_key(note)
+        if (entry is not None and entry.content_key == key
+                and entry.title == note.title
+                and entry.color == note.color
+                and entry.timestamp == note.timestamp):
+            self.hits += 1
+            return entry.preview
+
+        self.misses += 1
+        if entry is None:
+            entry = self._entries[note.id] = _Entry()
+        entry.title = note.title
+        entry.content_key = key
+        entry.color = note.color
+        entry.timestamp = note.timestamp
+        entry.preview = make_preview(note)
+        return entry.preview
+
+    def discard(self, note_id):
+        self._entries.pop(note_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,96 @@
+# query.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import re
+from datetime import datetime
+
+# "quoted phrase", key:value, key:"quoted value" or a bare word
+TOKEN_RE = re.compile(r'"([^"]*)"?|(\w+):(?:"([^"]*)"?|(\S+))|(\S+)')
+
+
+class NoteQuery:
+    """Parsed search box query.
+
+    Text terms must all occur in the note content. A quoted phrase is one
+    term, and so is each run of bare words between operators, taken as
+    typed: "buy milk" matches the text "buy milk", not "milk ... buy".
+
+    Several `color:` filters match any of the colors. Several `tag:`
+    filters must all be present. `after:` and `before:` bound the note
+    timestamp; after is inclusive, before is exclusive.
+    """
+
+    __slots__ = ('terms', 'colors', 'tags', 'after', 'before')
+
+    def __init__(self):
+        self.terms = []
+        self.colors = []
+        self.tags = []
+        self.after = None
+        self.before = None
+
+    def is_empty(self):
+        return not (self.terms or self.colors or self.tags or self.after or self.before)
+
+    def has_filters(self):
+        return bool(self.colors or self.tags or self.after or self.before)
+
+
+def parse_date(value):
+    """Returns epoch seconds for an ISO date or date-time, or None if invalid"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def is_operator(field, value):
+    """True if field:value is a filter rather than text to search for"""
+    return field in ('color', 'tag') or (field in ('after', 'before') and parse_date(value) is not None)
+
+
+def parse_query(text):
+    """Parses `color:blue tag:work after:2025-05-01 "exact phrase" words`"""
+    query = NoteQuery()
+    text = text.lower()
+    # (start, end) of the free text since the last operator or quoted phrase
+    run = None
+    for match in TOKEN_RE.finditer(text):
+        phrase, field, quoted_value, value, word = match.groups()
+        value = quoted_value if quoted_value is not None else value
+        if phrase is None and not is_operator(field, value):
+            # A bare word, or not an operator we know: search for it literally
+            run = (match.start() if run is None else run[0], match.end())
+            continue
+
+        if run is not None:
+            query.terms.append(text[run[0]:run[1]])
+            run = None
+        if phrase is not None:
+            if phrase:
+                query.terms.append(phrase)
+        elif field == 'color':
+            query.colors.append(value)
+        elif field == 'tag':
+            query.tags.append(value)
+        else:
+            setattr(query, field, parse_date(value))
+    if run is not None:
+        query.terms.append(text[run[0]:run[1]])
+    return query
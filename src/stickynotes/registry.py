@@ -0,0 +1,69 @@
+# registry.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+class NoteRegistry:
+    """Note id -> note window and note id -> preview card maps.
+
+    Windows are registered when the app creates them and dropped when they
+    are destroyed; preview cards while the grid has them bound to a note.
+    Both lookups are O(1), so nothing has to scan get_windows().
+    """
+
+    def __init__(self):
+        self.windows = {}
+        self.previews = {}
+
+        # Contadores para instrumentación
+        self.windows_created = 0
+        self.windows_destroyed = 0
+
+    def add_window(self, window):
+        self.windows[window.note_id] = window
+        self.windows_created += 1
+        window.connect('destroy', self._on_window_destroy)
+
+    def _on_window_destroy(self, window):
+        # Only forget the entry if it still points at this window
+        if self.windows.get(window.note_id) is window:
+            del self.windows[window.note_id]
+        self.windows_destroyed += 1
+
+    def get_window(self, note_id):
+        return self.windows.get(note_id)
+
+    def add_preview(self, note_id, preview):
+        self.previews[note_id] = preview
+
+    def remove_preview(self, note_id, preview):
+        if self.previews.get(note_id) is preview:
+            del self.previews[note_id]
+
+    def get_preview(self, note_id):
+        return self.previews.get(note_id)
+
+    def get_stats(self):
+        """Returns live window and preview counts"""
+        return {
+            'windows': len(self.windows),
+            'visible_windows': sum(1 for w in self.windows.values() if w.get_visible()),
+            'previews': len(self.previews),
+            'windows_created': self.windows_created,
+            'windows_destroyed': self.windows_destroyed,
+        }
@@ -0,0 +1,135 @@
+# restore.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import time
+
+from gi.repository import GLib, Gdk
+
+from . import trace
+from .search import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Seconds of window creation per idle callback; half a 60 Hz frame leaves
+# room for GTK to lay out and paint between chunks
+FRAME_BUDGET = 0.008
+
+
+def monitor_rects():
+    """Returns (x, y, width, height) of every connected monitor"""
+    display = Gdk.Display.get_default()
+    if display is None:
+        return []
+    monitors = display.get_monitors()
+    rects = []
+    for i in range(monitors.get_n_items()):
+        geometry = monitors.get_item(i).get_geometry()
+        rects.append((geometry.x, geometry.y, geometry.width, geometry.height))
+    return rects
+
+
+def restore_order(notes, rects):
+    """Sorts NoteModels: on a connected monitor first, then most recent first"""
+    def on_monitor(note):
+        x, y = note.x or 0, note.y or 0
+        return any(rx <= x < rx + rw and ry <= y < ry + rh for rx, ry, rw, rh in rects)
+
+    return sorted(notes, key=lambda note: (not on_monitor(note), -parse_timestamp(note.timestamp)))
+
+
+class RestoreScheduler:
+    """Opens the windows of stored notes a few at a time from idle callbacks.
+
+    The main window is presented before any note, and each idle callback
+    stops once it has used `budget` seconds, so GTK keeps drawing while the
+    session comes back. Notes that are still waiting are already in the
+    grid and the search index, which work from app.notes.
+    """
+
+    def __init__(self, app, budget=FRAME_BUDGET):
+        self.app = app
+        self.budget = budget
+        self._queue = []
+        self._next = 0
+        self._source_id = None
+
+        # Métricas, en segundos desde start()
+        self.started = None
+        self.first_frame = None
+        self.restored = None
+        self.chunks = 0
+        self.opened = 0
+
+    def start(self, notes, main_window):
+        self.started = time.monotonic()
+        self._queue = restore_order(notes, monitor_rects())
+        self._next = 0
+        main_window.add_tick_callback(self._on_first_tick)
+        self._source_id = GLib.idle_add(self._restore_chunk, priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def _on_first_tick(self, widget, frame_clock):
+        self.first_frame = time.monotonic() - self.started
+        logger.info("Restore: first frame after %.1f ms", self.first_frame * 1000)
+        return GLib.SOURCE_REMOVE
+
+    @trace.traced('restore_chunk')
+    def _restore_chunk(self):
+        self.chunks += 1
+        deadline = time.monotonic() + self.budget
+        registry = self.app.registry
+        while self._next < len(self._queue):
+            note = self._queue[self._next]
+            self._next += 1
+            # Skip notes deleted or opened from the grid in the meantime
+            if note.id not in self.app.notes or registry.get_window(note.id) is not None:
+                continue
+            self.app.create_note_window(note).present()
+            self.opened += 1
+            if time.monotonic() >= deadline:
+                return GLib.SOURCE_CONTINUE
+
+        self.restored = time.monotonic() - self.started
+        self._source_id = None
+        self._queue = []
+        logger.info("Restore: %d notes restored after %.1f ms in %d chunks",
+                    self.opened, self.restored * 1000, self.chunks)
+        return GLib.SOURCE_REMOVE
+
+    def cancel(self):
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self._queue = []
+        self._next = 0
+
+    def is_running(self):
+        return self._source_id is not None
+
+    def get_stats(self):
+        """Returns restore progress and timings in milliseconds"""
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+        return {
+            'pending': len(self._queue) - self._next,
+            'opened': self.opened,
+            'chunks': self.chunks,
+            'first_frame_ms': ms(self.first_frame),
+            'restored_ms': ms(self.restored),
+        }
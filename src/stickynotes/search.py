@@ -0,0 +1,660 @@
+# search.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import bisect
+import heapq
+import operator
+import time
+from array import array
+from datetime import datetime
+from itertools import accumulate, chain
+
+from .events import NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED, BULK_RESET, POSITION_FIELDS
+from .query import parse_query
+
+GRAM = 3
+
+# Ranking weights
+TITLE_WEIGHT = 4.0
+WORD_START_WEIGHT = 1.0
+POSITION_WEIGHT = 2.0
+RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE = 30 * 24 * 3600  # seconds
+# Recency is stored as 2 ** ((mtime - RECENCY_EPOCH) / half life) so a
+# query only has to scale it by a single factor computed from "now"
+RECENCY_EPOCH = 1735689600  # 2025-01-01
+# Best score a match can get without a title hit
+UNTITLED_MAX_SCORE = RECENCY_WEIGHT + POSITION_WEIGHT + WORD_START_WEIGHT
+
+# Posting lists hold the gaps between document numbers in the narrowest
+# of these array types that fits them
+POSTING_TYPECODES = ('B', 'H', 'I')
+# Decoding and intersecting a posting list costs about this many entries
+# per candidate verified instead
+VERIFY_COST = 32
+# Seconds of indexing per step of a scheduled build; half a 60 Hz frame
+BUILD_BUDGET = 0.008
+
+
+def trigrams(text):
+    """Returns the set of distinct trigrams of an already lowercased text"""
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def parse_timestamp(timestamp):
+    """Converts an ISO-8601 note timestamp to epoch seconds (0 if missing)"""
+    if not timestamp:
+        return 0.0
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def encode_postings(docnums):
+    """Delta-encodes ascending document numbers into the narrowest array that holds the gaps"""
+    gaps = list(map(operator.sub, docnums, chain((0,), docnums)))
+    return _widen(array(POSTING_TYPECODES[0]), gaps)
+
+
+def decode_postings(plist):
+    """Returns the ascending document numbers of a delta-encoded posting list"""
+    return list(accumulate(plist))
+
+
+def _widen(plist, gaps):
+    """Appends gaps to plist, re-encoding it in a wider type when they do not fit"""
+    widest = max(gaps, default=0)
+    if widest >> (8 * plist.itemsize):
+        for typecode in POSTING_TYPECODES:
+            if not widest >> (8 * array(typecode).itemsize):
+                plist = array(typecode, plist)
+                break
+    plist.extend(gaps)
+    return plist
+
+
+def intersect_sorted(a, b):
+    """Intersects two ascending sequences of ints, returning a list"""
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return []
+    # Binary-search the short list into the long one when it is much
+    # shorter; otherwise a linear merge through sets is cheaper
+    if len(a) * 16 < len(b):
+        result = []
+        lo = 0
+        n = len(b)
+        for value in a:
+            lo = bisect.bisect_left(b, value, lo)
+            if lo == n:
+                break
+            if b[lo] == value:
+                result.append(value)
+        return result
+    common = set(a).intersection(b)
+    return [value for value in a if value in common]
+
+
+def lowered(text):
+    """Returns text lowercased, or text itself when it has no uppercase, sharing its memory"""
+    lower = text.lower()
+    # lower() returns a new string even when nothing changes
+    return text if lower == text else lower
+
+
+def note_tags(note):
+    """Returns the lowercased, sorted tags of a NoteModel"""
+    return tuple(sorted({str(tag).lower() for tag in note.tags}))
+
+
+def recency_boost(mtime):
+    if not mtime:
+        return 0.0
+    return 2.0 ** ((mtime - RECENCY_EPOCH) / RECENCY_HALF_LIFE)
+
+
+class _Document:
+    __slots__ = ('note_id', 'title', 'text', 'title_text',
+                 'color', 'tags', 'mtime', 'boost')
+
+    def __init__(self, note, text=None):
+        self.note_id = note.id
+        self.title = note.title or ''
+        # Only the lowercased text, which is all verification reads; the
+        # note itself keeps the original
+        self.text = lowered(note.text) if text is None else text
+        self.title_text = self.title.lower()
+        self.color = note.color
+        self.tags = note_tags(note)
+        self.set_mtime(parse_timestamp(note.timestamp))
+
+    def set_mtime(self, mtime):
+        self.mtime = mtime
+        self.boost = recency_boost(mtime)
+
+
+_EMPTY = array('I')
+
+
+class _Postings:
+    """Trigram -> delta-encoded posting list (see encode_postings)"""
+    __slots__ = ('lists', 'last')
+
+    def __init__(self):
+        self.lists = {}
+        # Trigram -> last document number of its list, to append new gaps
+        self.last = {}
+
+    def clear(self):
+        self.lists.clear()
+        self.last.clear()
+
+    def load(self, docnums_by_gram):
+        """Replaces every list with ascending document numbers by trigram"""
+        self.lists = {gram: encode_postings(docnums) for gram, docnums in docnums_by_gram.items()}
+        self.last = {gram: docnums[-1] for gram, docnums in docnums_by_gram.items()}
+
+    def put(self, gram, docnums):
+        """Replaces the list of one trigram with ascending document numbers"""
+        self.lists[gram] = encode_postings(docnums)
+        self.last[gram] = docnums[-1]
+
+    def add(self, docnum, grams):
+        """Appends a document number, higher than any indexed so far, to the lists of grams"""
+        lists = self.lists
+        last = self.last
+        for gram in grams:
+            plist = lists.get(gram)
+            if plist is None:
+                lists[gram] = encode_postings((docnum,))
+            else:
+                gap = docnum - last[gram]
+                try:
+                    plist.append(gap)
+                except OverflowError:
+                    lists[gram] = _widen(plist, (gap,))
+            last[gram] = docnum
+
+    def count(self, gram):
+        plist = self.lists.get(gram)
+        return 0 if plist is None else len(plist)
+
+    def vacuum(self, live):
+        """Drops document numbers that are not in live"""
+        kept = {}
+        for gram, plist in self.lists.items():
+            docnums = [d for d in accumulate(plist) if d in live]
+            if docnums:
+                kept[gram] = docnums
+        self.load(kept)
+
+    def entries(self):
+        return sum(len(plist) for plist in self.lists.values())
+
+    def nbytes(self):
+        return sum(len(plist) * plist.itemsize for plist in self.lists.values())
+
+
+class SearchIndex:
+    """Trigram index over the content of every stored note, plus secondary
+    indexes over color, tags and timestamp for structured queries.
+
+    Matching keeps the substring semantics the search box always had (the
+    lowercased query must occur in the lowercased content); trigram posting
+    lists only narrow the candidates that are then verified. Every version
+    of a note gets a new, increasing document number, so posting lists are
+    append-only and stay sorted, which lets them store the gaps between
+    document numbers, mostly one byte each; replaced or removed versions
+    are dropped lazily when enough of them accumulate. Color and tag lists
+    share the same document numbers, and timestamps live in a sorted list,
+    so compound filters are intersections of sorted lists.
+
+    Titles have a trigram index of their own, so a ranked search scores
+    the notes with a title hit first and skips the others once they can
+    no longer reach the top K.
+
+    The index follows app.notes through the app's note events (see
+    connect_events), so it covers notes that never had a window. A lazy
+    index defers each full build to the first query after it, so note
+    bodies a storage engine decodes on demand are not read at startup.
+    Given a `schedule` function (GLib.idle_add in the app), full builds
+    run a few milliseconds at a time from it instead of all at once, and
+    queries scan the notes themselves until the build is done.
+    """
+
+    def __init__(self, schedule=None):
+        self._next_doc = 0
+        self._doc_by_id = {}   # note id -> live document number
+        self._docs = {}        # document number -> _Document
+        self._postings = _Postings()        # content trigrams
+        self._title_postings = _Postings()  # title trigrams
+        self._by_color = {}    # color -> array('I') of document numbers
+        self._by_tag = {}      # tag -> array('I') of document numbers
+        self._by_time = []     # sorted (mtime, document number) of live notes
+        self._dead_docs = 0
+        # Notes dictionary of a full build deferred until the next query
+        self._unbuilt = None
+        # schedule(step) calls step() later, again while it returns True
+        self._schedule = schedule
+        # Notes dictionary of the build in progress, queries scan it
+        self._building = None
+        # Token of the latest build, so a superseded one stops, and note
+        # id -> NoteModel (None if removed) of the changes to apply once done
+        self._build_token = None
+        self._changed = {}
+
+    def build(self, notes):
+        """Indexes every note in a note id -> NoteModel dictionary"""
+        for _ in self.build_steps(notes, budget=None):
+            pass
+
+    def build_steps(self, notes, budget=BUILD_BUDGET):
+        """Starts a build; returns an iterator indexing notes `budget` seconds per step.
+
+        Until the iterator is exhausted, queries scan `notes` and changes
+        are kept to be applied after the build.
+        """
+        self._next_doc = 0
+        self._doc_by_id.clear()
+        self._docs.clear()
+        self._postings.clear()
+        self._title_postings.clear()
+        self._by_color.clear()
+        self._by_tag.clear()
+        self._by_time = []
+        self._dead_docs = 0
+        self._unbuilt = None
+        self._building = notes
+        self._changed = {}
+
+        # Oldest first, so document numbers also follow recency
+        ordered = sorted(notes.values(), key=lambda n: n.timestamp or '')
+        self._build_token = token = object()
+        return self._build(ordered, budget, token)
+
+    def _build(self, ordered, budget, token):
+        # Postings are collected as plain arrays and encoded at the end
+        postings = {}
+        title_postings = {}
+
+        def work():
+            for note in ordered:
+                yield self._add, (note, postings, title_postings)
+            for target, collected in ((self._postings, postings), (self._title_postings, title_postings)):
+                for item in collected.items():
+                    yield target.put, item
+
+        deadline = None if budget is None else time.monotonic() + budget
+        for function, args in work():
+            function(*args)
+            if deadline is not None and time.monotonic() >= deadline:
+                yield
+                if self._build_token is not token:
+                    # A newer build started over
+                    return
+                deadline = time.monotonic() + budget
+        self._building = None
+        self._build_token = None
+        changed, self._changed = self._changed, {}
+        for note_id, note in changed.items():
+            if note is None:
+                self.remove(note_id)
+            else:
+                self.update(note)
+
+    def connect_events(self, events, notes, lazy=False):
+        """Keeps the index in sync with an EventBus over the `notes` dictionary"""
+        events.connect(NOTE_ADDED, lambda event: self.update(event.note))
+        events.connect(NOTE_CHANGED, self._on_note_changed)
+        events.connect(NOTE_REMOVED, lambda event: self.remove(event.note_id))
+        if lazy:
+            events.connect(BULK_RESET, lambda event: self.defer_build(notes))
+        else:
+            events.connect(BULK_RESET, lambda event: self.start_build(notes))
+
+    def start_build(self, notes):
+        """Builds the index now, or from the schedule function if there is one"""
+        if self._schedule is None:
+            self.build(notes)
+            return
+        steps = self.build_steps(notes)
+        self._schedule(lambda: next(steps, False) is None)
+
+    def defer_build(self, notes):
+        """Like start_build(), but only once the index is first queried"""
+        self.build({})
+        self._unbuilt = notes
+
+    def _ensure_built(self):
+        if self._unbuilt is not None:
+            notes, self._unbuilt = self._unbuilt, None
+            self.start_build(notes)
+
+    def is_building(self):
+        return self._building is not None
+
+    def _on_note_changed(self, event):
+        # Moving a note window changes nothing the index knows about
+        if event.fields is not None and event.fields <= POSITION_FIELDS:
+            return
+        self.update(event.note)
+
+    def update(self, note):
+        """Re-indexes a single NoteModel"""
+        if self._unbuilt is not None:
+            # The deferred build reads the notes as they are by then
+            return
+        if self._building is not None:
+            self._changed[note.id] = note
+            return
+        docnum = self._doc_by_id.get(note.id)
+        doc = self._docs.get(docnum)
+        # Matching ignores case, so a change of case keeps the postings too
+        text = lowered(note.text)
+        if (doc and doc.text == text
+                and doc.title == (note.title or '')
+                and doc.color == note.color
+                and doc.tags == note_tags(note)):
+            # Only the position or timestamp changed: keep the postings
+            mtime = parse_timestamp(note.timestamp)
+            if mtime != doc.mtime:
+                self._remove_time(doc.mtime, docnum)
+                doc.set_mtime(mtime)
+                bisect.insort(self._by_time, (mtime, docnum))
+            return
+        self.remove(note.id)
+        self._add(note, text=text)
+
+    def remove(self, note_id):
+        if self._building is not None:
+            self._changed[note_id] = None
+            return
+        docnum = self._doc_by_id.pop(note_id, None)
+        if docnum is None:
+            return
+        doc = self._docs.pop(docnum)
+        self._remove_time(doc.mtime, docnum)
+        self._dead_docs += 1
+        if self._dead_docs > max(len(self._docs), 1024):
+            self._vacuum()
+
+    def _remove_time(self, mtime, docnum):
+        i = bisect.bisect_left(self._by_time, (mtime, docnum))
+        if i < len(self._by_time) and self._by_time[i] == (mtime, docnum):
+            del self._by_time[i]
+
+    @staticmethod
+    def _append(index, key, docnum):
+        plist = index.get(key)
+        if plist is None:
+            index[key] = array('I', (docnum,))
+        else:
+            plist.append(docnum)
+
+    def _add(self, note, postings=None, title_postings=None, text=None):
+        docnum = self._next_doc
+        self._next_doc += 1
+
+        doc = _Document(note, text)
+        self._docs[docnum] = doc
+        self._doc_by_id[doc.note_id] = docnum
+
+        self._append(self._by_color, doc.color, docnum)
+        for tag in doc.tags:
+            self._append(self._by_tag, tag, docnum)
+        bisect.insort(self._by_time, (doc.mtime, docnum))
+
+        grams = trigrams(doc.text)
+        title_grams = trigrams(doc.title_text)
+        if postings is None:
+            self._postings.add(docnum, grams)
+            self._title_postings.add(docnum, title_grams)
+        else:
+            for gram in grams:
+                plist = postings.get(gram)
+                if plist is None:
+                    postings[gram] = array('I', (docnum,))
+                else:
+                    plist.append(docnum)
+            for gram in title_grams:
+                self._append(title_postings, gram, docnum)
+
+    def _vacuum(self):
+        """Drops document numbers of replaced or removed notes from every list"""
+        live = self._docs
+        self._postings.vacuum(live)
+        self._title_postings.vacuum(live)
+        for index in (self._by_color, self._by_tag):
+            for key in list(index):
+                plist = array('I', (d for d in index[key] if d in live))
+                if plist:
+                    index[key] = plist
+                else:
+                    del index[key]
+        self._dead_docs = 0
+
+    def _candidates(self, term, postings=None):
+        """Returns document numbers that may contain a term of at least GRAM characters, in ascending order"""
+        postings = postings or self._postings
+        # Lists are intersected smallest first until the candidates left
+        # are cheaper to verify than the next list is to decode
+        grams = sorted(trigrams(term), key=postings.count)
+        result = set(accumulate(postings.lists.get(grams[0], ())))
+        for gram in grams[1:]:
+            if not result or postings.count(gram) > len(result) * VERIFY_COST:
+                break
+            result = result.intersection(accumulate(postings.lists[gram]))
+        return sorted(result)
+
+    def _time_range(self, after, before):
+        lo = 0 if after is None else bisect.bisect_left(self._by_time, (after, -1))
+        hi = len(self._by_time) if before is None else bisect.bisect_left(self._by_time, (before, -1))
+        return sorted(docnum for _, docnum in self._by_time[lo:hi])
+
+    def _filters(self, query):
+        """Returns the sorted document lists of the color, tag and date filters of a query"""
+        lists = []
+        if query.colors:
+            if len(query.colors) == 1:
+                lists.append(self._by_color.get(query.colors[0], _EMPTY))
+            else:
+                lists.append(sorted(set().union(*(self._by_color.get(c, ()) for c in query.colors))))
+        for tag in query.tags:
+            lists.append(self._by_tag.get(tag, _EMPTY))
+        if query.after is not None or query.before is not None:
+            lists.append(self._time_range(query.after, query.before))
+        return lists
+
+    @staticmethod
+    def _intersect(lists):
+        """Intersects sorted document lists, smallest first"""
+        lists = sorted(lists, key=len)
+        candidates = lists[0]
+        for plist in lists[1:]:
+            if not candidates:
+                break
+            candidates = intersect_sorted(candidates, plist)
+        return candidates
+
+    def _all_candidates(self, query, terms):
+        """Returns the sorted document numbers that may match a query"""
+        lists = self._filters(query)
+        # Only the longest term goes through the trigram index; the others
+        # are cheaper to verify on the few remaining candidates. A term
+        # shorter than a trigram is in most notes and in hundreds of
+        # trigrams, so every note is verified instead (the first keystroke
+        # in the search box)
+        if terms and len(terms[0]) >= GRAM:
+            lists.append(self._candidates(terms[0]))
+        return self._intersect(lists) if lists else sorted(self._docs)
+
+    @staticmethod
+    def _match(doc, terms, first):
+        """Returns (first term position, at word start) if doc contains every term, else None"""
+        if first is None:
+            return -1, False
+        text = doc.text
+        position = text.find(first)
+        if position < 0:
+            return None
+        for term in terms:
+            if term is not first and term not in text:
+                return None
+        return position, position == 0 or not text[position - 1].isalnum()
+
+    def _scan(self, query):
+        """Yields (NoteModel, lowercased text) of the notes matching a query while the index is being built"""
+        terms = sorted(query.terms, key=len, reverse=True)
+        tags = set(query.tags)
+        for note in list(self._building.values()):
+            if query.colors and note.color not in query.colors:
+                continue
+            if tags and not tags.issubset(note_tags(note)):
+                continue
+            if query.after is not None or query.before is not None:
+                mtime = parse_timestamp(note.timestamp)
+                if query.after is not None and mtime < query.after:
+                    continue
+                if query.before is not None and mtime >= query.before:
+                    continue
+            text = lowered(note.text)
+            if all(term in text for term in terms):
+                yield note, text
+
+    def _execute(self, query):
+        """Yields (document, first term position, at word start) for every match"""
+        terms = sorted(query.terms, key=len, reverse=True)
+        first = query.terms[0] if query.terms else None
+        docs = self._docs
+        for docnum in self._all_candidates(query, terms):
+            doc = docs.get(docnum)
+            if doc is None:
+                continue
+            match = self._match(doc, terms, first)
+            if match is not None:
+                yield (doc,) + match
+
+    def matching_ids(self, text):
+        """Returns the set of note ids matching a search box query"""
+        self._ensure_built()
+        query = parse_query(text)
+        if query.is_empty():
+            return set(self._building if self._building is not None else self._doc_by_id)
+        if self._building is not None:
+            return {note.id for note, _ in self._scan(query)}
+        return {match[0].note_id for match in self._execute(query)}
+
+    def search(self, text, limit=20):
+        """Returns up to `limit` note ids matching a query (all if None), best ranked first.
+
+        Notes are ranked by title hit, position of the first text term
+        (earlier and at a word start is better) and recency of their
+        timestamp; queries without text terms are ordered by recency alone.
+        """
+        self._ensure_built()
+        query = parse_query(text)
+        decay = RECENCY_WEIGHT * 0.5 ** ((time.time() - RECENCY_EPOCH) / RECENCY_HALF_LIFE)
+        terms = sorted(query.terms, key=len, reverse=True)
+        first = query.terms[0] if query.terms else None
+        docs = self._docs
+        results = []
+
+        def offer(doc, position, word_start):
+            score = min(doc.boost * decay, RECENCY_WEIGHT)
+            if position >= 0:
+                score += POSITION_WEIGHT / (1.0 + position / 64.0)
+                if word_start:
+                    score += WORD_START_WEIGHT
+                if any(term in doc.title_text for term in terms):
+                    score += TITLE_WEIGHT
+
+            # Keep only the best `limit` results in a min-heap
+            entry = (score, doc.note_id)
+            if limit is None:
+                results.append(entry)
+            elif len(results) < limit:
+                heapq.heappush(results, entry)
+            elif entry > results[0]:
+                heapq.heapreplace(results, entry)
+
+        # Notes with a title hit go first: once K of them score more than
+        # any note without one, the content candidates are never read
+        if self._building is not None:
+            # Only matches get a document, to be ranked
+            for note, text in self._scan(query):
+                doc = _Document(note, text)
+                offer(doc, *self._match(doc, terms, first))
+            return [note_id for _, note_id in sorted(results, reverse=True)]
+
+        titled = set()
+        title_first = bool(limit and terms and len(terms[-1]) >= GRAM)
+        if title_first:
+            lists = self._filters(query)
+            lists.append(sorted(set().union(*(self._candidates(term, self._title_postings)
+                                              for term in terms))))
+            for docnum in self._intersect(lists):
+                doc = docs.get(docnum)
+                match = None if doc is None else self._match(doc, terms, first)
+                if match is not None:
+                    titled.add(docnum)
+                    offer(doc, *match)
+            if len(results) == limit and results[0][0] > UNTITLED_MAX_SCORE:
+                return [note_id for _, note_id in sorted(results, reverse=True)]
+
+        # Newest first, skipping notes whose best possible score without a
+        # title hit cannot make the top K anymore
+        for docnum in reversed(self._all_candidates(query, terms)):
+            if docnum in titled:
+                continue
+            doc = docs.get(docnum)
+            if doc is None:
+                continue
+            if (title_first and len(results) == limit
+                    and min(doc.boost * decay, RECENCY_WEIGHT) + POSITION_WEIGHT + WORD_START_WEIGHT
+                    < results[0][0]):
+                continue
+            match = self._match(doc, terms, first)
+            if match is not None:
+                offer(doc, *match)
+
+        return [note_id for _, note_id in sorted(results, reverse=True)]
+
+    def __contains__(self, note_id):
+        self._ensure_built()
+        return note_id in (self._building if self._building is not None else self._doc_by_id)
+
+    def __len__(self):
+        self._ensure_built()
+        return len(self._building if self._building is not None else self._doc_by_id)
+
+    def get_stats(self):
+        """Returns index size figures"""
+        self._ensure_built()
+        return {
+            'notes': len(self._doc_by_id),
+            'trigrams': len(self._postings.lists),
+            'postings': self._postings.entries(),
+            'postings_bytes': self._postings.nbytes(),
+            'title_postings_bytes': self._title_postings.nbytes(),
+            'colors': len(self._by_color),
+            'tags': len(self._by_tag),
+            'dead_docs': self._dead_docs,
+        }
@@ -0,0 +1,56 @@
+# settings.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+
+from gi.repository import Gio
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_ID = 'org.gnome.StickyNotes'
+
+
+def get_settings():
+    """Returns the application's Gio.Settings, or None if the schema is not installed"""
+    source = Gio.SettingsSchemaSource.get_default()
+    if source and source.lookup(SCHEMA_ID, True):
+        return Gio.Settings.new(SCHEMA_ID)
+    logger.warning("Settings schema %s not installed, using defaults", SCHEMA_ID)
+    return None
+
+
+def get_int(settings, key, default):
+    """Reads an integer key, falling back to default when settings are unavailable"""
+    if settings is None:
+        return default
+    return settings.get_int(key)
+
+
+def get_string(settings, key, default):
+    """Reads a string key, falling back to default when settings are unavailable"""
+    if settings is None:
+        return default
+    return settings.get_string(key)
+
+
+def get_boolean(settings, key, default):
+    """Reads a boolean key, falling back to default when settings are unavailable"""
+    if settings is None:
+        return default
+    return settings.get_boolean(key)
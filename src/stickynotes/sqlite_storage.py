@@ -0,0 +1,201 @@
+# sqlite_storage.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import logging
+import os
+import sqlite3
+
+from .edits import apply_edit
+from .storage import NoteStorage, FSYNC_BATCH
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONOUS = {
+    'never': 'OFF',
+    # WAL + NORMAL only syncs on checkpoints, which is plenty for notes
+    'batch': 'NORMAL',
+    'always': 'FULL',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    color TEXT NOT NULL DEFAULT 'yellow',
+    x INTEGER NOT NULL DEFAULT 100,
+    y INTEGER NOT NULL DEFAULT 100,
+    timestamp TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS notes_timestamp ON notes (timestamp);
+CREATE INDEX IF NOT EXISTS notes_color ON notes (color);
+CREATE INDEX IF NOT EXISTS notes_title ON notes (title);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = ('id', 'title', 'content', 'color', 'x', 'y', 'timestamp')
+
+UPSERT = """
+INSERT INTO notes (id, title, content, color, x, y, timestamp, extra)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    title = excluded.title,
+    content = excluded.content,
+    color = excluded.color,
+    x = excluded.x,
+    y = excluded.y,
+    timestamp = excluded.timestamp,
+    extra = excluded.extra
+"""
+
+MOVE = "UPDATE notes SET x = ?, y = ? WHERE id = ?"
+
+SELECT = "SELECT id, title, content, color, x, y, timestamp, extra FROM notes"
+
+
+class SqliteStorage(NoteStorage):
+    """Stores one row per note in an SQLite database running in WAL mode"""
+
+    def __init__(self, db_file, import_from=None, fsync_policy=FSYNC_BATCH):
+        super().__init__(fsync_policy)
+        self.db_file = db_file
+        self.import_from = import_from
+
+        # The connection is shared by the writer thread and main-thread
+        # queries; self._lock serialises access to it
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(f'PRAGMA synchronous={SYNCHRONOUS.get(fsync_policy, "NORMAL")}')
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def load(self):
+        if self.import_from:
+            self.import_json(self.import_from)
+        return {note['id']: note for note in self._query(SELECT)}
+
+    def save_note(self, note_data):
+        self.write_batch([note_data], [])
+
+    def delete_note(self, note_id):
+        self.write_batch([], [note_id])
+
+    def move_note(self, note_id, x, y):
+        self.write_batch([], [], [(note_id, x, y)])
+
+    def edit_note(self, note_id, edit):
+        self.write_batch([], [], edits=[(note_id, edit)])
+
+    def write_batch(self, saves, deletions, moves=(), edits=()):
+        # One transaction per batch
+        with self._lock, self.db:
+            self.db.executemany(UPSERT, (self._to_row(n) for n in saves))
+            self.db.executemany("DELETE FROM notes WHERE id = ?", ((i,) for i in deletions))
+            for note_id, edit in edits:
+                # Rows hold whole notes: the edit is applied to the stored content
+                row = self.db.execute(SELECT + " WHERE id = ?", (note_id,)).fetchone()
+                if row is not None:
+                    note = self._from_row(row)
+                    edited = apply_edit(note, edit)
+                    if edited is not note:
+                        self.db.execute(UPSERT, self._to_row(edited))
+            self.db.executemany(MOVE, ((x, y, i) for i, x, y in moves))
+
+    def recent_notes(self, limit):
+        return self._query(SELECT + " ORDER BY timestamp DESC LIMIT ?", (limit,))
+
+    def notes_by_color(self, color):
+        return self._query(SELECT + " WHERE color = ?", (color,))
+
+    def notes_by_title_prefix(self, prefix):
+        """Returns notes whose title starts with prefix, using the title index"""
+        if not prefix:
+            return self._query(SELECT + " ORDER BY title")
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self._query(SELECT + " WHERE title >= ? AND title < ? ORDER BY title", (prefix, upper))
+
+    def import_json(self, json_file):
+        """Imports a JSON (or journal) store once, the first time the database is opened"""
+        if self._get_meta('imported-from-json') or not os.path.exists(json_file):
+            return 0
+        if self.db.execute("SELECT 1 FROM notes LIMIT 1").fetchone():
+            return 0
+
+        from .journal import JournalStorage
+        journal = JournalStorage(json_file)
+        try:
+            notes = journal.load()
+        finally:
+            journal.close()
+
+        with self._lock, self.db:
+            self.db.executemany(UPSERT, (self._to_row(n) for n in notes.values()))
+            self._set_meta('imported-from-json', json_file)
+        logger.info("Imported %d notes from %s", len(notes), json_file)
+        return len(notes)
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    @staticmethod
+    def _to_row(note_data):
+        extra = {k: v for k, v in note_data.items() if k not in COLUMNS}
+        content = note_data.get('content', '')
+        if isinstance(content, dict):
+            # Enhanced-format blocks go with the other JSON keys
+            extra['content'] = content
+            content = ''
+        # Enhanced notes keep these in their metadata (STORAGE.md 1.2)
+        metadata = note_data.get('metadata') or {}
+        position = metadata.get('position') or {}
+        return (
+            note_data['id'],
+            note_data.get('title', ''),
+            content,
+            note_data.get('color') or metadata.get('color') or 'yellow',
+            note_data.get('x', position.get('x', 100)),
+            note_data.get('y', position.get('y', 100)),
+            note_data.get('timestamp') or metadata.get('modified'),
+            json.dumps(extra) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(row):
+        note = dict(zip(COLUMNS, row[:7]))
+        if row[7]:
+            note.update(json.loads(row[7]))
+        return note
+
+    def _get_meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
@@ -0,0 +1,222 @@
+# storage.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import logging
+import os
+import threading
+
+from .edits import apply_edit
+
+logger = logging.getLogger(__name__)
+
+JSON_FILE = 'sticky-notes.json'
+SQLITE_FILE = 'sticky-notes.db'
+INDEXED_FILE = 'sticky-notes.bin'
+
+# fsync policies for the `storage-fsync` setting
+FSYNC_NEVER = 'never'     # leave flushing to the kernel
+FSYNC_BATCH = 'batch'     # fsync the written file once per batch
+FSYNC_ALWAYS = 'always'   # also fsync the directory after renames
+
+
+def fsync_directory(path):
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_identity(path):
+    """Returns what tells two versions of a file apart (inode, size, mtime), or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def atomic_write_json(path, data, fsync_policy=FSYNC_BATCH):
+    """Writes data to a temporary file and atomically replaces path with it"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        if fsync_policy != FSYNC_NEVER:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if fsync_policy == FSYNC_ALWAYS:
+        fsync_directory(path)
+
+
+class NoteStorage:
+    """Interface implemented by every note persistence engine.
+
+    Engines keep their own view of the stored notes; the application only
+    hands them individual changes. After load() an engine is written to from
+    the persistence writer thread only, while queries may come from the main
+    thread, so changes to the in-memory view happen under self._lock.
+    """
+
+    # JSON file other programs may change behind our back, if the engine
+    # has one, and its file_identity() right after our last write to it
+    monitored_file = None
+    last_written = None
+    # Whether load() leaves note bodies as LazyContent (see model.py),
+    # decoded the first time they are read
+    lazy_content = False
+
+    def __init__(self, fsync_policy=FSYNC_BATCH):
+        self._notes = {}
+        self._lock = threading.Lock()
+        self.fsync_policy = fsync_policy
+
+    def load(self):
+        """Returns a dictionary of note id -> note data"""
+        raise NotImplementedError
+
+    def reload(self):
+        """Re-reads a store changed by another program; returns (changed notes, removed note ids)"""
+        with self._lock:
+            old = dict(self._notes)
+        notes = self.load()
+        changed = [note_data for note_id, note_data in notes.items() if old.get(note_id) != note_data]
+        removed = [note_id for note_id in old if note_id not in notes]
+        return changed, removed
+
+    def save_note(self, note_data):
+        """Persists a single note, inserting or replacing it"""
+        raise NotImplementedError
+
+    def delete_note(self, note_id):
+        """Removes a single note"""
+        raise NotImplementedError
+
+    def move_note(self, note_id, x, y):
+        """Updates only the position of a stored note"""
+        raise NotImplementedError
+
+    def edit_note(self, note_id, edit):
+        """Applies a content edit (see edits.py) to a stored note"""
+        raise NotImplementedError
+
+    def write_batch(self, saves, deletions, moves=(), edits=()):
+        """Persists several changes at once; engines override this to write them together.
+
+        `moves` are (note id, x, y) position-only updates and `edits` are
+        (note id, edit) content deltas, applied in order before the moves.
+        """
+        for note_data in saves:
+            self.save_note(note_data)
+        for note_id in deletions:
+            self.delete_note(note_id)
+        for note_id, edit in edits:
+            self.edit_note(note_id, edit)
+        for note_id, x, y in moves:
+            self.move_note(note_id, x, y)
+
+    def _apply_batch(self, saves, deletions, moves=(), edits=()):
+        with self._lock:
+            for note_data in saves:
+                self._notes[note_data['id']] = note_data
+            for note_id in deletions:
+                self._notes.pop(note_id, None)
+            for note_id, edit in edits:
+                note_data = self._notes.get(note_id)
+                if note_data is not None:
+                    self._notes[note_id] = apply_edit(note_data, edit)
+            for note_id, x, y in moves:
+                note_data = self._notes.get(note_id)
+                if note_data is not None:
+                    # Replaced, not mutated: snapshots may still hold the old dict
+                    self._notes[note_id] = dict(note_data, x=x, y=y)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._notes.values())
+
+    def recent_notes(self, limit):
+        """Returns the `limit` most recently modified notes, newest first"""
+        notes = sorted(self._snapshot(), key=lambda n: n.get('timestamp') or '', reverse=True)
+        return notes[:limit]
+
+    def notes_by_color(self, color):
+        """Returns every note with the given color"""
+        return [n for n in self._snapshot() if n.get('color', 'yellow') == color]
+
+    def close(self):
+        pass
+
+
+class JsonStorage(NoteStorage):
+    """Stores every note in a single JSON file, rewritten on each change"""
+
+    def __init__(self, data_file, fsync_policy=FSYNC_BATCH):
+        super().__init__(fsync_policy)
+        self.data_file = data_file
+        self.monitored_file = data_file
+
+    def load(self):
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                self._notes = json.load(f)
+        return dict(self._notes)
+
+    def save_note(self, note_data):
+        self.write_batch([note_data], [])
+
+    def delete_note(self, note_id):
+        self.write_batch([], [note_id])
+
+    def move_note(self, note_id, x, y):
+        self.write_batch([], [], [(note_id, x, y)])
+
+    def edit_note(self, note_id, edit):
+        self.write_batch([], [], edits=[(note_id, edit)])
+
+    def write_batch(self, saves, deletions, moves=(), edits=()):
+        # However many notes changed, the file is rewritten only once
+        self._apply_batch(saves, deletions, moves, edits)
+        self.write()
+
+    def write(self):
+        # Only the writer thread mutates self._notes, so it is stable here
+        atomic_write_json(self.data_file, self._notes, self.fsync_policy)
+        self.last_written = file_identity(self.data_file)
+
+
+def create_storage(backend, data_dir, fsync_policy=FSYNC_BATCH):
+    """Returns the storage engine for the `storage-backend` setting"""
+    json_file = os.path.join(data_dir, JSON_FILE)
+
+    if backend == 'sqlite':
+        from .sqlite_storage import SqliteStorage
+        return SqliteStorage(os.path.join(data_dir, SQLITE_FILE), import_from=json_file,
+                             fsync_policy=fsync_policy)
+    if backend == 'indexed':
+        from .indexed_storage import IndexedStorage
+        return IndexedStorage(os.path.join(data_dir, INDEXED_FILE), import_from=json_file,
+                              fsync_policy=fsync_policy)
+    if backend == 'journal':
+        from .journal import JournalStorage
+        return JournalStorage(json_file, fsync_policy=fsync_policy)
+    if backend != 'json':
+        logger.warning("Unknown storage backend '%s', using json", backend)
+    return JsonStorage(json_file, fsync_policy=fsync_policy)
@@ -0,0 +1,468 @@
+# sync.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Synchronization of notes with a server (`sync-enabled`, `sync-server`).
+
+Every local change to a note is stamped with a hybrid logical clock
+(HLC): wall-clock milliseconds, a counter for events within the same
+millisecond, and the id of the device. Stamps are fixed-width strings, so
+comparing two of them is a plain string comparison and every device
+orders them the same way. A conflict is resolved by keeping the version
+with the greater stamp, deletions included.
+
+A sync round posts the notes changed since the last round and gets back
+the changes other devices made since the last token, in batches, over a
+single keep-alive HTTP connection. The protocol is a single endpoint:
+
+    POST <server>/sync
+    {"node": "...", "since": 1234, "limit": 500,
+     "changes": [{"id": "...", "hlc": "...", "note": {...}},
+                 {"id": "...", "hlc": "...", "deleted": true}]}
+
+    {"token": 1300, "more": false, "changes": [...]}
+
+The network and JSON work runs on the sync thread; remote changes are
+handed to the main loop to be applied. See sync_server.py for a reference
+implementation of the server.
+"""
+
+import gzip
+import http.client
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime
+
+from .events import NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED
+from .storage import FSYNC_NEVER, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_FILE = 'sticky-notes-sync.json'
+
+# Notes sent, and changes asked for, per request
+BATCH_SIZE = 500
+# Seconds between rounds when nothing changes locally
+SYNC_INTERVAL = 60.0
+# Seconds to wait after a local change, so a burst of saves goes in one round
+SYNC_DELAY = 2.0
+MAX_BACKOFF = 300.0
+# Request bodies larger than this are gzipped
+GZIP_MIN_BYTES = 1024
+
+
+class SyncError(Exception):
+    """The server rejected a request or sent something that is not a sync response"""
+
+
+def format_stamp(wall, counter, node):
+    return f'{wall:013x}-{counter:04x}-{node}'
+
+
+def parse_stamp(stamp):
+    wall, counter, node = stamp.split('-', 2)
+    return int(wall, 16), int(counter, 16), node
+
+
+def timestamp_stamp(timestamp, node):
+    """Returns a stamp for a note never synced before, from its modification time"""
+    try:
+        wall = int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except (TypeError, ValueError):
+        wall = 0
+    return format_stamp(wall, 0, node)
+
+
+class HybridClock:
+    """Hybrid logical clock; now() is strictly increasing and ahead of every stamp received"""
+
+    def __init__(self, node, wall=0, counter=0, clock=time.time):
+        self.node = node
+        self.wall = wall
+        self.counter = counter
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            physical = int(self._clock() * 1000)
+            if physical > self.wall:
+                self.wall, self.counter = physical, 0
+            elif self.counter < 0xffff:
+                self.counter += 1
+            else:
+                # Keep stamps fixed-width: borrow the next millisecond
+                self.wall, self.counter = self.wall + 1, 0
+            return format_stamp(self.wall, self.counter, self.node)
+
+    def receive(self, stamp):
+        wall, counter, _ = parse_stamp(stamp)
+        with self._lock:
+            if wall > self.wall:
+                self.wall, self.counter = wall, counter
+            elif wall == self.wall and counter > self.counter:
+                self.counter = counter
+
+
+class SyncConnection:
+    """One persistent HTTP connection to the sync server, reopened when it drops"""
+
+    def __init__(self, url, timeout=30.0):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"invalid sync server URL {url!r}")
+        self._factory = (http.client.HTTPSConnection if parts.scheme == 'https'
+                         else http.client.HTTPConnection)
+        self._host = parts.hostname
+        self._port = parts.port
+        self.path = parts.path.rstrip('/') + '/sync'
+        self.timeout = timeout
+        self._connection = None
+
+        # Contadores para instrumentación
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def post(self, body):
+        data = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        if len(data) >= GZIP_MIN_BYTES:
+            data = gzip.compress(data, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+
+        # A kept-alive connection the server has closed fails on first use;
+        # sending again is safe because applying a change twice is a no-op
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._factory(self._host, self._port, timeout=self.timeout)
+                self.connections += 1
+            try:
+                self._connection.request('POST', self.path, data, headers)
+                response = self._connection.getresponse()
+                payload = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if attempt:
+                    raise
+            except (OSError, http.client.HTTPException):
+                self.close()
+                raise
+        self.requests += 1
+        self.bytes_sent += len(data)
+        self.bytes_received += len(payload)
+
+        if response.status != 200:
+            raise SyncError(f"sync server answered {response.status} {response.reason}")
+        if response.getheader('Content-Encoding') == 'gzip':
+            payload = gzip.decompress(payload)
+        try:
+            result = json.loads(payload)
+        except ValueError as e:
+            raise SyncError(f"invalid sync response: {e}") from e
+        if not isinstance(result, dict) or 'token' not in result:
+            raise SyncError("invalid sync response: no token")
+        return result
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _call(function, *args):
+    function(*args)
+
+
+class SyncEngine:
+    """Keeps app.notes in sync with a server, from a thread of its own.
+
+    Local changes are picked up from app.events on the main loop, stamped
+    and queued; the thread sends them and fetches remote changes, which
+    `dispatch` (GLib.idle_add in the app) runs on the main loop through
+    app.apply_remote_note() and app.apply_remote_deletion().
+    """
+
+    def __init__(self, app, server_url, state_path, dispatch=_call,
+                 interval=SYNC_INTERVAL, delay=SYNC_DELAY, batch_size=BATCH_SIZE):
+        self.app = app
+        self.state_path = state_path
+        self.dispatch = dispatch
+        self.interval = interval
+        self.delay = delay
+        self.batch_size = batch_size
+        self.connection = SyncConnection(server_url)
+
+        state = self._load_state()
+        self.node = state.get('node') or uuid.uuid4().hex
+        self.clock = HybridClock(self.node, *state.get('clock', (0, 0)))
+        self.token = state.get('token', 0)
+        # note id -> stamp of the newest version known here
+        self.versions = state.get('versions', {})
+        # note id -> note data (None: deleted) of local changes not sent yet
+        self._outbox = {}
+        self._applying = False
+        self._handler_ids = []
+
+        self._stopping = False
+        # monotonic time of the next round, and seconds to wait after a failed one
+        self._due = time.monotonic() + interval
+        self._backoff = 0.0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='note-sync', daemon=True)
+
+        # Unsent changes of the last session, and notes never synced
+        for note_id in state.get('outbox', ()):
+            self._queue_local(note_id, stamp=self.versions.get(note_id))
+        for note_id, note in app.notes.items():
+            if note_id not in self.versions:
+                self._queue_local(note_id, stamp=timestamp_stamp(note.timestamp, self.node))
+
+        # Contadores para instrumentación
+        self.rounds = 0
+        self.sent = 0
+        self.received = 0
+        self.applied = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error("Error leyendo estado de sincronización: %s", e)
+            return {}
+
+    def _save_state(self):
+        with self._condition:
+            state = {
+                'node': self.node,
+                'clock': [self.clock.wall, self.clock.counter],
+                'token': self.token,
+                'versions': dict(self.versions),
+                'outbox': list(self._outbox),
+            }
+        atomic_write_json(self.state_path, state, FSYNC_NEVER)
+
+    def start(self):
+        for kind in (NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED):
+            self._handler_ids.append(self.app.events.connect(kind, self.on_note_event))
+        self._thread.start()
+        self.request_sync()
+
+    def stop(self, timeout=None):
+        """Stops syncing; returns False if the thread is still in a request after the timeout.
+
+        The thread closes the connection and saves the state on its way out,
+        so a request that outlives the timeout does not race with either.
+        """
+        for handler_id in self._handler_ids:
+            self.app.events.disconnect(handler_id)
+        self._handler_ids = []
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread.ident is None:
+            # Never started
+            self._shutdown()
+            return True
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Sync round still running after %s s; its state is saved when it ends", timeout)
+            return False
+        return True
+
+    def _shutdown(self):
+        self.connection.close()
+        try:
+            self._save_state()
+        except OSError as e:
+            logger.error("Error guardando estado de sincronización: %s", e)
+
+    def request_sync(self):
+        """Starts a round as soon as possible"""
+        with self._condition:
+            self._due = time.monotonic()
+            self._condition.notify_all()
+
+    def on_note_event(self, event):
+        # Main loop. Changes made by apply_remote_*() are not local changes
+        if self._applying:
+            return
+        self._queue_local(event.note_id)
+
+    def _queue_local(self, note_id, stamp=None):
+        note = self.app.notes.get(note_id)
+        if note is not None:
+            note_data = note.to_dict()
+            # Revisions count local saves; every device has its own
+            note_data.pop('revision', None)
+        else:
+            note_data = None
+        with self._condition:
+            self.versions[note_id] = stamp or self.clock.now()
+            self._outbox[note_id] = note_data
+            if not self._backoff:
+                self._due = min(self._due, time.monotonic() + self.delay)
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    wait = self._due - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if self._stopping:
+                    break
+                self._due = float('inf')
+            try:
+                self.sync_once()
+                self._backoff = 0.0
+            except (OSError, http.client.HTTPException, SyncError, ValueError) as e:
+                self.errors += 1
+                self._backoff = min(max(self._backoff * 2, 5.0), MAX_BACKOFF)
+                logger.warning("Error sincronizando notas (reintento en %.0f s): %s", self._backoff, e)
+            with self._condition:
+                # Changes made during the round may have brought it forward
+                delay = self._backoff or self.interval
+                self._due = min(self._due, time.monotonic() + delay)
+        self._shutdown()
+
+    def _take_batch(self):
+        with self._condition:
+            changes = []
+            for note_id in list(self._outbox)[:self.batch_size]:
+                stamp = self.versions[note_id]
+                note_data = self._outbox[note_id]
+                if note_data is None:
+                    changes.append({'id': note_id, 'hlc': stamp, 'deleted': True})
+                else:
+                    changes.append({'id': note_id, 'hlc': stamp, 'note': note_data})
+            return changes
+
+    def _acknowledge(self, changes):
+        with self._condition:
+            for change in changes:
+                # A note changed again while the request was out stays queued
+                if self.versions.get(change['id']) == change['hlc']:
+                    self._outbox.pop(change['id'], None)
+
+    def sync_once(self):
+        """Runs one sync round: sends every queued change and fetches every remote one"""
+        self.rounds += 1
+        while True:
+            changes = self._take_batch()
+            response = self.connection.post({
+                'node': self.node,
+                'since': self.token,
+                'limit': self.batch_size,
+                'changes': changes,
+            })
+            self._acknowledge(changes)
+            self.sent += len(changes)
+
+            remote = response.get('changes') or []
+            for change in remote:
+                self.clock.receive(change['hlc'])
+            if remote:
+                self.received += len(remote)
+                if not self._apply(remote):
+                    # Stopping; the token is not advanced past what was not applied
+                    break
+            with self._condition:
+                self.token = response['token']
+                more = bool(self._outbox) or response.get('more')
+            if not more or self._stopping:
+                break
+        # Once per round: a round cut short just fetches again from the old token
+        self._save_state()
+
+    def _apply(self, changes):
+        """Hands remote changes to the main loop and waits for them to be applied"""
+        done = threading.Event()
+        self.dispatch(self._apply_changes, changes, done)
+        while not done.wait(0.5):
+            if self._stopping:
+                return False
+        return True
+
+    def _apply_changes(self, changes, done):
+        # Main loop. Unsaved typing is saved (and stamped) first, so it
+        # takes part in the comparison like any other local change
+        try:
+            for change in changes:
+                self.app.autosave.flush(change['id'])
+
+            winners = []
+            with self._condition:
+                for change in changes:
+                    note_id = change['id']
+                    local = self.versions.get(note_id)
+                    if local is not None and local >= change['hlc']:
+                        if note_id in self._outbox:
+                            self.conflicts += 1
+                        continue
+                    if note_id in self._outbox:
+                        # The remote version is newer than the unsent local one
+                        self.conflicts += 1
+                        del self._outbox[note_id]
+                    self.versions[note_id] = change['hlc']
+                    winners.append(change)
+
+            self._applying = True
+            try:
+                for change in winners:
+                    if change.get('deleted'):
+                        self.app.apply_remote_deletion(change['id'])
+                    else:
+                        self.app.apply_remote_note(dict(change['note'], id=change['id']))
+                    self.applied += 1
+            finally:
+                self._applying = False
+        finally:
+            done.set()
+        return False
+
+    def get_stats(self):
+        """Returns the sync counters"""
+        with self._condition:
+            pending = len(self._outbox)
+        return {
+            'rounds': self.rounds,
+            'sent': self.sent,
+            'received': self.received,
+            'applied': self.applied,
+            'conflicts': self.conflicts,
+            'errors': self.errors,
+            'pending': pending,
+            'requests': self.connection.requests,
+            'connections': self.connection.connections,
+            'bytes_sent': self.connection.bytes_sent,
+            'bytes_received': self.connection.bytes_received,
+        }
@@ -0,0 +1,188 @@
+# sync_server.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Reference sync server, for trying out and testing sync offline.
+
+    PYTHONPATH=src python3 -m stickynotes.sync_server --port 8765 --data notes-server.json
+
+then set `sync-server` to http://localhost:8765. It keeps the newest
+version of every note (tombstones included) in memory, numbered with a
+sequence that grows with every accepted change; the sync token is a
+position in that sequence. With --data the notes are loaded from and
+saved to a JSON file on exit. It is not installed with the application.
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .storage import FSYNC_BATCH, atomic_write_json
+from .sync import BATCH_SIZE, GZIP_MIN_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class SyncStore:
+    """Newest version of each note, and the order in which they changed"""
+
+    def __init__(self, notes=None):
+        # note id -> change dict with its 'seq', 'hlc', 'node' and 'note' or 'deleted'
+        self.notes = dict(notes or {})
+        # Sequence numbers and note ids in change order; entries superseded
+        # by a later change are skipped when read and dropped by _compact()
+        live = sorted((entry['seq'], note_id) for note_id, entry in self.notes.items())
+        self._log_seqs = [seq for seq, _ in live]
+        self._log_ids = [note_id for _, note_id in live]
+        self.seq = self._log_seqs[-1] if live else 0
+        self._lock = threading.Lock()
+
+    def _store(self, change, node):
+        self.seq += 1
+        entry = {'id': change['id'], 'hlc': change['hlc'], 'node': node, 'seq': self.seq}
+        if change.get('deleted'):
+            entry['deleted'] = True
+        else:
+            entry['note'] = change['note']
+        self.notes[change['id']] = entry
+        self._log_seqs.append(self.seq)
+        self._log_ids.append(change['id'])
+
+    def sync(self, request):
+        """Applies the changes of a request; returns the response"""
+        node = request.get('node')
+        since = request.get('since', 0)
+        limit = max(1, min(request.get('limit', BATCH_SIZE), 10 * BATCH_SIZE))
+        with self._lock:
+            rejected = []
+            for change in request.get('changes', ()):
+                current = self.notes.get(change['id'])
+                if current is None or change['hlc'] > current['hlc']:
+                    self._store(change, node)
+                elif change['hlc'] < current['hlc']:
+                    # The sender lost; it gets the winner back
+                    rejected.append(current)
+            if len(self._log_seqs) > 2 * len(self.notes) + 1024:
+                self._compact()
+
+            changes = [self._public(entry) for entry in rejected]
+            sent = {entry['id'] for entry in rejected}
+            token = since
+            position = bisect.bisect_right(self._log_seqs, since)
+            while position < len(self._log_seqs) and len(changes) < limit:
+                seq = self._log_seqs[position]
+                entry = self.notes[self._log_ids[position]]
+                position += 1
+                token = seq
+                # Superseded since, or the sender's own change
+                if entry['seq'] != seq or entry['node'] == node or entry['id'] in sent:
+                    continue
+                changes.append(self._public(entry))
+            more = position < len(self._log_seqs)
+            if not more:
+                token = max(token, self.seq)
+            return {'token': token, 'more': more, 'changes': changes}
+
+    @staticmethod
+    def _public(entry):
+        return {k: v for k, v in entry.items() if k not in ('seq', 'node')}
+
+    def _compact(self):
+        live = [(seq, note_id) for seq, note_id in zip(self._log_seqs, self._log_ids)
+                if self.notes[note_id]['seq'] == seq]
+        self._log_seqs = [seq for seq, _ in live]
+        self._log_ids = [note_id for _, note_id in live]
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client sends every batch of a round over one connection
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+    server_version = 'StickyNotesSync/1.0'
+
+    def do_POST(self):
+        if self.path.rstrip('/').rsplit('/', 1)[-1] != 'sync':
+            self.send_error(404)
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            response = self.server.store.sync(json.loads(body))
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            self.send_error(400, explain=str(e))
+            return
+
+        data = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if len(data) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def serve(host='127.0.0.1', port=0, store=None):
+    """Returns a started server on a daemon thread; server.server_port is the port"""
+    server = ThreadingHTTPServer((host, port), SyncRequestHandler)
+    server.daemon_threads = True
+    server.store = store or SyncStore()
+    threading.Thread(target=server.serve_forever, name='sync-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--data', help='JSON file the notes are loaded from and saved to')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    notes = None
+    if args.data and os.path.exists(args.data):
+        with open(args.data, 'r') as f:
+            notes = json.load(f)
+    server = ThreadingHTTPServer((args.host, args.port), SyncRequestHandler)
+    server.daemon_threads = True
+    server.store = SyncStore(notes)
+    logger.info("Sync server on http://%s:%d", args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.data:
+            atomic_write_json(args.data, server.store.notes, FSYNC_BATCH)
+
+
+if __name__ == '__main__':
+    main()
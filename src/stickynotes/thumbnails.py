@@ -0,0 +1,243 @@
+# thumbnails.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Thumbnails of image blocks for the preview cards.
+
+Images are decoded and scaled down on a worker pool, never on the main
+loop. Every thumbnail is also written as a PNG to a disk cache keyed by
+media hash and size, so an image is only decoded at full resolution once,
+and recent textures are kept in memory in an LRU bounded by bytes.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import gi
+gi.require_version('Gdk', '4.0')
+gi.require_version('GdkPixbuf', '2.0')
+
+from gi.repository import Gdk, GdkPixbuf, GLib
+
+from . import trace
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = os.path.join('sticky-notes', 'thumbnails')
+# Longest side of a card thumbnail, in logical pixels
+THUMBNAIL_SIZE = 192
+MEMORY_BUDGET = 32 * 1024 * 1024
+
+
+class TextureCache:
+    """LRU of textures bounded by their size in bytes"""
+
+    def __init__(self, max_bytes=MEMORY_BUDGET):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+
+        # Contadores para instrumentación
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, texture):
+        size = texture.get_width() * texture.get_height() * 4
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._entries[key] = (texture, size)
+        self.bytes += size
+        # Always keep the newest texture, even if it alone is over budget
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Ticket:
+    __slots__ = ('request', 'callback', 'cancelled')
+
+    def __init__(self, request, callback):
+        self.request = request
+        self.callback = callback
+        self.cancelled = False
+
+
+class _Request:
+    """One thumbnail being made, shared by every card waiting for it"""
+
+    def __init__(self, key):
+        self.key = key
+        self.tickets = set()
+        self.future = None
+        self.cancelled = False
+
+
+class ThumbnailLoader:
+    """Hands out thumbnail textures of media objects to the preview cards.
+
+    request() answers from memory right away, or returns a ticket and calls
+    back on the main loop once a worker has made the texture. A card that
+    is unbound cancels its ticket; a request nobody waits for any more is
+    dropped before it is decoded.
+    """
+
+    def __init__(self, media, cache_dir, workers=2, memory_budget=MEMORY_BUDGET):
+        self.media = media
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.textures = TextureCache(memory_budget)
+        self._requests = {}
+        self._executor = None
+
+        # Contadores para instrumentación
+        self.decoded = 0
+        self.disk_hits = 0
+        self.cancelled = 0
+
+    def cache_path(self, digest, size):
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}-{size}.png')
+
+    def request(self, digest, size, callback):
+        """Calls callback(texture) with a thumbnail of at most size pixels.
+
+        Returns None if the callback already ran, else a ticket for cancel().
+        """
+        key = (digest, size)
+        texture = self.textures.get(key)
+        if texture is not None:
+            callback(texture)
+            return None
+
+        request = self._requests.get(key)
+        if request is None:
+            request = self._requests[key] = _Request(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='thumbnails')
+            request.future = self._executor.submit(self._load, request)
+            request.future.add_done_callback(
+                lambda future: GLib.idle_add(self._deliver, request))
+        ticket = _Ticket(request, callback)
+        request.tickets.add(ticket)
+        return ticket
+
+    def cancel(self, ticket):
+        """Stops waiting for a thumbnail; the work is dropped if nobody else wants it"""
+        if ticket is None or ticket.cancelled:
+            return
+        ticket.cancelled = True
+        request = ticket.request
+        request.tickets.discard(ticket)
+        if not request.tickets and not request.cancelled:
+            request.cancelled = True
+            request.future.cancel()
+            self._requests.pop(request.key, None)
+            self.cancelled += 1
+
+    def _load(self, request):
+        # Worker thread: only files and immutable textures in here
+        if request.cancelled:
+            return None
+        digest, size = request.key
+        path = self.cache_path(digest, size)
+        if os.path.exists(path):
+            self.disk_hits += 1
+            return Gdk.Texture.new_from_filename(path)
+
+        with trace.span('thumbnail_decode', size=size):
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                self.media.object_path(digest), size, size, True)
+            pixbuf = pixbuf.apply_embedded_orientation() or pixbuf
+        self.decoded += 1
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            pixbuf.savev(temp_path, 'png', [], [])
+            os.replace(temp_path, path)
+        except (GLib.Error, OSError) as e:
+            logger.warning("Error caching thumbnail of %s: %s", digest, e)
+
+        memory_format = (Gdk.MemoryFormat.R8G8B8A8 if pixbuf.get_has_alpha()
+                         else Gdk.MemoryFormat.R8G8B8)
+        return Gdk.MemoryTexture.new(pixbuf.get_width(), pixbuf.get_height(), memory_format,
+                                     pixbuf.read_pixel_bytes(), pixbuf.get_rowstride())
+
+    def _deliver(self, request):
+        if self._requests.get(request.key) is request:
+            del self._requests[request.key]
+        try:
+            texture = request.future.result()
+        except CancelledError:
+            return GLib.SOURCE_REMOVE
+        except (GLib.Error, OSError) as e:
+            logger.warning("Error loading thumbnail of %s: %s", request.key[0], e)
+            return GLib.SOURCE_REMOVE
+        if texture is None:
+            return GLib.SOURCE_REMOVE
+
+        self.textures.put(request.key, texture)
+        for ticket in list(request.tickets):
+            if not ticket.cancelled:
+                ticket.cancelled = True
+                ticket.callback(texture)
+        request.tickets.clear()
+        return GLib.SOURCE_REMOVE
+
+    def get_stats(self):
+        return {
+            'textures': len(self.textures),
+            'bytes': self.textures.bytes,
+            'hits': self.textures.hits,
+            'misses': self.textures.misses,
+            'evictions': self.textures.evictions,
+            'decoded': self.decoded,
+            'disk_hits': self.disk_hits,
+            'cancelled': self.cancelled,
+            'pending': len(self._requests),
+        }
+
+    def close(self):
+        for request in self._requests.values():
+            request.cancelled = True
+        self._requests.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,161 @@
+# trace.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tracing spans and debug logging.
+
+    STICKYNOTES_TRACE=/tmp/stickynotes-trace.json stickynotes
+
+records every span into a Chrome trace-format file, written at exit, that
+chrome://tracing and https://ui.perfetto.dev can open. Without the
+variable span() returns a shared no-op object and traced() leaves the
+function untouched.
+
+    STICKYNOTES_LOG=debug stickynotes
+
+sets the level of the 'stickynotes' loggers (default: warning).
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+TRACE_ENV = 'STICKYNOTES_TRACE'
+LOG_ENV = 'STICKYNOTES_LOG'
+
+TRACE_FILE = os.environ.get(TRACE_ENV)
+ENABLED = bool(TRACE_FILE)
+
+_events = []
+_thread_names = {}
+_epoch = time.perf_counter_ns()
+_pid = os.getpid()
+
+
+def setup_logging():
+    """Configures the 'stickynotes' loggers from STICKYNOTES_LOG"""
+    level_name = os.environ.get(LOG_ENV, 'warning').upper()
+    level = getattr(logging, level_name, None)
+    if not isinstance(level, int):
+        level = logging.WARNING
+    logger = logging.getLogger('stickynotes')
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(name)s %(levelname)s: %(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+def _now_us():
+    return (time.perf_counter_ns() - _epoch) / 1000
+
+
+def _tid():
+    tid = threading.get_ident()
+    if tid not in _thread_names:
+        _thread_names[tid] = threading.current_thread().name
+    return tid
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        # list.append is atomic, so the writer thread can trace too
+        _events.append({
+            'name': self.name, 'cat': 'stickynotes', 'ph': 'X',
+            'ts': self.start, 'dur': end - self.start,
+            'pid': _pid, 'tid': _tid(), 'args': self.args,
+        })
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+    """Context manager timing a block as a complete ('X') trace event"""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator wrapping every call of a function in a span"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instant(name, **args):
+    """Records a point-in-time event"""
+    if ENABLED:
+        _events.append({
+            'name': name, 'cat': 'stickynotes', 'ph': 'i', 's': 't',
+            'ts': _now_us(), 'pid': _pid, 'tid': _tid(), 'args': args,
+        })
+
+
+def write(path=None):
+    """Writes the recorded events as a Chrome trace JSON file"""
+    path = path or TRACE_FILE
+    if not path:
+        return
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': _pid, 'tid': tid,
+                 'args': {'name': thread_name}}
+                for tid, thread_name in list(_thread_names.items())]
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + list(_events), 'displayTimeUnit': 'ms'}, f)
+    except OSError as e:
+        logging.getLogger(__name__).error("Error writing trace %s: %s", path, e)
+
+
+if ENABLED:
+    atexit.register(write)
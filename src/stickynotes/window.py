@@ -21,10 +21,30 @@ import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 
-from gi.repository import Gtk, Adw, Gio, GLib, Gdk, Pango
-from .note import StickyNote
-import json
-from datetime import datetime
+from gi.repository import Gtk, Adw, Gio, GLib, GObject, Pango
+import logging
+
+from . import trace
+from .preview import PreviewCache, make_preview
+from .thumbnails import THUMBNAIL_SIZE
+from .events import NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED, BULK_RESET
+
+logger = logging.getLogger(__name__)
+
+# Note fields shown on a card or used to sort the grid
+CARD_FIELDS = frozenset(('title', 'content', 'color', 'timestamp'))
+
+
+class NoteItem(GObject.Object):
+    """List model item wrapping a NoteModel"""
+    __gtype_name__ = 'StickyNotesNoteItem'
+    
+    def __init__(self, note, position=None):
+        super().__init__()
+        self.note = note
+        # Index in the window's store, kept so changes need no lookup
+        self.position = position
+
 
 @Gtk.Template(resource_path='/org/gnome/StickyNotes/stickynotes/window.ui')
 class StickyNotesWindow(Adw.ApplicationWindow):
@@ -37,18 +57,20 @@ class StickyNotesWindow(Adw.ApplicationWindow):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         
-        self.notes = {}
-        self.note_previews = {}
+        # note id -> NoteItem in self.store
+        self.items = {}
+        # Note id -> rank of the notes matching the current search, best
+        # first, or None when not filtering
+        self.matches = None
+        # Idle source re-running the search after a batch of new notes
+        self.filter_source = None
+        # Title, snippet, date and color of every note shown so far
+        self.preview_cache = PreviewCache()
         
         self.setup_actions()
         self.setup_search()
-        
-        self.notes_grid.set_valign(Gtk.Align.START)
-        self.notes_grid.set_halign(Gtk.Align.FILL)
-        self.notes_grid.set_hexpand(True)
-        self.notes_grid.set_vexpand(True)
-        self.notes_grid.set_homogeneous(True)
-        self.notes_grid.set_selection_mode(Gtk.SelectionMode.NONE)
+        self.setup_grid()
+        self.setup_events()
         
         self.empty_state_box.set_valign(Gtk.Align.CENTER)
         self.empty_state_box.set_visible(True)
@@ -56,67 +78,101 @@ class StickyNotesWindow(Adw.ApplicationWindow):
         GLib.idle_add(self.load_notes)
         self.present()
 
+    def setup_grid(self):
+        """Builds the store -> filter -> sort -> GridView model chain.
+        
+        Only the cards in view exist; the factory rebinds them to other
+        items while scrolling instead of creating new ones. Filtering
+        comes first, so a search only sorts the notes it matched.
+        """
+        self.store = Gio.ListStore(item_type=NoteItem)
+        
+        self.filter = Gtk.CustomFilter.new(self.filter_note)
+        self.filter_model = Gtk.FilterListModel(model=self.store, filter=self.filter)
+        self.filter_model.connect('items-changed', self.on_visible_notes_changed)
+        
+        self.sorter = Gtk.CustomSorter.new(self.compare_notes)
+        self.sort_model = Gtk.SortListModel(model=self.filter_model, sorter=self.sorter)
+        
+        factory = Gtk.SignalListItemFactory()
+        factory.connect('setup', self.on_factory_setup)
+        factory.connect('bind', self.on_factory_bind)
+        factory.connect('unbind', self.on_factory_unbind)
+        
+        self.notes_grid.set_model(Gtk.NoSelection(model=self.sort_model))
+        self.notes_grid.set_factory(factory)
+        self.notes_grid.set_single_click_activate(True)
+        self.notes_grid.connect('activate', self.on_note_activated)
+
+    def setup_events(self):
+        events = self.get_application().events
+        events.connect(NOTE_ADDED, lambda event: self.add_note(event.note))
+        events.connect(NOTE_CHANGED, self.on_note_changed)
+        events.connect(NOTE_REMOVED, self.on_note_removed)
+        events.connect(BULK_RESET, lambda event: self.update_notes_grid())
+
+    def on_note_removed(self, event):
+        self.remove_note(event.note_id)
+        self.preview_cache.discard(event.note_id)
+
+    def on_note_changed(self, event):
+        # Window moves don't change the card
+        if event.touches(CARD_FIELDS):
+            self.update_note(event.note)
+
+    def on_factory_setup(self, factory, list_item):
+        with trace.span('preview_card'):
+            list_item.set_child(NotePreviewCard(self.preview_cache,
+                                                self.get_application().thumbnails))
+
+    def on_factory_bind(self, factory, list_item):
+        card = list_item.get_child()
+        with trace.span('card_bind'):
+            card.bind(list_item.get_item().note)
+        self.get_application().registry.add_preview(card.note_id, card)
+
+    def on_factory_unbind(self, factory, list_item):
+        card = list_item.get_child()
+        self.get_application().registry.remove_preview(card.note_id, card)
+        card.unbind()
+
+    def compare_notes(self, item_a, item_b, *user_data):
+        if self.matches is not None:
+            # Best ranked search result first
+            a = self.matches.get(item_a.note.id, len(self.matches))
+            b = self.matches.get(item_b.note.id, len(self.matches))
+            if a == b:
+                return Gtk.Ordering.EQUAL
+            return Gtk.Ordering.SMALLER if a < b else Gtk.Ordering.LARGER
+        # Most recently modified first
+        a = item_a.note.timestamp or ''
+        b = item_b.note.timestamp or ''
+        if a == b:
+            return Gtk.Ordering.EQUAL
+        return Gtk.Ordering.SMALLER if a > b else Gtk.Ordering.LARGER
+
+    def filter_note(self, item, *user_data):
+        return self.matches is None or item.note.id in self.matches
+
+    @trace.traced('grid_load_notes')
     def load_notes(self):
         app = self.get_application()
         if not app:
-            print("No application found")
+            logger.warning("No application found")
             return False
         
-        print("\n=== Loading notes in main window ===")
+        logger.debug("Loading notes in main window")
         
         stored_notes = app.notes
-        active_notes = app.get_notes()
-        
-        print(f"Found {len(stored_notes)} stored notes and {len(active_notes)} active notes")
-        
-        child = self.notes_grid.get_first_child()
-        while child:
-            next_child = child.get_next_sibling()
-            self.notes_grid.remove(child)
-            child = next_child
-        self.note_previews.clear()
-        self.notes.clear()
-        
-        processed_notes = {}
-        
-        for note_id, note in active_notes.items():
-            print(f"Processing active note: {note_id}")
-            processed_notes[note_id] = note
-            
-            preview = NotePreviewCard(note)
-            preview.connect('activate', self.on_note_preview_activated)
-            self.notes_grid.append(preview)
-            self.note_previews[note_id] = preview
-            self.notes[note_id] = note
-        
-        for note_id, note_data in stored_notes.items():
-            if note_id not in processed_notes:
-                print(f"Processing stored note: {note_id}")
-                note = StickyNote(app, note_data)
-                note.set_visible(False)
-                
-                preview = NotePreviewCard(note)
-                preview.connect('activate', self.on_note_preview_activated)
-                self.notes_grid.append(preview)
-                self.note_previews[note_id] = preview
-                self.notes[note_id] = note
-        
-        notes_exist = bool(self.notes)
-        print(f"Notes exist: {notes_exist}")
-        
-        self.empty_state_box.set_visible(not notes_exist)
-        self.notes_grid.get_parent().set_visible(notes_exist)
-        self.notes_grid.set_visible(notes_exist)
-        
-        if notes_exist:
-            print("Making sure all previews are visible")
-            self.notes_grid.show()
-            child = self.notes_grid.get_first_child()
-            while child:
-                child.set_visible(True)
-                child.show()
-                child = child.get_next_sibling()
         
+        logger.debug("Found %d stored notes", len(stored_notes))
+        
+        # Replace the whole store in a single items-changed emission
+        self.items = {note_id: NoteItem(note, position)
+                      for position, (note_id, note) in enumerate(stored_notes.items())}
+        self.store.splice(0, self.store.get_n_items(), list(self.items.values()))
+        
+        self.update_empty_state()
         self.debug_grid_state()
         return False
 
@@ -136,191 +192,162 @@ class StickyNotesWindow(Adw.ApplicationWindow):
         search_text = search_entry.get_text().lower()
         self.filter_notes(search_text)
 
+    @trace.traced('filter_notes')
     def filter_notes(self, search_text):
-        has_visible_notes = False
-        
+        if self.filter_source is not None:
+            GLib.source_remove(self.filter_source)
+            self.filter_source = None
         if not search_text:
-            for preview in self.note_previews.values():
-                preview.set_visible(True)
-                has_visible_notes = True
+            self.matches = None
         else:
-            for note_id, note in self.notes.items():
-                if note_id in self.note_previews:
-                    preview = self.note_previews[note_id]
-                    note_data = note.save_note()
-                    content = note_data.get('content', '').lower()
-                    
-                    visible = search_text in content
-                    preview.set_visible(visible)
-                    if visible:
-                        has_visible_notes = True
-        
+            # The app-wide index answers and ranks the query; the filter
+            # model only checks membership, the sorter looks up ranks, and
+            # only cards in view get rebound
+            app = self.get_application()
+            ranked = app.search_index.search(search_text, limit=None)
+            self.matches = {note_id: rank for rank, note_id in enumerate(ranked)}
+        self.filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.sorter.changed(Gtk.SorterChange.DIFFERENT)
+
+    def queue_filter(self):
+        """Re-runs the search once, after the current batch of changes"""
+        if self.filter_source is None:
+            self.filter_source = GLib.idle_add(self.on_filter_idle)
+
+    def on_filter_idle(self):
+        self.filter_source = None
+        self.filter_notes(self.search_entry.get_text().lower())
+        return GLib.SOURCE_REMOVE
+
+    def on_visible_notes_changed(self, model, position, removed, added):
+        self.update_empty_state()
+
+    def update_empty_state(self):
+        has_visible_notes = self.filter_model.get_n_items() > 0
         self.empty_state_box.set_visible(not has_visible_notes)
         self.notes_grid.set_visible(has_visible_notes)
 
     def update_notes_grid(self):
+        """Re-syncs the whole grid with app.notes, for bulk resets"""
         app = self.get_application()
         if not app:
-            print("No application found")
+            logger.warning("No application found")
             return False
         
-        print("Updating notes grid")
+        logger.debug("Updating notes grid")
         
-        active_notes = app.get_notes()
         stored_notes = app.notes
         
-        notes_to_remove = []
-        for note_id in self.note_previews:
-            if note_id not in stored_notes and note_id not in active_notes:
-                notes_to_remove.append(note_id)
-        
+        notes_to_remove = [note_id for note_id in self.items if note_id not in stored_notes]
         for note_id in notes_to_remove:
-            preview = self.note_previews[note_id]
-            if preview.get_parent():
-                self.notes_grid.remove(preview)
-            del self.note_previews[note_id]
-            if note_id in self.notes:
-                del self.notes[note_id]
-            print(f"Removed note {note_id} from grid")
-        
-        for note_id, note_data in stored_notes.items():
-            if note_id in active_notes:
-                note = active_notes[note_id]
-            else:
-                note = StickyNote(app, note_data)
-            
-            self.notes[note_id] = note
-            
-            if note_id in self.note_previews:
-                note_data = note.save_note()
-                self.note_previews[note_id].update_preview(note_data)
-                print(f"Updated preview for note {note_id}")
+            self.remove_note(note_id)
+            logger.debug("Removed note %s from grid", note_id)
+        
+        for note_id, note in stored_notes.items():
+            if note_id in self.items:
+                self.update_note(note)
             else:
-                preview = NotePreviewCard(note)
-                preview.connect('activate', self.on_note_preview_activated)
-                preview.set_visible(True)
-                self.notes_grid.append(preview)
-                self.note_previews[note_id] = preview
-                print(f"Added new preview for note {note_id}")
-        
-        if self.notes:
-            self.empty_state_box.set_visible(False)
-            self.notes_grid.set_visible(True)
-            child = self.notes_grid.get_first_child()
-            while child:
-                child.show()
-                child = child.get_next_sibling()
-        else:
-            self.empty_state_box.set_visible(True)
-            self.notes_grid.set_visible(False)
+                self.add_note(note)
+                logger.debug("Added new preview for note %s", note_id)
         
         if self.search_entry.get_text():
             self.filter_notes(self.search_entry.get_text().lower())
         
         return False
 
-    def on_note_preview_activated(self, preview):
-        note_id = preview.note_id
-        if note_id in self.notes:
-            note = self.notes[note_id]
-            note.present()
-            print(f"Presenting note {note_id}")
+    def on_note_activated(self, grid_view, position):
+        item = self.sort_model.get_item(position)
+        if item is not None:
+            # The note window is created on first use
+            self.get_application().present_note(item.note.id)
+            logger.debug("Presenting note %s", item.note.id)
 
     def add_note(self, note):
-        # Agregar la nota al diccionario de notas
-        self.notes[note.note_id] = note
+        item = self.items.get(note.id)
+        if item is not None:
+            self.update_note(note)
+            return
         
-        # Crear y agregar el preview
-        preview = NotePreviewCard(note)
-        preview.connect('activate', self.on_note_preview_activated)
-        preview.set_visible(True)
-        self.notes_grid.append(preview)
-        self.note_previews[note.note_id] = preview
+        item = NoteItem(note, self.store.get_n_items())
+        self.items[note.id] = item
+        self.store.append(item)
         
-        # Actualizar visibilidad
-        self.empty_state_box.set_visible(False)
-        self.notes_grid.set_visible(True)
-        
-        # Si hay texto en la búsqueda, aplicar el filtro
+        # Si hay texto en la búsqueda, aplicar el filtro (una vez por lote)
         if self.search_entry.get_text():
-            self.filter_notes(self.search_entry.get_text().lower())
+            self.queue_filter()
+
+    def update_note(self, note):
+        """Refreshes the card of a changed note and its sort position"""
+        item = self.items.get(note.id)
+        if item is None:
+            return
+        item.note = note
+        # Sort and filter models re-evaluate just this item
+        self.store.items_changed(item.position, 1, 1)
+        # The edit may make the note match the search or stop matching it,
+        # and move it in the ranking
+        if self.search_entry.get_text():
+            self.queue_filter()
+
+    def remove_note(self, note_id):
+        item = self.items.pop(note_id, None)
+        if item is None:
+            return
+        # The sort model orders the grid, so the last item can take the
+        # free slot instead of shifting every position after it
+        last = self.store.get_n_items() - 1
+        if item.position != last:
+            moved = self.store.get_item(last)
+            moved.position = item.position
+            self.store.splice(item.position, 1, [moved])
+        self.store.remove(last)
 
     def on_new_note(self, action, parameter):
-        app = self.get_application()
-        note = app.create_new_note()
-        if note:
-            self.add_note(note)
+        # The app adds the preview to the grid itself
+        self.get_application().create_new_note()
 
     def on_toggle_window(self, action, parameter):
         if self.is_visible():
             self.hide()
         else:
-            self.update_notes_grid()
             self.present()
 
     def debug_grid_state(self):
-        print("\nGrid State Debug:")
-        print(f"Grid visible: {self.notes_grid.get_visible()}")
-        print(f"Empty state visible: {self.empty_state_box.get_visible()}")
-        print(f"Number of notes: {len(self.notes)}")
-        print(f"Number of previews: {len(self.note_previews)}")
-        print("Grid children:")
-        child = self.notes_grid.get_first_child()
-        while child:
-            print(f"  - Child visible: {child.get_visible()}")
-            child = child.get_next_sibling()
-
-class NotePreviewCard(Gtk.FlowBoxChild):
-    _base_css_applied = False
-    _color_styles = {
-        'yellow': '#ffeb3b',
-        'pink': '#f8d7da',
-        'blue': '#cce5ff',
-        'green': '#d1ecf1',
-        'orange': '#ffe8cc',
-        'purple': '#e2d5f1'
-    }
-    
-    def __init__(self, note):
-        Gtk.FlowBoxChild.__init__(self)
-        self.note = note
-        self.note_id = note.note_id
-        
-        # Si los estilos base no se han aplicado aún
-        if not NotePreviewCard._base_css_applied:
-            self.load_css()
-            NotePreviewCard._base_css_applied = True
-        
-        self.set_visible(True)
-        self.set_can_focus(True)
+        logger.debug("Grid State Debug:")
+        logger.debug("Grid visible: %s", self.notes_grid.get_visible())
+        logger.debug("Empty state visible: %s", self.empty_state_box.get_visible())
+        logger.debug("Number of notes: %d", self.store.get_n_items())
+        logger.debug("Visible notes: %d", self.filter_model.get_n_items())
+
+class NotePreviewCard(Gtk.Box):
+    """Card showing a note in the grid; recycled between notes by the factory"""
+    def __init__(self, cache=None, thumbnails=None):
+        Gtk.Box.__init__(self)
+        self.note = None
+        self.note_id = None
+        # Shared PreviewCache and the Preview currently on the widgets
+        self.cache = cache
+        self.shown = None
+        # Shared ThumbnailLoader; the image shown (or loading) and its ticket
+        self.thumbnails = thumbnails
+        self.image = None
+        self.thumbnail_ticket = None
         
         self.setup_ui()
         
-        self.update_from_note(note)
-        
-        click = Gtk.GestureClick.new()
-        click.connect('pressed', self.on_click_pressed)
-        self.add_controller(click)
-        
-        self.show()
-        
-    def load_css(self):
-        """Cargar estilos CSS desde el archivo"""
-        try:
-            css_provider = Gtk.CssProvider()
-            css_file = Gio.File.new_for_path('/home/kooke/Proyectos/stickynotes/src/stickynotes/css/preview.css')
-            css_provider.load_from_file(css_file)
-            Gtk.StyleContext.add_provider_for_display(
-                Gdk.Display.get_default(),
-                css_provider,
-                Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-            )
-            print("Preview CSS loaded successfully")
-        except Exception as e:
-            print(f"Error loading preview CSS: {e}")
+    def bind(self, note):
+        self.note = note
+        self.note_id = note.id
+        self.update_preview(note)
 
-    def on_click_pressed(self, gesture, n_press, x, y):
-        self.activate()
+    def unbind(self):
+        self.note = None
+        self.note_id = None
+        if self.thumbnail_ticket is not None:
+            # Scrolled away before the thumbnail arrived
+            self.thumbnails.cancel(self.thumbnail_ticket)
+            self.thumbnail_ticket = None
+            self.image = None
 
     def setup_ui(self):
         self.card = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -370,10 +397,7 @@ class NotePreviewCard(Gtk.FlowBoxChild):
         self.title_box.append(self.header_box)
         self.title_box.append(self.color_indicator)
         
-        scrolled = Gtk.ScrolledWindow()
-        scrolled.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
-        scrolled.set_vexpand(True)
-        
+        # The label is ellipsized to a few lines, so it needs no scrolling
         self.content_label = Gtk.Label()
         self.content_label.set_halign(Gtk.Align.START)
         self.content_label.set_valign(Gtk.Align.START)
@@ -390,12 +414,22 @@ class NotePreviewCard(Gtk.FlowBoxChild):
         self.content_label.set_xalign(0)
         self.content_label.set_yalign(0)
         
-        scrolled.set_child(self.content_label)
+        # Miniatura de la primera imagen, si la nota tiene alguna
+        self.thumbnail = Gtk.Picture()
+        self.thumbnail.set_content_fit(Gtk.ContentFit.COVER)
+        self.thumbnail.set_can_shrink(True)
+        self.thumbnail.set_size_request(-1, 96)
+        self.thumbnail.set_margin_start(8)
+        self.thumbnail.set_margin_end(8)
+        self.thumbnail.set_margin_bottom(4)
+        self.thumbnail.add_css_class('thumbnail')
+        self.thumbnail.set_visible(False)
         
         self.card.append(self.title_box)
-        self.card.append(scrolled)
+        self.card.append(self.thumbnail)
+        self.card.append(self.content_label)
         
-        self.set_child(self.card)
+        self.append(self.card)
         
         self.card.set_visible(True)
         self.title_box.set_visible(True)
@@ -407,79 +441,50 @@ class NotePreviewCard(Gtk.FlowBoxChild):
         # This method is now a no-op since CSS is loaded from file
         pass
 
-    def update_preview(self, note_data):
-        """Update the preview card with the given note data"""
-        title = note_data.get('title', '')
-        content = note_data.get('content', '')
-        color = note_data.get('color', 'yellow')
-        timestamp = note_data.get('timestamp')
-        
-        # Actualizar título
-        if title and isinstance(title, str) and title.strip():
-            self.title_label.set_text(title)
-            self.title_label.set_visible(True)
-        else:
-            lines = content.strip().split('\n')
-            if lines and lines[0].strip():
-                self.title_label.set_text(lines[0].strip())
-            else:
-                self.title_label.set_text("Nota sin título")
-            self.title_label.set_visible(True)
-        
-        # Actualizar fecha (siempre visible)
-        if timestamp:
-            try:
-                dt = datetime.fromisoformat(timestamp)
-                date_str = dt.strftime("%d/%m/%Y")
-                self.date_label.set_text(date_str)
-            except:
-                self.date_label.set_text("")
-        else:
-            self.date_label.set_text("")
-        
-        # Actualizar contenido
-        if content:
-            preview_lines = content.split('\n')[1:6] if title else content.split('\n')[:6]
-            preview_text = '\n'.join(preview_lines)
-            if len(preview_text) > 150:
-                preview_text = preview_text[:147] + '...'
-            self.content_label.set_text(preview_text)
-        else:
-            self.content_label.set_text("(Nota vacía)")
-        
-        # Actualizar color
-        for c in self._color_styles.keys():
-            self.color_indicator.remove_css_class(c)
-        self.color_indicator.add_css_class('color-indicator')
-        self.color_indicator.add_css_class(color)
-        
-        # Mostrar todos los widgets
-        self.show()
-        self.card.show()
-        self.title_box.show()
-        self.header_box.show()
-        self.title_label.show()
-        self.date_label.show()
-        self.content_label.show()
-        self.color_indicator.show()
-
-    def update_from_note(self, note):
-        """Update preview directly from note state without calling save_note()
-        This prevents infinite recursion between update_from_note and save_note"""
-        buffer = note.text_view.get_buffer()
-        content = buffer.get_text(
-            buffer.get_start_iter(),
-            buffer.get_end_iter(),
-            False
-        )
-        
-        note_data = {
-            'id': note.note_id,
-            'title': note.title if hasattr(note, 'title') and note.title else '',
-            'content': content,
-            'color': note.color,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Directly call update_preview with the data to avoid calling save_note()
-        self.update_preview(note_data)
+    def update_preview(self, note):
+        """Update the preview card from a NoteModel"""
+        preview = self.cache.get(note) if self.cache else make_preview(note)
+        if preview.image != self.image:
+            self.show_thumbnail(preview.image)
+        shown = self.shown
+        if preview == shown:
+            # Nothing visible changed
+            return
+        
+        # Actualizar solo lo que cambió
+        if shown is None or preview.title != shown.title:
+            self.title_label.set_text(preview.title)
+        if shown is None or preview.date != shown.date:
+            self.date_label.set_text(preview.date)
+        if shown is None or preview.snippet != shown.snippet:
+            self.content_label.set_text(preview.snippet)
+        if shown is None or preview.color != shown.color:
+            if shown is not None:
+                self.color_indicator.remove_css_class(shown.color)
+            self.color_indicator.add_css_class(preview.color)
+        self.shown = preview
+
+    def show_thumbnail(self, digest):
+        """Shows a placeholder for the image and requests its thumbnail"""
+        if self.thumbnail_ticket is not None:
+            self.thumbnails.cancel(self.thumbnail_ticket)
+            self.thumbnail_ticket = None
+        self.image = digest
+        if not digest or self.thumbnails is None:
+            self.thumbnail.set_paintable(None)
+            self.thumbnail.set_visible(False)
+            return
+        
+        self.thumbnail.set_paintable(None)
+        self.thumbnail.add_css_class('placeholder')
+        self.thumbnail.set_visible(True)
+        size = THUMBNAIL_SIZE * self.get_scale_factor()
+        self.thumbnail_ticket = self.thumbnails.request(
+            digest, size, lambda texture: self.on_thumbnail_ready(digest, texture))
+
+    def on_thumbnail_ready(self, digest, texture):
+        if digest != self.image:
+            return
+        self.thumbnail_ticket = None
+        self.thumbnail.set_paintable(texture)
+        self.thumbnail.remove_css_class('placeholder')
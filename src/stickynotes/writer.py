@@ -0,0 +1,407 @@
+# writer.py
+#
+# Copyright 2025 jorge gonzalez m
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import threading
+import time
+
+from . import trace
+from .edits import apply_edit
+
+logger = logging.getLogger(__name__)
+
+# Marker stored in the dirty set for notes that must be deleted
+_DELETED = object()
+
+
+class _Move:
+    """Dirty set entry for a note whose position is the only change"""
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class _Edits:
+    """Dirty set entry for content edits of a note, written in order.
+
+    Edits are kept as separate records rather than merged, so that a batch
+    that is retried after a failure rewrites exactly the same records.
+    """
+    __slots__ = ('edits', 'move')
+
+    def __init__(self, edits, move=None):
+        self.edits = edits
+        # Position to apply after the edits, from a later drag
+        self.move = move
+
+
+class PersistenceWriter:
+    """Writes note changes to storage from a dedicated thread.
+
+    The main loop only records changes in a dirty set keyed by note id, so
+    repeated saves of the same note collapse into one. The writer thread
+    drains the whole set at once and hands it to the storage engine as a
+    single batch.
+    """
+
+    def __init__(self, storage, batch_delay=0.05, retry_delay=1.0, history=None,
+                 max_retry_delay=30.0, stop_attempts=3):
+        self.storage = storage
+        # Optional HistoryStore that gets a revision of every saved note
+        self.history = history
+        # Short pause before draining so that bursts land in one batch
+        self.batch_delay = batch_delay
+        # A failing batch is retried with exponential backoff, and given up
+        # after stop_attempts failures once the writer is stopping
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stop_attempts = stop_attempts
+
+        self._dirty = {}
+        # note id -> (content, time) of revisions for the history
+        self._revisions = {}
+        # note id -> monotonic time its last revision was recorded; a note
+        # gets at most one revision per history.min_interval, however often
+        # it is autosaved, and the newest pending content wins
+        self._history_times = {}
+        # flush() calls waiting, which write held revisions right away
+        self._flushing = 0
+        # Callback of a pending request_reload()
+        self._reload = None
+        # Callbacks of after_written(), run once the changes before them are stored
+        self._after_written = []
+        self._writing = False
+        self._stopping = False
+        self._stopped = False
+        # Consecutive failed batches, and how many of them since stop()
+        self._failures = 0
+        self._stop_failures = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='note-writer', daemon=True)
+
+        # Contadores para instrumentación
+        self.changes_enqueued = 0
+        self.batches_written = 0
+        self.notes_written = 0
+        self.errors = 0
+
+    def start(self):
+        self._thread.start()
+
+    def enqueue_save(self, note_data):
+        self._enqueue(note_data['id'], note_data)
+
+    def enqueue_delete(self, note_id):
+        self._enqueue(note_id, _DELETED)
+
+    def enqueue_move(self, note_id, x, y):
+        """Records a position-only change, folded into any pending save"""
+        with self._condition:
+            change = self._dirty.get(note_id)
+            if change is _DELETED:
+                return
+            if isinstance(change, dict):
+                # The pending snapshot belongs to the writer: just move it
+                change['x'] = x
+                change['y'] = y
+            elif isinstance(change, _Edits):
+                change.move = (x, y)
+            else:
+                self._dirty[note_id] = _Move(x, y)
+            self.changes_enqueued += 1
+            self._condition.notify_all()
+
+    def enqueue_edit(self, note_id, edit):
+        """Records a content edit (see edits.py), folded into any pending save"""
+        with self._condition:
+            change = self._dirty.get(note_id)
+            if change is _DELETED:
+                return
+            if isinstance(change, dict):
+                self._dirty[note_id] = apply_edit(change, edit)
+            elif isinstance(change, _Edits):
+                change.edits.append(edit)
+                # The edit carries the current position already
+                change.move = None
+            else:
+                self._dirty[note_id] = _Edits([edit])
+            self.changes_enqueued += 1
+            self._condition.notify_all()
+
+    def enqueue_revision(self, note_id, content):
+        """Records content as a history revision of the note.
+
+        It is written with the next batch, or held until history.min_interval
+        has passed since the note's previous revision.
+        """
+        if self.history is None:
+            return
+        with self._condition:
+            self._revisions[note_id] = (content, time.time())
+            self._condition.notify_all()
+
+    def request_reload(self, callback):
+        """Re-reads the store on the writer thread, before the next batch.
+
+        callback(changed, removed, pending) runs on the writer thread with
+        the notes whose stored data changed, the ids of the notes that are
+        gone, and the ids of notes about to be overwritten by this batch.
+        """
+        with self._condition:
+            self._reload = callback
+            self._condition.notify_all()
+
+    def after_written(self, callback):
+        """Calls callback() on the writer thread once every change enqueued so far is written.
+
+        It is not called if those changes are never written (the writer
+        gives up on them when stopping).
+        """
+        with self._condition:
+            self._after_written.append(callback)
+            self._condition.notify_all()
+
+    def has_pending(self, note_id):
+        """True if a change to the note has not been written yet"""
+        with self._condition:
+            return note_id in self._dirty
+
+    def _enqueue(self, note_id, change):
+        with self._condition:
+            self._dirty[note_id] = change
+            self.changes_enqueued += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until every enqueued change is on disk; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._dirty or self._revisions or self._writing:
+                    if self._stopped or not self._thread.is_alive():
+                        return False
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def stop(self, timeout=None):
+        """Flushes pending changes and stops the writer thread.
+
+        Returns False if changes were left unsaved, either because of the
+        timeout or because the store kept failing.
+        """
+        with self._condition:
+            # The writer drains the dirty set before it exits
+            self._stopping = True
+            self._condition.notify_all()
+        flushed = self.flush(timeout)
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    due, wait = self._due_revisions()
+                    if (self._dirty or due or self._reload or self._after_written
+                            or self._stopping):
+                        break
+                    self._condition.wait(wait)
+                if self._stopping and not self._dirty and not self._revisions and not self._after_written:
+                    self._stopped = True
+                    self._condition.notify_all()
+                    return
+
+            if self.batch_delay:
+                time.sleep(self.batch_delay)
+
+            with self._condition:
+                batch, self._dirty = self._dirty, {}
+                for note_id, change in batch.items():
+                    if change is _DELETED:
+                        # Its history is about to go
+                        self._revisions.pop(note_id, None)
+                        self._history_times.pop(note_id, None)
+                due, _ = self._due_revisions()
+                revisions = {note_id: self._revisions.pop(note_id) for note_id in due}
+                reload, self._reload = self._reload, None
+                written, self._after_written = self._after_written, []
+                self._writing = True
+
+            if reload is not None:
+                self._reload_storage(reload, batch)
+
+            saves = []
+            deletions = []
+            moves = []
+            edits = []
+            for note_id, change in batch.items():
+                if change is _DELETED:
+                    deletions.append(note_id)
+                elif isinstance(change, _Move):
+                    moves.append((note_id, change.x, change.y))
+                elif isinstance(change, _Edits):
+                    edits.extend((note_id, edit) for edit in change.edits)
+                    if change.move:
+                        moves.append((note_id,) + change.move)
+                else:
+                    saves.append(change)
+            failed = False
+            # A reload or history revisions alone do not rewrite the store
+            if batch:
+                try:
+                    with trace.span('write_batch', saves=len(saves), deletions=len(deletions),
+                                    moves=len(moves), edits=len(edits)):
+                        self.storage.write_batch(saves, deletions, moves, edits)
+                    self.batches_written += 1
+                    self.notes_written += len(batch)
+                    self._failures = 0
+                except Exception as e:
+                    failed = True
+                    self.errors += 1
+                    logger.error("Error guardando datos: %s", e)
+
+            if self.history is not None and (revisions or (deletions and not failed)):
+                self._write_history(revisions, [] if failed else deletions)
+
+            with self._condition:
+                if failed:
+                    # Put the batch back unless newer changes superseded it
+                    for note_id, change in batch.items():
+                        newer = self._dirty.get(note_id)
+                        if newer is None:
+                            self._dirty[note_id] = change
+                        elif isinstance(newer, _Move) and isinstance(change, dict):
+                            # A later move does not replace an unsaved note
+                            change['x'] = newer.x
+                            change['y'] = newer.y
+                            self._dirty[note_id] = change
+                        elif isinstance(newer, _Move) and isinstance(change, _Edits):
+                            change.move = (newer.x, newer.y)
+                            self._dirty[note_id] = change
+                        elif isinstance(newer, _Edits) and isinstance(change, dict):
+                            # Later edits apply on top of the unsaved note
+                            for edit in newer.edits:
+                                change = apply_edit(change, edit)
+                            if newer.move:
+                                change = dict(change, x=newer.move[0], y=newer.move[1])
+                            self._dirty[note_id] = change
+                        elif isinstance(newer, _Edits) and isinstance(change, _Edits):
+                            self._dirty[note_id] = _Edits(change.edits + newer.edits, newer.move)
+                    # Their changes are not stored yet
+                    self._after_written[:0] = written
+                self._writing = False
+                self._condition.notify_all()
+
+            if not failed:
+                for callback in written:
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.error("Error tras guardar datos: %s", e)
+
+            if failed and not self._retry_after_failure():
+                return
+
+    def _due_revisions(self):
+        """Returns the ids of the revisions to write now, and how long until the next one is due.
+
+        Called with self._condition held.
+        """
+        interval = self.history.min_interval if self.history is not None else 0
+        if not interval or self._stopping or self._flushing:
+            return list(self._revisions), None
+        now = time.monotonic()
+        due = []
+        wait = None
+        for note_id in self._revisions:
+            last = self._history_times.get(note_id)
+            remaining = 0 if last is None else last + interval - now
+            if remaining <= 0:
+                due.append(note_id)
+            elif wait is None or remaining < wait:
+                wait = remaining
+        return due, wait
+
+    def _retry_after_failure(self):
+        """Waits before retrying a failed batch; returns False when giving up"""
+        self._failures += 1
+        with self._condition:
+            if self._stopping:
+                self._stop_failures += 1
+                if self._stop_failures >= self.stop_attempts:
+                    logger.error("Abandonando %d cambios sin guardar tras %d intentos",
+                                 len(self._dirty), self._stop_failures)
+                    self._stopped = True
+                    self._condition.notify_all()
+                    return False
+                attempts = self._stop_failures
+            else:
+                attempts = self._failures
+            delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+            # stop() cuts the wait short so shutdown gets its own attempts
+            stopping = self._stopping
+            self._condition.wait_for(lambda: self._stopping != stopping, delay)
+        return True
+
+    def _reload_storage(self, callback, batch):
+        try:
+            with trace.span('reload_storage'):
+                changed, removed = self.storage.reload()
+        except Exception as e:
+            logger.error("Error recargando datos: %s", e)
+            return
+        if changed or removed:
+            callback(changed, removed, frozenset(batch))
+
+    def _write_history(self, revisions, deletions):
+        # History is best effort: an error here never blocks saving notes
+        with trace.span('write_history', revisions=len(revisions)):
+            for note_id, (content, when) in revisions.items():
+                self._history_times[note_id] = time.monotonic()
+                try:
+                    self.history.record(note_id, content, when)
+                except Exception as e:
+                    logger.error("Error guardando historial de %s: %s", note_id, e)
+            for note_id in deletions:
+                try:
+                    self.history.remove(note_id)
+                except OSError as e:
+                    logger.error("Error borrando historial de %s: %s", note_id, e)
+
+    def get_stats(self):
+        """Returns the writer counters"""
+        with self._condition:
+            pending = len(self._dirty)
+        return {
+            'enqueued': self.changes_enqueued,
+            'batches': self.batches_written,
+            'written': self.notes_written,
+            'pending': pending,
+            'errors': self.errors,
+        }
@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import heapq
+import itertools
+
+from stickynotes.autosave import AutosaveScheduler
+
+
+class FakeLoop:
+    """Main loop stand-in with a clock that only moves when told to"""
+
+    SOURCE_REMOVE = False
+
+    def __init__(self):
+        self.now = 0  # microseconds, like GLib.get_monotonic_time()
+        self._timeouts = []
+        self._ids = itertools.count(1)
+        self._removed = set()
+
+    def get_monotonic_time(self):
+        return self.now
+
+    def timeout_add(self, interval, callback, *args):
+        source_id = next(self._ids)
+        heapq.heappush(self._timeouts, (self.now + interval * 1000, source_id, callback, args))
+        return source_id
+
+    def source_remove(self, source_id):
+        self._removed.add(source_id)
+
+    def advance(self, ms):
+        """Moves the clock forward, running the timeouts that fall due on the way"""
+        end = self.now + ms * 1000
+        while self._timeouts and self._timeouts[0][0] <= end:
+            due, source_id, callback, args = heapq.heappop(self._timeouts)
+            if source_id in self._removed:
+                continue
+            self.now = due
+            if callback(*args):
+                self.timeout_add((due - self.now) // 1000, callback, *args)
+        self.now = end
+
+    def live_timeouts(self):
+        return sum(1 for entry in self._timeouts if entry[1] not in self._removed)
+
+
+def replay(scheduler, loop, note_id, keystrokes, gap_ms, saves):
+    for _ in range(keystrokes):
+        scheduler.schedule(note_id, lambda: saves.append(loop.now))
+        loop.advance(gap_ms)
+
+
+def test_burst_of_keystrokes_is_saved_once():
+    loop = FakeLoop()
+    scheduler = AutosaveScheduler(interval=1000, max_latency=5000, loop=loop)
+    saves = []
+
+    # 40 keystrokes 100 ms apart: always inside the quiet period, and
+    # shorter than the ceiling
+    replay(scheduler, loop, 'a', 40, 100, saves)
+    assert saves == []
+    assert loop.live_timeouts() == 1
+
+    loop.advance(1000)
+    stats = scheduler.get_stats()
+    assert stats == {'requested': 40, 'performed': 1, 'pending': 0}
+    # One quiet period after the last keystroke
+    assert saves == [(4000 + 1000) * 1000 - 100 * 1000]
+
+
+def test_continuous_typing_is_saved_every_max_latency():
+    loop = FakeLoop()
+    scheduler = AutosaveScheduler(interval=1000, max_latency=5000, loop=loop)
+    saves = []
+
+    # 20 seconds of typing, a keystroke every 200 ms
+    replay(scheduler, loop, 'a', 100, 200, saves)
+    loop.advance(1000)
+
+    assert scheduler.saves_requested == 100
+    # The ceiling cuts in every 5 seconds; the last one covers the end
+    assert saves == [5000 * 1000, 10000 * 1000, 15000 * 1000, 20000 * 1000]
+    assert scheduler.saves_performed == 4
+
+
+def test_notes_are_coalesced_separately():
+    loop = FakeLoop()
+    scheduler = AutosaveScheduler(interval=1000, max_latency=5000, loop=loop)
+    saved = []
+    for _ in range(10):
+        scheduler.schedule('a', lambda: saved.append('a'))
+        scheduler.schedule('b', lambda: saved.append('b'))
+        loop.advance(50)
+    assert loop.live_timeouts() == 2
+
+    loop.advance(2000)
+    assert sorted(saved) == ['a', 'b']
+    assert scheduler.get_stats() == {'requested': 20, 'performed': 2, 'pending': 0}
+
+
+def test_flush_and_cancel():
+    loop = FakeLoop()
+    scheduler = AutosaveScheduler(interval=1000, max_latency=5000, loop=loop)
+    saved = []
+    scheduler.schedule('a', lambda: saved.append('a'))
+    scheduler.schedule('b', lambda: saved.append('b'))
+
+    scheduler.flush('a')
+    scheduler.cancel('b')
+    assert saved == ['a']
+    assert not scheduler.has_pending('a') and not scheduler.has_pending('b')
+    assert loop.live_timeouts() == 0
+
+    loop.advance(10000)
+    assert saved == ['a']
+
+    scheduler.schedule('c', lambda: saved.append('c'))
+    scheduler.flush_all()
+    assert saved == ['a', 'c']
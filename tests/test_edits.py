@@ -0,0 +1,125 @@
+import random
+import time
+
+from stickynotes import edits
+from stickynotes.edits import DELTA_MIN_CHARS, EditLog, apply_ops
+from stickynotes.journal import JournalStorage
+from stickynotes.storage import FSYNC_NEVER
+from stickynotes.writer import PersistenceWriter
+
+
+class Editor:
+    """A note window without the window: a text buffer, its EditLog and save_note()"""
+
+    def __init__(self, writer, text):
+        self.writer = writer
+        self.text = text
+        self.saved = text
+        self.revision = 1
+        self.edit_log = EditLog()
+        self.deltas = 0
+        self.checkpoints = 0
+        writer.enqueue_save(self.note_data())
+
+    def note_data(self):
+        return {'id': 'a', 'title': 'a', 'content': self.saved, 'color': 'yellow',
+                'x': 0, 'y': 0, 'timestamp': '2025-01-01T00:00:00', 'revision': self.revision}
+
+    def insert(self, offset, text):
+        self.edit_log.insert(offset, text)
+        self.text = self.text[:offset] + text + self.text[offset:]
+
+    def delete(self, offset, length):
+        self.edit_log.delete(offset, length)
+        self.text = self.text[:offset] + self.text[offset + length:]
+
+    def save(self):
+        ops = self.edit_log.take()
+        content = apply_ops(self.saved, ops)
+        assert content == self.text
+        if content == self.saved:
+            return
+        self.saved = content
+        self.revision += 1
+        if self.edit_log.wants_delta(len(content), ops):
+            fields = self.note_data()
+            del fields['content']
+            self.writer.enqueue_edit('a', {'base': self.revision - 1, 'rev': self.revision,
+                                           'ops': ops, 'fields': fields})
+            self.edit_log.saved(ops)
+            self.deltas += 1
+        else:
+            self.writer.enqueue_save(self.note_data())
+            self.edit_log.checkpoint()
+            self.checkpoints += 1
+
+
+def random_edits(editor, rng, count):
+    """Bursts of typing and backspacing at random spots, with the odd delete-key run"""
+    for _ in range(count):
+        offset = rng.randrange(len(editor.text) + 1)
+        kind = rng.random()
+        for _ in range(rng.randrange(1, 12)):
+            if kind < 0.6:
+                editor.insert(offset, rng.choice('abc ñé\n'))
+                offset += 1
+            elif kind < 0.85 and offset > 0:
+                offset -= 1
+                editor.delete(offset, 1)
+            elif offset < len(editor.text):
+                editor.delete(offset, rng.randrange(1, 4) if offset + 3 < len(editor.text) else 1)
+        if rng.random() < 0.3:
+            editor.save()
+
+
+def open_store(tmp_path):
+    storage = JournalStorage(str(tmp_path / 'sticky-notes.json'), fsync_policy=FSYNC_NEVER,
+                             max_journal_bytes=1 << 30, max_journal_ratio=100)
+    return storage, storage.load()
+
+
+def test_adjacent_edits_coalesce():
+    log = EditLog()
+    for offset, char in enumerate('hola', 10):
+        log.insert(offset, char)
+    # Backspacing over what was just typed
+    log.delete(13, 1)
+    assert log.ops == [[10, 'hol']]
+    log.delete(3, 1)
+    log.delete(2, 1)
+    log.delete(2, 2)
+    assert log.take() == [[10, 'hol'], [2, 4]]
+    assert log.ops == []
+
+
+def test_random_edits_survive_the_journal(tmp_path, monkeypatch):
+    # A full save every 20 deltas, so both kinds land before and after compaction
+    monkeypatch.setattr(edits, 'CHECKPOINT_EDITS', 20)
+    rng = random.Random(17)
+    storage, _ = open_store(tmp_path)
+    writer = PersistenceWriter(storage, batch_delay=0)
+    writer.start()
+    editor = Editor(writer, ''.join(rng.choice('abcdefgh \n') for _ in range(DELTA_MIN_CHARS + 1000)))
+
+    random_edits(editor, rng, 300)
+    editor.save()
+    assert writer.flush(timeout=10)
+    assert editor.deltas > 20 and editor.checkpoints > 1
+    saves = editor.deltas, editor.checkpoints
+    # Compaction folds the deltas into the snapshot; later ones apply on top of it
+    while storage.is_compacting():
+        time.sleep(0.01)
+    assert storage.compact(background=False)
+    assert storage.journal_records == 0
+
+    random_edits(editor, rng, 300)
+    editor.save()
+    assert writer.stop(timeout=10)
+    assert editor.deltas > saves[0] and editor.checkpoints > saves[1]
+    assert storage.journal_records > 0
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert notes['a']['content'] == editor.text
+    assert notes['a']['revision'] == editor.revision
+    storage.close()
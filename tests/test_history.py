@@ -0,0 +1,106 @@
+import random
+import time
+
+from stickynotes.history import HistoryStore
+from stickynotes.writer import PersistenceWriter
+
+
+class MemoryStorage:
+    def __init__(self):
+        self.notes = {}
+
+    def write_batch(self, saves, deletions, moves=(), edits=()):
+        for note in saves:
+            self.notes[note['id']] = note
+
+
+def edited_versions(count, seed=1):
+    """Returns successive versions of a note, each a small edit of the previous one"""
+    rng = random.Random(seed)
+    text = 'Lista de la compra\n' + 'leche, pan, huevos\n' * 50
+    versions = [text]
+    for _ in range(count - 1):
+        offset = rng.randrange(len(text) + 1)
+        if rng.random() < 0.6 or not text:
+            text = text[:offset] + rng.choice(['á', 'queso', '\n', ' y ']) + text[offset:]
+        else:
+            text = text[:offset] + text[offset + rng.randrange(1, 20):]
+        versions.append(text)
+    return versions
+
+
+def test_keyframes_and_deltas_round_trip(tmp_path):
+    history = HistoryStore(str(tmp_path), keyframe_interval=4)
+    versions = edited_versions(10)
+    for index, content in enumerate(versions):
+        assert history.record('a', content) == index
+    # Unchanged content is not a revision
+    assert history.record('a', versions[-1]) is None
+
+    kinds = [revision.keyframe for revision in reversed(history.list_revisions('a'))]
+    assert kinds == [True, False, False, False] * 2 + [True, False]
+    # A rewrite of most of the note is stored whole
+    assert history.record('a', 'otra cosa') == 10
+    assert history.list_revisions('a')[0].keyframe
+
+    # Read back from the file, not from the cached newest revision
+    history = HistoryStore(str(tmp_path), keyframe_interval=4)
+    assert [history.get_revision('a', index) for index in range(10)] == versions
+    assert history.get_revision('a', 10) == 'otra cosa'
+
+
+def test_restores_revision_n_after_pruning(tmp_path):
+    history = HistoryStore(str(tmp_path), max_revisions=8, max_age=0, keyframe_interval=4)
+    versions = edited_versions(12, seed=2)
+    for content in versions:
+        history.record('a', content)
+
+    indexes = [revision.index for revision in history.list_revisions('a')]
+    assert indexes == list(range(11, 11 - len(indexes), -1))
+    assert len(indexes) <= 8
+    # The oldest kept revision became a keyframe
+    assert history.list_revisions('a')[-1].keyframe
+    for index in indexes:
+        assert HistoryStore(str(tmp_path)).get_revision('a', index) == versions[index]
+
+
+def test_writer_records_one_revision_per_interval(tmp_path):
+    history = HistoryStore(str(tmp_path), min_interval=0.5)
+    writer = PersistenceWriter(MemoryStorage(), batch_delay=0, history=history)
+    writer.start()
+    writer.enqueue_revision('a', 'one')
+    deadline = time.monotonic() + 5
+    while not history.list_revisions('a') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    recorded = time.monotonic()
+    # Autosaves within the interval only replace the pending revision
+    writer.enqueue_revision('a', 'two')
+    writer.enqueue_revision('a', 'three')
+    time.sleep(0.1)
+    if time.monotonic() - recorded < 0.5:
+        assert [r.index for r in history.list_revisions('a')] == [0]
+
+    while len(history.list_revisions('a')) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert time.monotonic() - recorded >= 0.4
+    assert [history.get_revision('a', r.index) for r in history.list_revisions('a')] == ['three', 'one']
+
+    # Closing the app writes the pending revision right away
+    writer.enqueue_revision('a', 'four')
+    started = time.monotonic()
+    assert writer.stop(timeout=5)
+    assert time.monotonic() - started < 0.5
+    assert history.get_revision('a', 2) == 'four'
+
+
+def test_deleted_note_drops_its_pending_revision(tmp_path):
+    history = HistoryStore(str(tmp_path), min_interval=60)
+    writer = PersistenceWriter(MemoryStorage(), batch_delay=0, history=history)
+    writer.start()
+    writer.enqueue_revision('a', 'one')
+    assert writer.flush(timeout=5)
+    writer.enqueue_revision('a', 'two')
+    writer.enqueue_delete('a')
+    assert writer.stop(timeout=5)
+    assert history.list_revisions('a') == []
+    assert not (tmp_path / 'a.history').exists()
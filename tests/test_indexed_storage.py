@@ -0,0 +1,76 @@
+import os
+
+from stickynotes.indexed_storage import IndexedStorage, StoredContent
+from stickynotes.storage import FSYNC_NEVER
+
+
+def note(note_id, content=''):
+    return {'id': note_id, 'title': note_id, 'content': content, 'color': 'yellow',
+            'x': 0, 'y': 0, 'timestamp': '2025-01-01T00:00:00', 'revision': 1}
+
+
+def open_store(tmp_path):
+    # Tiny stores would otherwise compact on every save
+    storage = IndexedStorage(str(tmp_path / 'sticky-notes.bin'), fsync_policy=FSYNC_NEVER,
+                             max_journal_ratio=100)
+    return storage, storage.load()
+
+
+def contents(notes):
+    return {note_id: note['content'].load() if isinstance(note['content'], StoredContent) else note['content']
+            for note_id, note in notes.items()}
+
+
+def test_save_appends_to_journal_without_rewriting_store(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a', 'first'))
+    storage.compact(background=False)
+    written = os.stat(storage.data_file).st_mtime_ns
+
+    storage.save_note(note('b', 'second'))
+    storage.move_note('a', 10, 20)
+    assert os.stat(storage.data_file).st_mtime_ns == written
+    assert storage.journal_records == 2
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert contents(notes) == {'a': 'first', 'b': 'second'}
+    assert (notes['a']['x'], notes['a']['y']) == (10, 20)
+    storage.close()
+
+
+def test_compaction_keeps_unchanged_contents_undecoded(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a', 'kept'))
+    storage.save_note(note('b', 'changed'))
+    storage.compact(background=False)
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert isinstance(notes['a']['content'], StoredContent)
+    storage.save_note(note('b', 'changed again'))
+    storage.compact(background=False)
+    assert isinstance(storage._notes['a']['content'], StoredContent)
+    assert not os.path.exists(storage.journal_file) or os.path.getsize(storage.journal_file) == 0
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert contents(notes) == {'a': 'kept', 'b': 'changed again'}
+    storage.close()
+
+
+def test_edit_of_stored_content_is_replayed(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a', 'hello'))
+    storage.compact(background=False)
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    storage.edit_note('a', {'base': 1, 'rev': 2, 'ops': [[5, ' world']], 'fields': {'title': 'a'}})
+    assert storage.recent_notes(1)[0]['content'] == 'hello world'
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert contents(notes) == {'a': 'hello world'}
+    assert notes['a']['revision'] == 2
+    storage.close()
@@ -0,0 +1,113 @@
+import json
+import os
+
+from stickynotes.journal import JournalStorage
+from stickynotes.storage import FSYNC_NEVER
+
+
+def note(note_id, content=''):
+    return {'id': note_id, 'title': note_id, 'content': content, 'color': 'yellow',
+            'x': 0, 'y': 0, 'timestamp': '2025-01-01T00:00:00'}
+
+
+def open_store(tmp_path):
+    storage = JournalStorage(str(tmp_path / 'sticky-notes.json'), fsync_policy=FSYNC_NEVER)
+    return storage, storage.load()
+
+
+def test_save_after_torn_record_survives_reload(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a'))
+    storage.save_note(note('b'))
+    storage.close()
+    # Crash halfway through writing a record
+    with open(storage.journal_file, 'a') as f:
+        f.write(json.dumps({'op': 'upsert', 'note': note('torn')})[:25])
+
+    storage, notes = open_store(tmp_path)
+    assert sorted(notes) == ['a', 'b']
+    storage.save_note(note('c'))
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert sorted(notes) == ['a', 'b', 'c']
+    storage.close()
+
+
+def test_whole_last_record_without_newline_is_kept(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a'))
+    storage.close()
+    # Crash between writing a record and its newline
+    with open(storage.journal_file, 'a') as f:
+        f.write(json.dumps({'op': 'upsert', 'note': note('b', 'complete')}))
+
+    storage, notes = open_store(tmp_path)
+    assert notes['b']['content'] == 'complete'
+    storage.save_note(note('c'))
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert sorted(notes) == ['a', 'b', 'c']
+    assert notes['b']['content'] == 'complete'
+    storage.close()
+
+
+def test_journal_without_torn_record_is_left_alone(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a'))
+    storage.close()
+    size = os.path.getsize(storage.journal_file)
+
+    storage, notes = open_store(tmp_path)
+    storage.close()
+    assert list(notes) == ['a']
+    assert os.path.getsize(storage.journal_file) == size
+
+
+def write_external(storage, notes):
+    """Replaces the snapshot as another program would"""
+    with open(storage.snapshot_file, 'w') as f:
+        json.dump(notes, f)
+
+
+def test_external_edit_wins_over_older_journal_records(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a', 'ours v1'))
+    storage.save_note(note('b', 'ours'))
+    storage.compact(background=False)
+    storage.save_note(note('a', 'ours v2'))
+    storage.save_note(note('b', 'ours v2'))
+
+    # The other program only knew the snapshot: it edited a, kept b as it was
+    write_external(storage, {'a': note('a', 'theirs'), 'b': note('b', 'ours')})
+    changed, removed = storage.reload()
+    assert [n['content'] for n in changed] == ['theirs']
+    assert removed == []
+    assert storage._notes['a']['content'] == 'theirs'
+    # Changes to notes the other program did not touch are kept
+    assert storage._notes['b']['content'] == 'ours v2'
+    storage.close()
+
+    storage, notes = open_store(tmp_path)
+    assert notes['a']['content'] == 'theirs'
+    assert notes['b']['content'] == 'ours v2'
+    storage.close()
+
+
+def test_external_removal_wins_and_later_saves_are_kept(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.save_note(note('a', 'one'))
+    storage.save_note(note('b', 'two'))
+    storage.compact(background=False)
+    storage.save_note(note('a', 'one v2'))
+
+    write_external(storage, {'b': note('b', 'two')})
+    changed, removed = storage.reload()
+    assert (changed, removed) == ([], ['a'])
+
+    storage.save_note(note('c', 'after'))
+    storage.close()
+    storage, notes = open_store(tmp_path)
+    assert sorted(notes) == ['b', 'c']
+    storage.close()
@@ -0,0 +1,129 @@
+import os
+
+from stickynotes.media import MediaStore, make_block, media_hashes
+from stickynotes.model import NoteModel
+from stickynotes.writer import PersistenceWriter
+
+from test_writer import FailingStorage
+
+
+def add_file(tmp_path, media, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return media.ingest(str(path))
+
+
+def test_released_object_is_kept_until_the_note_is_written(tmp_path):
+    media = MediaStore(str(tmp_path / 'media'))
+    digest = add_file(tmp_path, media, 'shot.png', b'png' * 1000)
+    media.set_note_refs('a', frozenset({digest}))
+
+    storage = FailingStorage()
+    writer = PersistenceWriter(storage, batch_delay=0, retry_delay=0.01, stop_attempts=2)
+    writer.start()
+    # The note is saved without the block, as the app does: enqueue, then release
+    writer.enqueue_save({'id': 'a', 'content': {'blocks': []}})
+    released = media.set_note_refs('a', frozenset())
+    assert released == {digest}
+    writer.after_written(lambda: media.delete_unused(released))
+
+    # The save keeps failing: a crash now must find the object the stored note uses
+    assert writer.flush(timeout=0.2) is False
+    assert media.has(digest)
+    # Nor does garbage collection delete it, however old it is
+    os.utime(media.object_path(digest), (0, 0))
+    assert media.collect_garbage() == 0
+    assert media.has(digest)
+
+    storage.recovered.set()
+    assert writer.flush(timeout=5)
+    writer.stop(timeout=5)
+    assert storage.notes['a']['content'] == {'blocks': []}
+    assert not media.has(digest)
+    media.close()
+
+
+def test_object_is_not_deleted_after_a_save_the_writer_gave_up(tmp_path):
+    media = MediaStore(str(tmp_path / 'media'))
+    digest = add_file(tmp_path, media, 'shot.png', b'png' * 1000)
+    media.set_note_refs('a', frozenset({digest}))
+
+    writer = PersistenceWriter(FailingStorage(), batch_delay=0, retry_delay=0.01, stop_attempts=2)
+    writer.start()
+    writer.enqueue_delete('a')
+    released = media.release_note('a')
+    writer.after_written(lambda: media.delete_unused(released))
+    assert writer.stop(timeout=5) is False
+    assert media.has(digest)
+    media.close()
+
+
+def test_object_released_twice_waits_for_both_writes(tmp_path):
+    media = MediaStore(str(tmp_path / 'media'))
+    digest = add_file(tmp_path, media, 'shot.png', b'png' * 1000)
+    media.set_note_refs('a', frozenset({digest}))
+    first = media.set_note_refs('a', frozenset())
+    media.set_note_refs('a', frozenset({digest}))
+    second = media.set_note_refs('a', frozenset())
+
+    # The first save is written; the second is not yet
+    assert media.delete_unused(first) == 0
+    assert media.has(digest)
+    assert media.delete_unused(second) == 1
+    assert not os.path.exists(media.object_path(digest))
+    media.close()
+
+
+def test_object_is_deleted_after_the_last_note_releases_it(tmp_path):
+    media = MediaStore(str(tmp_path / 'media'))
+    digest = add_file(tmp_path, media, 'shot.png', b'png' * 1000)
+    media.set_note_refs('a', frozenset({digest}))
+    media.add_ref(digest, 'b')
+    assert media.refcount(digest) == 2
+
+    assert media.release_note('a') == frozenset()
+    assert media.refcount(digest) == 1
+    released = media.release_note('b')
+    assert released == {digest}
+    assert media.delete_unused(released) == 1
+    assert not media.has(digest)
+    media.close()
+
+
+def test_reingested_file_is_deduplicated(tmp_path):
+    media = MediaStore(str(tmp_path / 'media'))
+    first = add_file(tmp_path, media, 'shot.png', b'png' * 1000)
+    second = add_file(tmp_path, media, 'copy.png', b'png' * 1000)
+    assert first == second
+    assert (media.ingested, media.deduplicated) == (1, 1)
+    assert os.listdir(os.path.dirname(media.object_path(first))) == [first]
+    media.close()
+
+
+def test_stale_refs_are_rebuilt_from_the_notes(tmp_path):
+    media = MediaStore(str(tmp_path / 'media'))
+    kept = add_file(tmp_path, media, 'kept.png', b'kept' * 1000)
+    leaked = add_file(tmp_path, media, 'leaked.png', b'leaked' * 1000)
+    # refs.json as left by a crash: `leaked` is still referenced, `kept` not yet
+    media.set_note_refs('a', frozenset({leaked}))
+    media.close()
+    for digest in (kept, leaked):
+        os.utime(media.object_path(digest), (0, 0))
+
+    media = MediaStore(str(tmp_path / 'media'))
+    assert media.collect_garbage({'a': {'blocks': [make_block(kept, 'kept.png', 4000)]}}) == 1
+    assert media.has(kept)
+    assert not media.has(leaked)
+    assert media.refcount(kept) == 1
+    media.close()
+
+    # The repaired references are what the next start reads
+    assert MediaStore(str(tmp_path / 'media')).refcount(kept) == 1
+
+
+def test_added_block_makes_plain_content_enhanced():
+    note = NoteModel(content='shopping')
+    note.add_block(make_block('ab' * 32, 'shot.png', 3))
+    assert note.is_enhanced
+    assert note.text == 'shopping'
+    assert media_hashes(note.content) == {'ab' * 32}
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from stickynotes.migration import migrate, verify
+from stickynotes.model import NoteModel
+from stickynotes.preview import make_preview
+from stickynotes.search import SearchIndex
+from stickynotes.storage import FSYNC_NEVER, atomic_write_json
+
+ORIGINAL = {
+    'a': {'id': 'a', 'title': 'Shopping', 'content': 'Shopping\nmilk, eggs\n', 'color': 'blue',
+          'x': 320, 'y': 40, 'timestamp': '2025-03-01T10:00:00', 'revision': 3, 'tags': ['home']},
+    'b': {'id': 'b', 'title': '', 'content': 'café \U0001f600 résumé', 'color': 'pink',
+          'x': 10, 'y': 700, 'timestamp': '2025-04-02T08:30:00'},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'sticky-notes.json')
+    atomic_write_json(path, ORIGINAL, FSYNC_NEVER)
+    assert migrate(path, fsync_policy=FSYNC_NEVER) == 2
+    return path
+
+
+def load(path):
+    with open(path) as f:
+        return {note_id: NoteModel.from_dict(note) for note_id, note in json.load(f).items()}
+
+
+def test_application_reads_the_migrated_store(store):
+    assert verify(store + '.basic', store) == 2
+    notes = load(store)
+    for note_id, original in ORIGINAL.items():
+        note = notes[note_id]
+        assert note.is_enhanced
+        assert note.text == original['content']
+        assert (note.x, note.y) == (original['x'], original['y'])
+        assert note.color == original['color']
+        assert note.timestamp == original['timestamp']
+    assert notes['a'].tags == ['home']
+
+    index = SearchIndex()
+    index.build(notes)
+    assert index.matching_ids('milk') == {'a'}
+    assert make_preview(notes['a']).snippet == 'milk, eggs\n'
+
+
+def test_saved_enhanced_note_keeps_blocks_and_metadata(store):
+    note = load(store)['a']
+    note.content['blocks'].append({'type': 'image', 'hash': 'f' * 64})
+    note.set_text('Shopping\nbread')
+    note.x = 5
+
+    note_data = note.to_dict()
+    assert 'x' not in note_data and 'timestamp' not in note_data
+    assert note_data['metadata']['position'] == {'x': 5, 'y': 40}
+    assert note_data['metadata']['created'] == '2025-03-01T10:00:00'
+    assert [block['type'] for block in note_data['content']['blocks']] == ['text', 'image']
+
+    reloaded = NoteModel.from_dict(note_data)
+    assert (reloaded.text, reloaded.x, reloaded.y) == ('Shopping\nbread', 5, 40)
+
+
+def test_verify_catches_a_note_the_application_reads_differently(store):
+    with open(store) as f:
+        notes = json.load(f)
+    del notes['b']['metadata']['position']
+    atomic_write_json(store, notes, FSYNC_NEVER)
+    with pytest.raises(ValueError, match='b: x differs'):
+        verify(store + '.basic', store)
@@ -0,0 +1,54 @@
+import gc
+import weakref
+
+from stickynotes.model import NoteModel
+from stickynotes.preview import PREVIEW_CHARS, PreviewCache, make_preview
+
+
+class Text(str):
+    """str that can be weakly referenced"""
+
+
+def test_equal_content_with_another_identity_is_a_hit():
+    cache = PreviewCache()
+    note = NoteModel(id='a', content='shopping\nmilk and eggs')
+    first = cache.get(note)
+    note.content = ''.join(['shopping\n', 'milk and eggs'])
+    assert cache.get(note) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_changed_content_is_a_miss():
+    cache = PreviewCache()
+    note = NoteModel(id='a', content='shopping\nmilk')
+    cache.get(note)
+    note.content = 'shopping\nbread'
+    assert cache.get(note).snippet == 'shopping\nbread'
+    assert cache.misses == 2
+
+
+def test_cache_keeps_no_reference_to_the_content():
+    cache = PreviewCache()
+    note = NoteModel(id='a', content=Text('x' * 100000))
+    ref = weakref.ref(note.content)
+    cache.get(note)
+    note.content = 'short'
+    gc.collect()
+    assert ref() is None
+
+
+def test_overlong_first_line_is_not_searched_to_its_end():
+    note = NoteModel(id='a', title='big', content='x' * 100000 + '\nsecond line')
+    assert make_preview(note).snippet == 'x' * (PREVIEW_CHARS - 3) + '...'
+    note = NoteModel(id='b', title='short', content='first line\nsecond line')
+    assert make_preview(note).snippet == 'second line'
+
+
+def test_saved_change_past_the_preview_is_a_miss():
+    cache = PreviewCache()
+    note = NoteModel(id='a', content='shopping\n' + 'x' * 100000, revision=1)
+    first = cache.get(note)
+    note.content = note.content + ' and bread'
+    note.revision += 1
+    assert cache.get(note) == first
+    assert cache.misses == 2
@@ -0,0 +1,29 @@
+from stickynotes.query import parse_query
+from stickynotes.model import NoteModel
+from stickynotes.search import SearchIndex
+
+
+def test_free_text_is_one_phrase():
+    assert parse_query('Buy  milk').terms == ['buy  milk']
+    assert parse_query('buy milk color:blue eggs').terms == ['buy milk', 'eggs']
+    assert parse_query('"buy milk" eggs').terms == ['buy milk', 'eggs']
+    # Unknown operators are part of the text
+    assert parse_query('see http://example.org now').terms == ['see http://example.org now']
+    assert parse_query('after:soon today').terms == ['after:soon today']
+
+
+def test_filters_are_not_text():
+    query = parse_query('color:blue tag:work after:2025-05-01 plan')
+    assert query.terms == ['plan']
+    assert query.colors == ['blue']
+    assert query.tags == ['work']
+    assert query.after is not None
+
+
+def test_free_text_does_not_match_words_out_of_order():
+    notes = {note_id: NoteModel.from_dict({'id': note_id, 'title': '', 'content': content})
+             for note_id, content in (('a', 'buy milk today'), ('b', 'milk, then buy bread'))}
+    index = SearchIndex()
+    index.build(notes)
+    assert index.matching_ids('buy milk') == {'a'}
+    assert index.matching_ids('buy color:yellow milk') == {'a', 'b'}
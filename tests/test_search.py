@@ -0,0 +1,123 @@
+import random
+from datetime import datetime, timedelta
+
+from stickynotes.model import NoteModel
+from stickynotes.search import SearchIndex, decode_postings, encode_postings
+
+WORDS = ['buy', 'milk', 'meeting', 'notes', 'the', 'then', 'other', 'mother', 'idea', 'plan', 'café']
+
+
+def make_notes(count, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    notes = {}
+    for i in range(count):
+        content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 40)))
+        note_id = f'note-{i:04d}'
+        notes[note_id] = NoteModel.from_dict({
+            'id': note_id,
+            'title': content[:rng.randint(0, 20)],
+            'content': content,
+            'color': rng.choice(['yellow', 'blue']),
+            'timestamp': (start + timedelta(hours=rng.randint(0, 24 * 365))).isoformat(),
+            'tags': rng.sample(['work', 'home'], rng.randint(0, 2)),
+        })
+    return notes
+
+
+def test_postings_round_trip_and_widen():
+    for docnums in ([0], [3, 4, 5, 300], [1, 70000], [5, 2 ** 31]):
+        assert decode_postings(encode_postings(docnums)) == docnums
+    assert encode_postings([1, 2, 3]).typecode == 'B'
+    assert encode_postings([1, 1000]).typecode == 'H'
+
+
+def test_matching_ids_is_a_substring_match():
+    notes = make_notes(300)
+    index = SearchIndex()
+    index.build(notes)
+    for term in ('the', 'ther', 'milk buy', 'mother', 'é', 'th', 'plan idea'):
+        expected = {note_id for note_id, note in notes.items() if term in note.content.lower()}
+        assert index.matching_ids(f'"{term}"') == expected, term
+
+
+def test_short_terms_match_a_substring_scan():
+    notes = make_notes(300)
+    # Notes too short to have a single trigram
+    for note_id, content in (('short-1', 'é'), ('short-2', 'Th'), ('short-3', '')):
+        notes[note_id] = NoteModel.from_dict({'id': note_id, 'title': '', 'content': content,
+                                              'color': 'blue', 'timestamp': '2025-06-01T00:00:00'})
+    index = SearchIndex()
+    index.build(notes)
+    notes['note-0001'].content = 'zz'
+    index.update(notes['note-0001'])
+    for term in ('e', 'é', 'th', 'zz', 'q', 'k '):
+        expected = {note_id for note_id, note in notes.items() if term in note.content.lower()}
+        assert index.matching_ids(f'"{term}"') == expected, term
+        blue = {note_id for note_id in expected if notes[note_id].color == 'blue'}
+        assert index.matching_ids(f'"{term}" color:blue') == blue, term
+
+
+def test_top_k_matches_the_full_ranking():
+    notes = make_notes(500)
+    index = SearchIndex()
+    index.build(notes)
+    # Replaced versions and a vacuum exercise the incremental postings
+    rng = random.Random(1)
+    for note_id in rng.sample(sorted(notes), 200):
+        notes[note_id].content += ' then other'
+        index.update(notes[note_id])
+    for note_id in rng.sample(sorted(notes), 50):
+        index.remove(note_id)
+    index._vacuum()
+
+    for query in ('the', 'other', '"the other"', 'mot', 'milk color:blue', 'tag:work plan', 'th'):
+        full = index.search(query, limit=None)
+        for limit in (1, 5, 20):
+            assert index.search(query, limit) == full[:limit], (query, limit)
+
+
+def scan(notes, term):
+    return {note_id for note_id, note in notes.items() if term in note.content.lower()}
+
+
+def test_queries_during_a_build_scan_the_notes():
+    notes = make_notes(300)
+    index = SearchIndex()
+    steps = index.build_steps(notes, budget=0)
+    next(steps)
+    assert index.is_building()
+    assert index.matching_ids('mother') == scan(notes, 'mother')
+
+    # Changes during the build are seen at once and indexed after it
+    notes['note-0001'].content = 'zebra crossing'
+    index.update(notes['note-0001'])
+    del notes['note-0002']
+    index.remove('note-0002')
+    notes['new'] = NoteModel.from_dict({'id': 'new', 'title': 'zebra', 'content': 'zebra',
+                                        'timestamp': '2025-06-01T00:00:00'})
+    index.update(notes['new'])
+    assert index.matching_ids('zebra') == {'note-0001', 'new'}
+
+    for _ in steps:
+        pass
+    assert not index.is_building()
+    assert index.matching_ids('zebra') == {'note-0001', 'new'}
+    assert 'note-0002' not in index
+    for term in ('the', 'mother', 'é'):
+        assert index.matching_ids(f'"{term}"') == scan(notes, term), term
+
+
+def test_scheduled_build_runs_in_steps():
+    notes = make_notes(300)
+    scheduled = []
+    index = SearchIndex(schedule=scheduled.append)
+    index.start_build(notes)
+    assert index.is_building()
+    ranked_during_build = index.search('mother', limit=None)
+    while scheduled:
+        step = scheduled.pop()
+        if step():
+            scheduled.append(step)
+    assert not index.is_building()
+    assert index.search('mother', limit=None) == ranked_during_build
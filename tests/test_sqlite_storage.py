@@ -0,0 +1,79 @@
+import json
+import os
+
+from stickynotes.sqlite_storage import SqliteStorage
+from stickynotes.storage import FSYNC_NEVER
+
+
+def note(note_id, content='', **fields):
+    return dict({'id': note_id, 'title': note_id, 'content': content, 'color': 'yellow',
+                 'x': 0, 'y': 0, 'timestamp': '2025-01-01T00:00:00'}, **fields)
+
+
+def open_store(tmp_path, import_from=None):
+    storage = SqliteStorage(str(tmp_path / 'sticky-notes.db'), import_from=import_from,
+                            fsync_policy=FSYNC_NEVER)
+    return storage, storage.load()
+
+
+def test_write_batch_upserts_deletes_moves_and_edits(tmp_path):
+    storage, notes = open_store(tmp_path)
+    assert notes == {}
+    storage.write_batch([note('a', 'first'), note('b', 'second'), note('c', revision=1)], [])
+    storage.write_batch([note('a', 'first, changed', tags=['casa'])], ['b'],
+                        moves=[('c', 10, 20)],
+                        edits=[('c', {'base': 1, 'rev': 2, 'ops': [[0, 'typed']],
+                                      'fields': {'title': 'c', 'x': 10, 'y': 20}})])
+    # An edit against another revision is skipped
+    storage.edit_note('c', {'base': 1, 'rev': 2, 'ops': [[0, 'again']], 'fields': {}})
+
+    notes = storage.load()
+    assert sorted(notes) == ['a', 'c']
+    assert notes['a']['content'] == 'first, changed'
+    assert notes['a']['tags'] == ['casa']
+    assert (notes['c']['content'], notes['c']['revision']) == ('typed', 2)
+    assert (notes['c']['x'], notes['c']['y']) == (10, 20)
+    storage.close()
+
+
+def test_enhanced_content_round_trips(tmp_path):
+    storage, _ = open_store(tmp_path)
+    content = {'blocks': [{'type': 'text', 'content': 'hola'}]}
+    storage.save_note(note('a', content))
+    assert storage.load()['a']['content'] == content
+    storage.close()
+
+
+def test_first_load_imports_the_json_store_once(tmp_path):
+    json_file = tmp_path / 'sticky-notes.json'
+    json_file.write_text(json.dumps({'a': note('a', 'from json'), 'b': note('b', 'also')}))
+
+    storage, notes = open_store(tmp_path, import_from=str(json_file))
+    assert {note_id: n['content'] for note_id, n in notes.items()} == {'a': 'from json', 'b': 'also'}
+    storage.delete_note('b')
+    storage.close()
+
+    # Deleting every note does not bring the JSON notes back either
+    storage, notes = open_store(tmp_path, import_from=str(json_file))
+    assert sorted(notes) == ['a']
+    storage.delete_note('a')
+    storage.close()
+    storage, notes = open_store(tmp_path, import_from=str(json_file))
+    assert notes == {}
+    storage.close()
+
+
+def test_reopens_after_close_in_wal_mode(tmp_path):
+    storage, _ = open_store(tmp_path)
+    storage.write_batch([note(f'n{i}', 'x' * i) for i in range(100)], [])
+    assert storage.db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert os.path.exists(storage.db_file + '-wal')
+    storage.close()
+    # Closing the last connection checkpoints the WAL into the database
+    assert not os.path.exists(storage.db_file + '-wal')
+
+    storage, notes = open_store(tmp_path)
+    assert len(notes) == 100
+    assert notes['n42']['content'] == 'x' * 42
+    assert storage.db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    storage.close()
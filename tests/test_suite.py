@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from suite import compare  # noqa: E402
+
+
+def result(median, alloc_peak=1024):
+    return {'runs': 5, 'median': median, 'min': median, 'rss_peak': 0, 'rss_growth': 0,
+            'alloc_peak': alloc_peak, 'alloc_retained': 0}
+
+
+def baseline(**results):
+    return {'version': 1, 'results': results}
+
+
+def test_failed_case_is_a_regression():
+    regressions = compare({'a@10': {'failed': 'boom'}}, baseline(**{'a@10': result(0.01)}), 0.25, 0.5)
+    assert regressions == ['a@10: failed: boom']
+
+
+def test_missing_or_skipped_baseline_case_is_a_regression():
+    reference = baseline(**{'a@10': result(0.01), 'b@10': result(0.01)})
+    regressions = compare({'b@10': {'skipped': 'no display'}}, reference, 0.25, 0.5)
+    assert regressions == ['a@10: in the baseline but not run', 'b@10: in the baseline but skipped (no display)']
+
+
+def test_cases_out_of_scope_or_skipped_in_baseline_are_not_compared():
+    reference = baseline(**{'a@10': result(0.01), 'a@10k': result(0.5), 'gtk/b@10': {'skipped': 'no display'}})
+    results = {'a@10': result(0.0101), 'gtk/b@10': {'skipped': 'no display'}}
+    assert compare(results, reference, 0.25, 0.5, lambda key: key.endswith('@10')) == []
+
+
+def test_slower_case_is_a_regression():
+    regressions = compare({'a@10': result(0.02)}, baseline(**{'a@10': result(0.01)}), 0.25, 0.5)
+    assert regressions == ['a@10: 10.00 ms -> 20.00 ms (+100%)']
@@ -0,0 +1,147 @@
+import os
+import socket
+import time
+
+import pytest
+
+from stickynotes.events import EventBus, NoteEvent, NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED
+from stickynotes.model import NoteModel
+from stickynotes.sync import HybridClock, SyncEngine
+from stickynotes.sync_server import serve
+
+
+class _Autosave:
+    def flush(self, note_id):
+        pass
+
+
+class Device:
+    """The parts of the application the sync engine talks to"""
+
+    def __init__(self, notes=()):
+        self.notes = {note.id: note for note in notes}
+        self.events = EventBus()
+        self.autosave = _Autosave()
+
+    def edit(self, note_id, text):
+        note = self.notes.get(note_id)
+        kind = NOTE_CHANGED
+        if note is None:
+            note = self.notes[note_id] = NoteModel(id=note_id, title=note_id)
+            kind = NOTE_ADDED
+        note.content = text
+        note.touch()
+        self.events.emit(NoteEvent(kind, note))
+
+    def delete(self, note_id):
+        del self.notes[note_id]
+        self.events.emit(NoteEvent(NOTE_REMOVED, note_id=note_id))
+
+    def apply_remote_note(self, note_data):
+        note = NoteModel.from_dict(note_data)
+        kind = NOTE_CHANGED if note.id in self.notes else NOTE_ADDED
+        self.notes[note.id] = note
+        self.events.emit(NoteEvent(kind, note))
+
+    def apply_remote_deletion(self, note_id):
+        if self.notes.pop(note_id, None) is not None:
+            self.events.emit(NoteEvent(NOTE_REMOVED, note_id=note_id))
+
+    def contents(self):
+        return {note_id: note.content for note_id, note in self.notes.items()}
+
+
+@pytest.fixture
+def server():
+    server = serve()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def device(tmp_path, url, name):
+    """A device with its engine; rounds run with sync_once(), without the thread"""
+    app = Device()
+    engine = SyncEngine(app, url, str(tmp_path / f'{name}.json'))
+    for kind in (NOTE_ADDED, NOTE_CHANGED, NOTE_REMOVED):
+        app.events.connect(kind, engine.on_note_event)
+    return app, engine
+
+
+def test_later_concurrent_edit_wins_on_both_devices(tmp_path, server):
+    a, engine_a = device(tmp_path, server, 'a')
+    b, engine_b = device(tmp_path, server, 'b')
+    a.edit('n', 'original')
+    engine_a.sync_once()
+    engine_b.sync_once()
+    assert b.contents() == {'n': 'original'}
+
+    # Both edit before either syncs; B's edit is the later one
+    a.edit('n', 'edited on A')
+    time.sleep(0.002)
+    b.edit('n', 'edited on B')
+    engine_b.sync_once()
+    engine_a.sync_once()
+    engine_b.sync_once()
+    assert a.contents() == b.contents() == {'n': 'edited on B'}
+    assert engine_a.get_stats()['pending'] == 0
+
+
+def test_edit_after_delete_brings_the_note_back(tmp_path, server):
+    a, engine_a = device(tmp_path, server, 'a')
+    b, engine_b = device(tmp_path, server, 'b')
+    a.edit('kept', 'one')
+    a.edit('gone', 'two')
+    engine_a.sync_once()
+    engine_b.sync_once()
+
+    a.delete('kept')
+    a.edit('gone', 'edited on A')
+    time.sleep(0.002)
+    b.edit('kept', 'edited on B')
+    b.delete('gone')
+    engine_a.sync_once()
+    engine_b.sync_once()
+    engine_a.sync_once()
+    assert a.contents() == b.contents() == {'kept': 'edited on B'}
+
+
+def test_device_behind_a_skewed_clock_still_orders_after_what_it_saw(tmp_path, server):
+    a, engine_a = device(tmp_path, server, 'a')
+    b, engine_b = device(tmp_path, server, 'b')
+    # A's clock runs an hour ahead
+    engine_a.clock = HybridClock(engine_a.node, clock=lambda: time.time() + 3600)
+    a.edit('n', 'from the future')
+    engine_a.sync_once()
+    engine_b.sync_once()
+    assert b.contents() == {'n': 'from the future'}
+
+    # B edits after seeing A's change: its stamp follows A's despite its clock
+    b.edit('n', 'answered on B')
+    assert engine_b.versions['n'] > engine_a.versions['n']
+    engine_b.sync_once()
+    engine_a.sync_once()
+    assert a.contents() == b.contents() == {'n': 'answered on B'}
+
+
+def test_stop_leaves_a_hung_round_to_save_its_own_state(tmp_path):
+    # A server that accepts the connection and never answers
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    url = f'http://127.0.0.1:{listener.getsockname()[1]}'
+    app = Device([NoteModel(id='n', content='unsent')])
+    engine = SyncEngine(app, url, str(tmp_path / 'state.json'))
+    engine.start()
+    connection, _ = listener.accept()
+
+    assert engine.stop(timeout=0.1) is False
+    assert not os.path.exists(engine.state_path)
+
+    # The request fails; the thread closes the connection and saves on its way out
+    connection.close()
+    listener.close()
+    engine._thread.join(5)
+    assert not engine._thread.is_alive()
+    assert os.path.exists(engine.state_path)
+    assert engine.connection._connection is None
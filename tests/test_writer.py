@@ -0,0 +1,51 @@
+import threading
+import time
+
+from stickynotes.writer import PersistenceWriter
+
+
+class FailingStorage:
+    """Storage whose writes fail until it is told to recover"""
+
+    def __init__(self):
+        self.attempts = []
+        self.recovered = threading.Event()
+        self.notes = {}
+
+    def write_batch(self, saves, deletions, moves=(), edits=()):
+        self.attempts.append(time.monotonic())
+        if not self.recovered.is_set():
+            raise OSError("disk full")
+        for note in saves:
+            self.notes[note['id']] = note
+
+
+def test_stop_gives_up_on_a_batch_that_keeps_failing():
+    storage = FailingStorage()
+    writer = PersistenceWriter(storage, batch_delay=0, retry_delay=0.01, stop_attempts=3)
+    writer.start()
+    writer.enqueue_save({'id': 'a'})
+
+    started = time.monotonic()
+    assert writer.stop(timeout=5) is False
+    assert time.monotonic() - started < 1
+    assert not writer._thread.is_alive()
+    assert writer.has_pending('a')
+
+
+def test_failed_batches_back_off():
+    storage = FailingStorage()
+    writer = PersistenceWriter(storage, batch_delay=0, retry_delay=0.02, max_retry_delay=0.08)
+    writer.start()
+    writer.enqueue_save({'id': 'a'})
+    time.sleep(0.4)
+    storage.recovered.set()
+    assert writer.flush(timeout=5)
+    assert storage.notes == {'a': {'id': 'a'}}
+
+    gaps = [b - a for a, b in zip(storage.attempts, storage.attempts[1:])]
+    # 20, 40, 80, 80... ms instead of a fixed delay
+    assert gaps[1] > gaps[0] * 1.5
+    assert max(gaps) < 0.2
+    writer.stop(timeout=5)
+    assert writer.get_stats()['errors'] == len(storage.attempts) - 1